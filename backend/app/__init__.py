@@ -4,9 +4,12 @@ from flask_cors import CORS
 from .routes import main as main_blueprint
 from .celery_utils import make_celery
 from .extensions import db
+from .tools.upload_store import UploadRequest
 
 def create_app():
     app = Flask(__name__)
+    # Arquivos enviados vão direto para o disco, com o SHA-256 calculado durante a leitura
+    app.request_class = UploadRequest
     CORS(app, origins=['http://localhost:5173'])
 
     # Configurações da aplicação
@@ -3,21 +3,25 @@ import os
 import sys
 import pickle
 import json
+import hashlib
 import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Typing imports
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, List, Tuple
 
 # Environment variable management
 from dotenv import load_dotenv
 
 # OpenAI imports
 import openai
+import httpx
 # from openai import AzureOpenAI
 
 # Multiprocessing imports
-from multiprocessing import Lock
-from multiprocessing.managers import BaseManager
+from multiprocessing.managers import BaseManager, IteratorProxy
 
 # Llama Index imports
 from llama_index.core import (
@@ -26,9 +30,15 @@ from llama_index.core import (
     StorageContext, 
     load_index_from_storage,
     Settings,
-    Document
+    Document,
+    QueryBundle,
+    get_response_synthesizer
 )
+from llama_index.core.vector_stores.types import MetadataFilters, ExactMatchFilter
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.schema import BaseNode
 from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.llms import ChatMessage
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms.openai import OpenAI
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
@@ -39,39 +49,118 @@ from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
 # Azure Cosmos DB imports
 # from azure.cosmos.aio import CosmosClient as AsyncCosmos
 from azure.cosmos import PartitionKey, CosmosClient
-from llama_index.vector_stores.azurecosmosnosql import AzureCosmosDBNoSqlVectorSearch
 
 # Azure Table Storage imports
 from llama_index.storage.docstore.azure import AzureDocumentStore
 from llama_index.storage.index_store.azure import AzureIndexStore
 from llama_index.storage.kvstore.azure.base import ServiceMode
 
+# Local tools
+from tools.index.rwlock import ReadWriteLock
+from tools.index.embedding_cache import EmbeddingCache, CachedEmbedding
+from tools.index.document_registry import DocumentRegistry
+from tools.index.numpy_vector_store import NumpyVectorStore
+from tools.index.tiered_vector_store import TieredVectorStore
+from tools.index.cosmos_vector_store import CosmosVectorStore
+from tools.index.bm25 import BM25Index, quoted_phrases, reciprocal_rank_fusion
+from tools.chat_sessions import get_chat_sessions
+from tools.video.conversation import ConversationBuffer
+
 # Load environment variables
 load_dotenv()
 
 """ --- FIM DOS IMPORTS --- """
 
+# Connection pool shared by the LLM and the embedding model (same Azure OpenAI endpoint). Keeping
+# connections alive saves the TCP + TLS handshake on every query.
+openai_http_client: Optional[httpx.Client] = None
+openai_max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+openai_keepalive_expiry = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "120"))
+openai_timeout = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+models_ready = False
+models_lock = threading.Lock()
+
+def get_openai_http_client():
+    global openai_http_client
+    if openai_http_client is None:
+        openai_http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=openai_max_connections,
+                max_keepalive_connections=openai_max_connections,
+                keepalive_expiry=openai_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(openai_timeout, connect=10.0),
+        )
+    return openai_http_client
+
 def model_settings():
+    """
+    Creates the LLM, the embedding model and the text splitter once and stores them in `Settings`.
+    Later calls return immediately, so every query reuses the same clients and their connections.
+    """
+    global models_ready
+
+    if models_ready:
+        return
+    with models_lock:
+        if models_ready:
+            return
+
+        http_client = get_openai_http_client()
+        llm = AzureOpenAI(
+            model="gpt-4o-mini",
+            deployment_name="gpt-4o-mini",
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_version="2024-02-01",
+            http_client=http_client,
+        ) 
+        Settings.llm = llm
+
+        embed_model = AzureOpenAIEmbedding(
+            model="text-embedding-3-small",
+            deployment_name="text-embedding-3-small",
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version="2024-02-01",
+            embed_batch_size=embed_batch_size,
+            http_client=http_client,
+        )
+        # Chunks already embedded once (re-uploaded files, re-indexed videos) are read from disk
+        Settings.embed_model = CachedEmbedding(embed_model, get_embedding_cache())
+        
+        Settings.text_splitter = SentenceSplitter(chunk_size=1024)
+        models_ready = True
 
-    llm = AzureOpenAI(
-        model="gpt-4o-mini",
-        deployment_name="gpt-4o-mini",
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_version="2024-02-01",
-    ) 
-    Settings.llm = llm
-
-    embed_model = AzureOpenAIEmbedding(
-        model="text-embedding-3-small",
-        deployment_name="text-embedding-3-small",
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version="2024-02-01",
-    )
-    Settings.embed_model = embed_model
-    
-    Settings.text_splitter = SentenceSplitter(chunk_size=1024)
+def warm_up_models():
+    """
+    Opens a connection to Azure OpenAI before the first query, with a one-word embedding request,
+    so the first user does not pay for DNS, TCP and TLS setup. Failures are only reported.
+    """
+    started = time.perf_counter()
+    try:
+        Settings.embed_model.get_query_embedding("warm up")
+        print(f"Azure OpenAI connection warmed up in {(time.perf_counter() - started) * 1000:.0f} ms")
+    except Exception as e:
+        print(f"Failed to warm up the Azure OpenAI connection: {e}")
+
+# Azure OpenAI accepts up to 2048 inputs per embedding request; bulk ingestion sends large batches
+embed_batch_size = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+parse_workers = int(os.getenv("INGEST_PARSE_WORKERS", "4"))
+
+embedding_cache: Optional[EmbeddingCache] = None
+embedding_cache_path = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+embedding_cache_max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+def get_embedding_cache():
+    """
+    Opens the on-disk embedding cache the first time it is needed and reuses it afterwards.
+    """
+    global embedding_cache
+    if embedding_cache is None:
+        embedding_cache = EmbeddingCache(embedding_cache_path, max_entries=embedding_cache_max_entries)
+    return embedding_cache
 
 def set_cosmos():
     cosmos_config = {
@@ -108,7 +197,7 @@ def set_cosmos():
     cosmos_database_properties_test: Dict[str, Any] = {}
 
     storage_context = StorageContext.from_defaults(
-        vector_store = AzureCosmosDBNoSqlVectorSearch(
+        vector_store = CosmosVectorStore(
             cosmos_client=cosmos_client,
             vector_embedding_policy=vector_embedding_policy,
             indexing_policy=indexing_policy,
@@ -124,42 +213,106 @@ def set_cosmos():
     return storage_context
 
 index: Optional[Any] = None
-stored_docs: Optional[Any] = {}
-lock = Lock()
+document_registry: Optional[DocumentRegistry] = None
+keyword_index: Optional[BM25Index] = None
+
+# BaseManager serves every client connection on its own thread. Queries share `index_lock` for
+# reading, inserts only take it for writing while the pre-embedded nodes are added, and
+# `ingest_lock` keeps writers (embedding, persist, registry) from interleaving with each other.
+index_lock = ReadWriteLock()
+ingest_lock = threading.Lock()
 
 index_name = "./saved_index"
+registry_name = os.getenv("DOCUMENT_REGISTRY_PATH", "documents.sqlite3")
+# Written by older versions of the index server, imported once into the registry
 pkl_name = "stored_documents.pkl"
 
+# "cosmos": Cosmos DB only, "local": NumpyVectorStore only (offline),
+# "tiered": writes go to both, queries are served by the local store
+vector_store_mode = os.getenv("VECTOR_STORE", "cosmos")
+local_vector_store_dir = os.getenv("LOCAL_VECTOR_STORE_DIR", "./local_vector_store")
+# "none" | "float16" | "int8": compressed copy scanned by queries, re-ranked with the float32 vectors
+local_vector_quantization = os.getenv("LOCAL_VECTOR_QUANTIZATION", "none")
+local_vector_rerank_factor = int(os.getenv("LOCAL_VECTOR_RERANK_FACTOR", "4"))
+# "none" | "ivf": inverted-file ANN index, used once the store has LOCAL_VECTOR_ANN_MIN_ROWS rows
+local_vector_ann = os.getenv("LOCAL_VECTOR_ANN", "none")
+local_vector_ivf_nlist = int(os.getenv("LOCAL_VECTOR_IVF_NLIST", "0"))
+local_vector_ivf_nprobe = int(os.getenv("LOCAL_VECTOR_IVF_NPROBE", "16"))
+local_vector_ann_min_rows = int(os.getenv("LOCAL_VECTOR_ANN_MIN_ROWS", "10000"))
+
+keyword_index_dir = os.getenv("KEYWORD_INDEX_DIR", "./keyword_index")
+
+# "vector": embeddings only, "keyword": BM25 only (no embedding call), "hybrid": both, fused by rank.
+# Without an explicit mode, questions with a "quoted phrase" are keyword searches, the rest hybrid.
+QUERY_MODES = ("vector", "keyword", "hybrid")
+query_top_k = 2
+# Number of results taken from each retriever before fusing them
+hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "10"))
+
+def local_vector_store():
+    return NumpyVectorStore(
+        local_vector_store_dir,
+        quantization=local_vector_quantization,
+        rerank_factor=local_vector_rerank_factor,
+        ann=local_vector_ann,
+        ivf_nlist=local_vector_ivf_nlist,
+        ivf_nprobe=local_vector_ivf_nprobe,
+        ann_min_rows=local_vector_ann_min_rows,
+    )
+
 def initialize_index():
     """
     This function initializes an index for storing and querying vectors, with the option to load from
-    Cosmos DB or create a new local index if loading fails, and also loads stored documents from a
-    pickle file.
+    Cosmos DB, the local NumPy vector store, or both (see `VECTOR_STORE`). If Cosmos DB cannot be
+    loaded the local store is used, so the index survives restarts. It also opens the registry of
+    stored documents.
     """
     
-    global index, stored_docs
+    global index, document_registry, keyword_index
 
     model_settings()
-    storage_context = set_cosmos()
 
     # --- Open Source ---
     # embed_model = HuggingFaceEmbedding(model_name="sentence-transformers/all-mpnet-base-v2", device="cpu")
 
-    with lock:
-        try:
-            index = VectorStoreIndex.from_vector_store(storage_context.vector_store)
-            print("Index loaded from Cosmos DB.")
-            # query_index("Qual é o meu nome?")
-        except Exception as e:
-            print(f"Failed to load index from Cosmos DB: {e} \n Using local index")
-            index = VectorStoreIndex(nodes=[])
-            index.storage_context.persist(persist_dir=index_name)
-            print("New index created and persisted in Cosmos DB.")
-
-        if os.path.exists(pkl_name):
-            print("Loading stored docs from pickle...")
+    with index_lock.write_locked():
+        if vector_store_mode == "local":
+            vector_store = local_vector_store()
+            print("Index loaded from the local vector store.")
+        else:
+            try:
+                vector_store = set_cosmos().vector_store
+                if vector_store_mode == "tiered":
+                    vector_store = TieredVectorStore(hot=local_vector_store(), cold=vector_store)
+                print("Index loaded from Cosmos DB.")
+                # query_index("Qual é o meu nome?")
+            except Exception as e:
+                print(f"Failed to load index from Cosmos DB: {e} \n Using local vector store")
+                vector_store = local_vector_store()
+        index = VectorStoreIndex.from_vector_store(vector_store)
+        retriever_cache.clear()
+        synthesizer_cache.clear()
+
+        document_registry = DocumentRegistry(registry_name)
+        if document_registry.count() == 0 and os.path.exists(pkl_name):
+            print("Importing stored docs from pickle into the document registry...")
             with open(pkl_name, "rb") as f:
-                stored_docs = pickle.load(f)
+                legacy_docs = pickle.load(f)
+            document_registry.upsert_many(
+                {"doc_id": doc_id, "preview": doc_text} for doc_id, doc_text in legacy_docs.items()
+            )
+
+        keyword_index = BM25Index(keyword_index_dir)
+        if len(keyword_index) == 0:
+            # Nodes inserted before the keyword index existed; only local stores can list them
+            try:
+                existing_nodes = vector_store.get_nodes()
+            except NotImplementedError:
+                existing_nodes = []
+            if existing_nodes:
+                print(f"Building the keyword index from {len(existing_nodes)} stored nodes...")
+                keyword_index.add(existing_nodes)
+                keyword_index.save()
 
         # if os.path.exists(index_name):
         #     index = load_index_from_storage(
@@ -167,28 +320,487 @@ def initialize_index():
         #         embed_model=embed_model
         #     )
 
-def query_index(query_text):
+# Retrievers and response synthesizers hold no per-query state; they are built once per set of
+# parameters instead of on every query. Both caches are cleared when the index is (re)loaded.
+retriever_cache: Dict[Tuple[int, Optional[str]], Any] = {}
+synthesizer_cache: Dict[bool, Any] = {}
+
+def get_retriever(top_k, partition=None):
+    """
+    :param top_k: Number of nodes returned by the vector search.
+    :param partition: If given, only nodes with this `partition` metadata are searched.
+    :return: The cached vector retriever of the global index for these parameters.
+    """
+    key = (top_k, partition)
+    retriever = retriever_cache.get(key)
+    if retriever is None:
+        filters = MetadataFilters(filters=[ExactMatchFilter(key="partition", value=partition)]) if partition else None
+        retriever = retriever_cache.setdefault(key, index.as_retriever(similarity_top_k=top_k, filters=filters))
+    return retriever
+
+def get_synthesizer(streaming=False):
+    synthesizer = synthesizer_cache.get(streaming)
+    if synthesizer is None:
+        synthesizer = synthesizer_cache.setdefault(streaming, get_response_synthesizer(streaming=streaming))
+    return synthesizer
+
+def default_query_mode(query_text):
+    return "keyword" if quoted_phrases(query_text) else "hybrid"
+
+def retrieve_nodes(query_text, mode=None, partition=None):
+    """
+    Finds the nodes used to answer `query_text`.
+
+    The query embedding runs without any lock; only the vector search itself holds `index_lock` for
+    reading, so concurrent queries never wait on each other and never see an insert half applied.
+
+    In "hybrid" mode the vector and BM25 keyword results are fused with reciprocal rank fusion. In
+    "keyword" mode the query is never embedded; if the keyword index finds nothing, the vector search
+    is used instead.
+
+    :param query_text: The text used to query the global index.
+    :param mode: "vector", "keyword" or "hybrid". If None, `default_query_mode` picks one.
+    :param partition: If given, only nodes of this partition are retrieved.
+    :return: The query bundle and the retrieved nodes, best first.
+    """
+    global index, keyword_index
+
+    mode = mode or default_query_mode(query_text)
+    if mode not in QUERY_MODES:
+        raise ValueError(f"Unknown query mode {mode!r}, expected one of {QUERY_MODES}")
+
+    keyword_nodes = []
+    if mode in ("keyword", "hybrid") and keyword_index is not None:
+        keyword_nodes = keyword_index.search(
+            query_text, top_k=query_top_k if mode == "keyword" else hybrid_candidates, partition=partition
+        )
+
+    if mode == "keyword" and keyword_nodes:
+        return QueryBundle(query_str=query_text), keyword_nodes
+
+    query_bundle = QueryBundle(
+        query_str=query_text,
+        embedding=Settings.embed_model.get_query_embedding(query_text),
+    )
+    retriever = get_retriever(hybrid_candidates if keyword_nodes else query_top_k, partition)
+    with index_lock.read_locked():
+        nodes = retriever.retrieve(query_bundle)
+    if keyword_nodes:
+        nodes = reciprocal_rank_fusion([nodes, keyword_nodes], top_k=query_top_k)
+    return query_bundle, nodes
+
+def query_index(query_text, mode=None, partition=None):
     """
     Queries the global index using a language model to retrieve relevant information based on the input query text.
+
+    The answer synthesis runs without any lock, see `retrieve_nodes` for the retrieval.
     
     :param query_text: The text used to query the global index.
+    :param mode: "vector", "keyword" or "hybrid". If None, `default_query_mode` picks one.
+    :param partition: If given, only nodes of this partition are used.
     :return: The response obtained by querying the global index using the provided query_text. The response 
             is generated by utilizing a language model (llm) and the query engine with specified parameters 
             such as similarity_top_k.
     """
 
-    global index
-
     model_settings()
 
-    query_engine = index.as_query_engine(
-        similarity_top_k=2,
-    )
-    response = query_engine.query(query_text)
+    query_bundle, nodes = retrieve_nodes(query_text, mode, partition)
+    response = get_synthesizer().synthesize(query_bundle, nodes)
     print(response)
 
     return response
 
+def format_sources(nodes):
+    """
+    Converts retrieved nodes into plain dictionaries that can be sent to the Flask app as JSON.
+    
+    :param nodes: The `NodeWithScore` objects used to answer a query.
+    :return: A list with the text, score, document ID and, for video sections, the start and end of each node.
+    """
+    return [
+        {
+            "text": node.node.get_content(),
+            "similarity": round(node.score, 4) if node.score is not None else None,
+            "doc_id": node.node.ref_doc_id,
+            "start": node.node.metadata.get("start"),
+            "end": node.node.metadata.get("end"),
+        }
+        for node in nodes
+    ]
+
+def stream_query_index(query_text, mode=None, partition=None):
+    """
+    Same as `query_index`, but yields the answer while the language model writes it.
+
+    Registered with `IteratorProxy`, so each event crosses the manager connection as soon as it is
+    produced. The events are dictionaries:
+        {"event": "token", "data": "<text>"}          one per chunk of the answer
+        {"event": "sources", "data": [...]}            the nodes used, see `format_sources`
+        {"event": "done", "data": {"retrieval_ms", "ttft_ms", "total_ms"}}
+    `ttft_ms` (time to first token) and `total_ms` are measured from the start of the call.
+    
+    :param query_text: The text used to query the global index.
+    :param mode: "vector", "keyword" or "hybrid". If None, `default_query_mode` picks one.
+    :param partition: If given, only nodes of this partition are used.
+    """
+    started = time.perf_counter()
+
+    model_settings()
+
+    query_bundle, nodes = retrieve_nodes(query_text, mode, partition)
+    retrieval_ms = (time.perf_counter() - started) * 1000
+
+    response = get_synthesizer(streaming=True).synthesize(query_bundle, nodes)
+    ttft_ms = None
+    for token in response.response_gen:
+        if ttft_ms is None:
+            ttft_ms = (time.perf_counter() - started) * 1000
+        yield {"event": "token", "data": token}
+
+    yield {"event": "sources", "data": format_sources(nodes)}
+    total_ms = (time.perf_counter() - started) * 1000
+    print(f"stream_query_index: retrieval {retrieval_ms:.0f} ms, first token {ttft_ms or total_ms:.0f} ms, total {total_ms:.0f} ms")
+    yield {"event": "done", "data": {"retrieval_ms": retrieval_ms, "ttft_ms": ttft_ms, "total_ms": total_ms}}
+
+# Multi-turn chat (/chat): sessions live in Redis (tools/chat_sessions.py); older turns are
+# summarized in the background once a session goes over CHAT_HISTORY_TOKEN_BUDGET
+CHAT_MODEL = "gpt-4o-mini"
+chat_prompt_token_limit = int(os.getenv("CHAT_PROMPT_TOKEN_LIMIT", "8192"))
+chat_context_tokens = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
+chat_max_response_tokens = int(os.getenv("CHAT_MAX_RESPONSE_TOKENS", "512"))
+chat_system_message = {
+    "role": "system",
+    "content": "You are a helpful assistant. Answer using the context information and the conversation so far. "
+               "If the context does not contain the answer, say so.",
+}
+# One worker: compactions are short and a session is never compacted twice at the same time
+compaction_executor = ThreadPoolExecutor(max_workers=1)
+
+def chat_buffer():
+    return ConversationBuffer(chat_system_message, token_limit=chat_prompt_token_limit,
+                              max_response_tokens=chat_max_response_tokens, model=CHAT_MODEL)
+
+def chat_llm(messages):
+    response = Settings.llm.chat([ChatMessage(role=m["role"], content=m["content"]) for m in messages],
+                                 max_tokens=chat_max_response_tokens)
+    return response.message.content or ""
+
+def chat(session_id, message, mode=None, partition=None):
+    """
+    Answers one turn of a conversation kept in Redis.
+
+    The prompt is the system message, the rolling summary of the compacted turns, the nodes retrieved
+    for this turn and the recent turns; its size does not grow with the length of the conversation.
+    Token counts are stored with the turns, so nothing but the new turns is encoded. When the stored
+    turns go over the budget of the session, `compact_chat_session` summarizes the oldest ones in the
+    background; this call does not wait for it.
+
+    :param session_id: The conversation; an unknown ID starts a new one.
+    :param message: The question.
+    :param mode: "vector", "keyword" or "hybrid". If None, `default_query_mode` picks one.
+    :param partition: If given, only nodes of this partition are used. Defaults to the partition
+            of the previous turns.
+    :return: {"session_id", "text", "sources", "compacting"}.
+    """
+    model_settings()
+    sessions = get_chat_sessions()
+    session = sessions.load(session_id)
+    partition = partition or session.partition
+
+    # Follow-up questions ("and the second one?") are retrieved together with the previous question
+    previous = [m["content"] for m, _ in session.turns if m["role"] == "user"][-1:]
+    _, nodes = retrieve_nodes("\n".join(previous + [message]), mode, partition)
+
+    buffer = chat_buffer()
+    if session.summary:
+        buffer.pin({"role": "system", "content": f"Summary of the conversation so far:\n{session.summary}"},
+                   tokens=session.summary_tokens)
+    for turn, tokens in session.turns:
+        buffer.append(turn, tokens)
+    user_turn = {"role": "user", "content": message}
+    user_tokens = buffer.count(user_turn)
+    buffer.append(user_turn, user_tokens)
+
+    # Retrieved nodes, best first, within chat_context_tokens
+    sources, used = [], 0
+    for node in nodes:
+        text = node.node.get_content()
+        tokens = buffer.count({"role": "system", "content": text})
+        if used + tokens > chat_context_tokens:
+            continue
+        sources.append((node, text))
+        used += tokens
+    context = []
+    if sources:
+        context_text = "\n---------------------\n".join(text for _, text in sources)
+        context = [{"role": "system", "content": f"Context information:\n{context_text}"}]
+
+    answer = chat_llm(buffer.messages(context))
+    assistant_turn = {"role": "assistant", "content": answer}
+    history_tokens = sessions.append(session_id, [(user_turn, user_tokens), (assistant_turn, buffer.count(assistant_turn))],
+                                     partition=partition)
+
+    compacting = False
+    if sessions.over_budget(history_tokens) and sessions.claim_compaction(session_id):
+        compaction_executor.submit(compact_chat_session, session_id)
+        compacting = True
+
+    return {
+        "session_id": session_id,
+        "text": answer,
+        "sources": format_sources([node for node, _ in sources]),
+        "compacting": compacting,
+    }
+
+def compact_chat_session(session_id):
+    """
+    Folds the oldest turns of a session into its rolling summary, so the turns left fit in half of
+    the budget. Runs on `compaction_executor` after the session was claimed; failures are only
+    printed (the turns stay and the next turn over the budget tries again).
+    """
+    sessions = get_chat_sessions()
+    try:
+        session = sessions.load(session_id)
+        count = sessions.turns_to_compact(session)
+        if count == 0:
+            return
+        old_turns = session.turns[:count]
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m, _ in old_turns)
+        summary = chat_llm([
+            {"role": "system", "content": "Update the summary of a conversation with its next turns. Keep names, "
+                                          "facts, numbers and open questions the user may refer to later. "
+                                          "Answer with the new summary only."},
+            {"role": "user", "content": f"Current summary:\n{session.summary or '(none)'}\n\nNext turns:\n{transcript}"},
+        ])
+        summary_tokens = chat_buffer().count({"role": "system", "content": f"Summary of the conversation so far:\n{summary}"})
+        sessions.compact(session_id, count, sum(tokens for _, tokens in old_turns), summary, summary_tokens)
+        print(f"compact_chat_session: {count} turns of {session_id} summarized in {summary_tokens} tokens")
+    except Exception as e:
+        print(f"Failed to compact chat session {session_id}: {e}")
+    finally:
+        sessions.release_compaction(session_id)
+
+def end_chat_session(session_id):
+    """
+    :return: True if the session existed.
+    """
+    return get_chat_sessions().delete(session_id)
+
+def load_documents(doc_file_paths: List[str], doc_ids: Optional[List[Optional[str]]] = None) -> List[Document]:
+    """
+    Parses several files in parallel with `SimpleDirectoryReader`, one file per worker thread.
+    
+    :param doc_file_paths: The file paths of the documents to be parsed.
+    :param doc_ids: Optional IDs, one per file. A `None` entry keeps the ID assigned by the reader.
+    :return: The parsed documents, in the order of `doc_file_paths`.
+    """
+    return [document for file_documents in load_documents_by_file(doc_file_paths, doc_ids) for document in file_documents]
+
+def load_documents_by_file(doc_file_paths: List[str], doc_ids: Optional[List[Optional[str]]] = None) -> List[List[Document]]:
+    """
+    Same as `load_documents`, but returns the documents of each file in their own list (a reader may
+    build several documents from one file).
+    """
+    if doc_ids is None:
+        doc_ids = [None] * len(doc_file_paths)
+    if len(doc_ids) != len(doc_file_paths):
+        raise ValueError("doc_ids must have one entry per file")
+
+    def load(doc_file_path, doc_id):
+        file_documents = SimpleDirectoryReader(input_files=[doc_file_path]).load_data()
+        for document in file_documents:
+            if doc_id is not None:
+                document.id_ = doc_id
+        return file_documents
+
+    with ThreadPoolExecutor(max_workers=max(1, min(parse_workers, len(doc_file_paths)))) as pool:
+        return list(pool.map(load, doc_file_paths, doc_ids))
+
+def commit_nodes(new_nodes: List[BaseNode], stale_node_ids: List[str], untracked_doc_ids: List[str]) -> None:
+    """
+    Applies one change set to the index, the keyword index and the node mapping of the document
+    registry. The caller must hold `ingest_lock`.
+
+    Only adding the embedded nodes and removing the stale ones, in the vector store and the keyword
+    index together, happen under `index_lock`, so queries (hybrid ones included) see either the old or
+    the new version of a document, never both. The keyword index is skipped if it was never opened.
+    
+    :param new_nodes: Embedded nodes to add. Their `ref_doc_id` is their document ID.
+    :param stale_node_ids: Nodes to remove, e.g. the previous version of a re-inserted document.
+    :param untracked_doc_ids: Documents inserted before nodes were tracked; all their nodes are removed.
+    """
+    global index, document_registry, keyword_index
+
+    # Tokenized before taking the lock, like the nodes are embedded before
+    tokenized = BM25Index.tokenize_nodes(new_nodes) if keyword_index is not None else None
+
+    with index_lock.write_locked():
+        for doc_id in untracked_doc_ids:
+            index.delete_ref_doc(doc_id)
+        if stale_node_ids:
+            index.delete_nodes(stale_node_ids)
+        if new_nodes:
+            index.insert_nodes(new_nodes)
+
+        if keyword_index is not None:
+            for doc_id in untracked_doc_ids:
+                keyword_index.delete_ref_doc(doc_id)
+            keyword_index.delete_nodes(stale_node_ids)
+            keyword_index.add(new_nodes, tokenized)
+
+    # Writers are serialized by ingest_lock, so persisting needs no index lock
+    index.storage_context.persist(persist_dir=index_name)
+    if keyword_index is not None:
+        keyword_index.save()
+
+    document_registry.remove_nodes(stale_node_ids)
+    document_registry.add_nodes(
+        {
+            "node_id": node.node_id,
+            "doc_id": node.ref_doc_id,
+            "section_key": node.metadata.get("section_key"),
+            "content_hash": node.metadata.get("content_hash"),
+        }
+        for node in new_nodes
+    )
+
+def tracked_nodes(doc_ids) -> Tuple[List[str], List[str]]:
+    """
+    Looks up the nodes currently stored for `doc_ids`.
+
+    :return: The recorded node IDs, and the IDs of registered documents that have no recorded nodes
+            (inserted by older versions of the index server).
+    """
+    global document_registry
+    node_ids, untracked = [], []
+    for doc_id in doc_ids:
+        entries = document_registry.get_nodes(doc_id)
+        if entries:
+            node_ids.extend(entry["node_id"] for entry in entries)
+        elif document_registry.get(doc_id) is not None:
+            untracked.append(doc_id)
+    return node_ids, untracked
+
+def insert_documents(documents: List[Document]) -> None:
+    """
+    Splits, embeds and commits a batch of documents to the global index.
+
+    Splitting and embedding happen before the index is locked for writing, so concurrent queries are
+    only blocked while the ready nodes are added to the index. The chunks of the whole batch are
+    embedded in requests of `embed_batch_size` inputs, and the index and the document registry are
+    written once per batch. A document ID that is already in the index is replaced, not duplicated.
+    
+    :param documents: The documents to be inserted.
+    """
+    global index, document_registry
+    if not documents:
+        return
+
+    with ingest_lock:
+        nodes = run_transformations(documents, [Settings.text_splitter, Settings.embed_model])
+
+        stale_node_ids, untracked = tracked_nodes({document.id_ for document in documents})
+        commit_nodes(nodes, stale_node_ids, untracked)
+        for document in documents:
+            index.docstore.set_document_hash(document.get_doc_id(), document.hash)
+
+        # Keep track of stored docs -- llama_index doesn't make this easy
+        # Pages of a file inserted under one doc_id are registered with the preview of the first page
+        records = {}
+        for document in documents:
+            records.setdefault(document.id_, {
+                "doc_id": document.id_,
+                "preview": document.text[0:200],  # only take the first 200 chars
+                "source": document.metadata.get("file_name"),
+                "partition": document.metadata.get("partition"),
+            })
+        document_registry.upsert_many(records.values())
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def upsert_video_content(prompt_content, doc_id, source=None):
+    """
+    Inserts or updates the prompt content of a video (see `prompt_content/prompt_content.json`), one
+    document section at a time.
+
+    Each section is identified by its `id` and fingerprinted by the hash of its `content`. Sections
+    whose hash did not change are left untouched; only new or changed sections are split, embedded
+    and written, and the nodes of changed or removed sections are deleted. Node IDs are derived from
+    the document ID, section and hash, so they are stable across re-uploads.
+    
+    :param prompt_content: The prompt content dictionary returned by the Video Indexer.
+    :param doc_id: The document ID of the video, e.g. the name of its _Video.json file.
+    :param source: The file the content was read from, shown as the document source.
+    :return: A dictionary with the number of sections added, removed and unchanged.
+    """
+    global document_registry
+
+    sections = prompt_content.get("sections", [])
+
+    with ingest_lock:
+        existing = document_registry.get_nodes(doc_id)
+        untracked = [] if existing or document_registry.get(doc_id) is None else [doc_id]
+        previous = {}
+        for entry in existing:
+            previous.setdefault((entry["section_key"], entry["content_hash"]), []).append(entry["node_id"])
+
+        documents, current = [], set()
+        for position, section in enumerate(sections):
+            section_key = str(section.get("id", position))
+            section_hash = content_hash(section.get("content", ""))
+            current.add((section_key, section_hash))
+            if (section_key, section_hash) in previous:
+                continue
+            metadata = {
+                "video_name": prompt_content.get("name"),
+                "partition": prompt_content.get("partition"),
+                "start": section.get("start"),
+                "end": section.get("end"),
+                "file_name": source,
+                "section_key": section_key,
+                "content_hash": section_hash,
+            }
+            documents.append(Document(
+                text=section.get("content", ""),
+                id_=doc_id,
+                metadata=metadata,
+                excluded_embed_metadata_keys=["partition", "start", "end", "file_name", "section_key", "content_hash"],
+                excluded_llm_metadata_keys=["file_name", "section_key", "content_hash"],
+            ))
+
+        nodes = []
+        for document in documents:
+            # One section per call: the splitter merges metadata by document ID, and all sections share it
+            section_nodes = Settings.text_splitter([document])
+            for chunk, node in enumerate(section_nodes):
+                node.id_ = f"{doc_id}:{node.metadata['section_key']}:{node.metadata['content_hash'][:16]}:{chunk}"
+            nodes.extend(section_nodes)
+        nodes = Settings.embed_model(nodes)
+
+        stale_node_ids = [
+            node_id for key, node_ids in previous.items() if key not in current for node_id in node_ids
+        ]
+        if nodes or stale_node_ids or untracked:
+            commit_nodes(nodes, stale_node_ids, untracked)
+
+        document_registry.upsert_many([{
+            "doc_id": doc_id,
+            "preview": (sections[0].get("content", "") if sections else "")[0:200],
+            "source": source,
+            "partition": prompt_content.get("partition"),
+        }])
+
+    summary = {
+        "doc_id": doc_id,
+        "added": len(current - set(previous)),
+        "removed": len(set(previous) - current),
+        "unchanged": len(current & set(previous)),
+    }
+    print(f"upsert_video_content: {summary}")
+    return summary
+
 def insert_into_index(doc_file_path, doc_id=None):
     """
     Inserts a new document into a global index, storing the document's text and ID in a dictionary and 
@@ -197,49 +809,126 @@ def insert_into_index(doc_file_path, doc_id=None):
     :param doc_file_path: The file path of the document to be inserted into the global index.
     :param doc_id: The unique identifier for the document being inserted. If not provided, a default 
                     ID will be assigned.
-    :return: None. This function updates the global index with the new document.
+    :return: The IDs of the inserted documents.
     """
-    global index, stored_docs
-    documents = SimpleDirectoryReader(input_files=[doc_file_path]).load_data()
+    documents = load_documents([doc_file_path], [doc_id])
+    insert_documents(documents)
 
-    with lock:
-        for document in documents:
-            if doc_id is not None:
-                document.id_ = doc_id
-            index.insert(document)
+    return [document.id_ for document in documents]
 
-            stored_docs[document.id_] = document.text[0:200]  # only take the first 200 chars
+def insert_many_into_index(doc_file_paths, doc_ids=None, by_file=False):
+    """
+    Inserts many documents into the global index at once. The files are parsed in parallel, their chunks
+    are embedded in large batches, and the index and the stored docs are written once for the whole batch
+    instead of once per file.
+    
+    :param doc_file_paths: The file paths of the documents to be inserted into the global index.
+    :param doc_ids: Optional list with one ID per file. If not provided, default IDs will be assigned.
+    :param by_file: Return the IDs of each file in their own list, in the order of `doc_file_paths`.
+    :return: The IDs of the inserted documents.
+    """
+    documents_by_file = load_documents_by_file(list(doc_file_paths), doc_ids)
+    insert_documents([document for file_documents in documents_by_file for document in file_documents])
 
-        index.storage_context.persist(persist_dir=index_name)
+    if by_file:
+        return [[document.id_ for document in file_documents] for file_documents in documents_by_file]
+    return [document.id_ for file_documents in documents_by_file for document in file_documents]
 
-        first_document = documents[0]
-        # Keep track of stored docs -- llama_index doesn't make this easy
-        stored_docs[first_document.doc_id] = first_document.text[0:200] # only take the first 200 chars
+def get_documents_list(offset=0, limit=None):
+    """
+    Retrieves one page of the currently stored documents along with their IDs and text.
+    
+    :param offset: Number of documents to skip.
+    :param limit: Maximum number of documents to return. If None, returns every document after `offset`.
+    :return: A list of dictionaries, where each dictionary contains the ID, the text preview, the source,
+            the partition and the timestamps of a document stored in the document registry.
+    """
+    global document_registry
+    documents_list = []
+    for record in document_registry.list_documents(offset=offset, limit=limit):
+        documents_list.append({
+            "id": record["doc_id"],
+            "text": record["preview"],
+            "source": record["source"],
+            "partition": record["partition"],
+            "created_at": record["created_at"],
+            "updated_at": record["updated_at"],
+        })
 
-        with open(pkl_name, "wb") as f:
-            pickle.dump(stored_docs, f)
+    return documents_list
 
-    return
 
-def get_documents_list():
+def get_embedding_cache_stats():
     """
-    Retrieves the list of currently stored documents along with their IDs and text.
+    Returns the hit/miss counters of the embedding cache since the index server started.
     
-    :return: A list of dictionaries, where each dictionary contains the ID and text of a document stored 
-            in the `stored_docs` dictionary.
+    :return: A dictionary with the number of entries, hits, misses, evictions and the hit rate.
     """
-    global stored_docs
-    documents_list = []
-    for doc_id, doc_text in stored_docs.items():
-        documents_list.append({"id": doc_id, "text": doc_text})
+    return get_embedding_cache().stats()
 
-    return documents_list
 
+def insert_video_content(prompt_content, doc_id, video_name=None, partition=None):
+    """
+    Indexes the prompt content of a video straight from memory, one node per section (or more for
+    long sections), with the section `start`/`end`, the partition and the video name as metadata.
+    Only the section text is embedded, not the JSON around it. Calling it again for the same
+    `doc_id` only re-indexes the sections that changed, see `upsert_video_content`.
+    
+    :param prompt_content: The prompt content dictionary returned by `VideoIndexerClient.generate_prompt`.
+    :param doc_id: The document ID of the video.
+    :param video_name: Overrides the `name` of the prompt content.
+    :param partition: Overrides the `partition` of the prompt content.
+    :return: A dictionary with the number of sections added, removed and unchanged.
+    """
+    content = dict(prompt_content)
+    if video_name is not None:
+        content["name"] = video_name
+    if partition is not None:
+        content["partition"] = partition
+
+    return upsert_video_content(content, doc_id, source=doc_id)
+
+def upsert_document(doc_file_path, doc_id):
+    """
+    Inserts a document, or replaces the document already stored under `doc_id`. Video prompt content
+    files (JSON with `sections`) are updated section by section, see `upsert_video_content`.
+    
+    :param doc_file_path: The file path of the new version of the document.
+    :param doc_id: The ID of the document to insert or replace.
+    :return: A dictionary describing what changed.
+    """
+    if doc_file_path.lower().endswith(".json"):
+        with open(doc_file_path, "r", encoding="utf-8") as f:
+            try:
+                content = json.load(f)
+            except ValueError:
+                content = None
+        if isinstance(content, dict) and isinstance(content.get("sections"), list):
+            return upsert_video_content(content, doc_id, source=os.path.basename(doc_file_path))
+
+    insert_documents(load_documents([doc_file_path], [doc_id]))
+    return {"doc_id": doc_id, "replaced": True}
+
+def delete_document_from_index(doc_id):
+    """
+    Removes a document and all of its nodes from the vector store, the keyword index and the
+    document registry.
+    
+    :param doc_id: The ID of the document to delete.
+    :return: True if the document was found in the document registry.
+    """
+    global document_registry
 
+    with ingest_lock:
+        node_ids, untracked = tracked_nodes([doc_id])
+        if not node_ids and not untracked:
+            # Not registered; still try the vector store in case it was inserted by other means
+            untracked = [doc_id]
+        commit_nodes([], node_ids, untracked)
+        found = document_registry.delete(doc_id)
 
-" --- A desenvolver --- "
-def delete_document_from_index():
-    print("deletou")
+    print(f"delete_document_from_index: {doc_id} ({len(node_ids)} nodes)")
+    return found
 
 
 import socket, subprocess    
@@ -280,6 +969,7 @@ if __name__ == "__main__":
     # init the global index
     print("initializing index...")
     initialize_index()
+    warm_up_models()
 
     # Simular progresso da inicialização do servidor
     for _ in tqdm(range(100), desc="Iniciando servidor", ncols=100):
@@ -298,8 +988,16 @@ if __name__ == "__main__":
             
     manager = BaseManager(address=('127.0.0.1', port), authkey=b'password')
     manager.register('query_index', query_index)
+    manager.register('stream_query_index', stream_query_index, proxytype=IteratorProxy)
     manager.register('insert_into_index', insert_into_index)
+    manager.register('insert_many_into_index', insert_many_into_index)
     manager.register('get_documents_list', get_documents_list)
+    manager.register('upsert_document', upsert_document)
+    manager.register('insert_video_content', insert_video_content)
+    manager.register('delete_document_from_index', delete_document_from_index)
+    manager.register('get_embedding_cache_stats', get_embedding_cache_stats)
+    manager.register('chat', chat)
+    manager.register('end_chat_session', end_chat_session)
     server = manager.get_server()
 
     print("index server started...")
@@ -1,7 +1,7 @@
-from flask import Blueprint, render_template, request, jsonify, make_response, redirect
+from flask import Blueprint, render_template, request, jsonify, make_response, redirect, Response, stream_with_context
 import os
 from werkzeug.utils import secure_filename
-from multiprocessing.managers import BaseManager
+from multiprocessing.managers import BaseManager, IteratorProxy
 
 main = Blueprint('main', __name__)
 
@@ -9,8 +9,16 @@ main = Blueprint('main', __name__)
 # NOTE: you might want to handle the password in a less hardcoded way
 manager = BaseManager(address=('127.0.0.1', 5002), authkey=b'password')
 manager.register('query_index')
+manager.register('stream_query_index', proxytype=IteratorProxy)
 manager.register('insert_into_index')
+manager.register('insert_many_into_index')
 manager.register('get_documents_list')
+manager.register('upsert_document')
+manager.register('insert_video_content')
+manager.register('delete_document_from_index')
+manager.register('get_embedding_cache_stats')
+manager.register('chat')
+manager.register('end_chat_session')
 manager.connect()
 
 from app.tools.video.client.video_indexer_client import VideoIndexerClient
@@ -18,9 +26,8 @@ from app.tools.video.client.Consts import Consts
 import json, sys
 from dotenv import dotenv_values
 from pprint import pprint
-import redis
-import threading
-import time
+import uuid
+from app.tools.upload_store import get_upload_registry, save_upload, upload_digest, unique_upload_path, remove_upload
 
 
 def config_video_indexer_client():
@@ -34,6 +41,8 @@ def config_video_indexer_client():
     AzureResourceManager = 'https://management.azure.com'
     consts = Consts(ApiVersion, ApiEndpoint, AzureResourceManager, AccountName, ResourceGroup, SubscriptionId)
 
+    # Tokens and account details come from the shared token cache (Redis), so this only calls Azure
+    # when no Flask or Celery process holds a valid token
     client = VideoIndexerClient()
     client.authenticate_async(consts)
     client.get_account_async()
@@ -51,20 +60,88 @@ def query_index():
     query_text = request.args.get("text", None)
     if query_text is None:
         return "No text found, please include a ?text=blah parameter in the URL", 400
+    # "vector" | "keyword" | "hybrid"; by default quoted phrases are keyword searches, the rest hybrid
+    mode = request.args.get("mode", None)
+    if mode not in (None, "vector", "keyword", "hybrid"):
+        return "Invalid mode, expected one of vector, keyword or hybrid", 400
+    # Restricts the search to the sections indexed with this partition
+    partition = request.args.get("partition", None)
     
-    response = manager.query_index(query_text)._getvalue()
+    response = manager.query_index(query_text, mode, partition)._getvalue()
     print("MARI AQUI-------------->",response)
     response_json = {
         "text": str(response),
-        "sources":[""" {"text": str(x.text), 
-                    "similarity": round(x.score, 2),
-                    "doc_id": str(x.id_),
-                    "start": x.node_info['start'],
-                    "end": x.node_info['end'],
-                    } for x in response.source_nodes """]
+        # start/end are only set for video sections
+        "sources":[{"text": str(x.node.get_content()),
+                    "similarity": round(x.score, 2) if x.score is not None else None,
+                    "doc_id": str(x.node.ref_doc_id),
+                    "start": x.node.metadata.get('start'),
+                    "end": x.node.metadata.get('end'),
+                    } for x in response.source_nodes]
     }
     return make_response(jsonify(response_json)), 200
 
+@main.route("/query/stream", methods=["GET"])
+def stream_query_index():
+    """
+    Server-sent events version of /query: `token` events carry the answer as it is generated, then a
+    `sources` event lists the nodes used and a `done` event reports retrieval_ms, ttft_ms and total_ms.
+    """
+    global manager
+    query_text = request.args.get("text", None)
+    if query_text is None:
+        return "No text found, please include a ?text=blah parameter in the URL", 400
+    mode = request.args.get("mode", None)
+    if mode not in (None, "vector", "keyword", "hybrid"):
+        return "Invalid mode, expected one of vector, keyword or hybrid", 400
+    # Restricts the search to the sections indexed with this partition
+    partition = request.args.get("partition", None)
+
+    def generate():
+        events = manager.stream_query_index(query_text, mode, partition)
+        try:
+            for event in events:
+                yield "event: {}\ndata: {}\n\n".format(event["event"], json.dumps(event["data"]))
+        except Exception as e:
+            yield "event: error\ndata: {}\n\n".format(json.dumps(str(e)))
+        finally:
+            # Stops the generation on the index server when the browser goes away
+            events.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@main.route("/chat", methods=["POST", "DELETE"])
+def chat():
+    """
+    Multi-turn chat over the indexed documents. POST {"message", "session_id"?, "mode"?, "partition"?}
+    answers {"session_id", "text", "sources", "compacting"}; send the session_id back with the next
+    message to continue the conversation. The history stays on the server (Redis), only the new
+    message is sent. DELETE ?session_id=... ends a conversation.
+    """
+    global manager
+    if request.method == "DELETE":
+        session_id = request.args.get("session_id", None)
+        if session_id is None:
+            return "No session_id found", 400
+        found = manager.end_chat_session(session_id)._getvalue()
+        return make_response(jsonify({"session_id": session_id, "deleted": found})), 200 if found else 404
+
+    body = request.get_json(silent=True) or {}
+    message = body.get("message")
+    if not message:
+        return "No message found, please include a \"message\" in the JSON body", 400
+    mode = body.get("mode")
+    if mode not in (None, "vector", "keyword", "hybrid"):
+        return "Invalid mode, expected one of vector, keyword or hybrid", 400
+    session_id = body.get("session_id") or str(uuid.uuid4())
+
+    response = manager.chat(session_id, message, mode, body.get("partition"))._getvalue()
+    return make_response(jsonify(response)), 200
+
 @main.route("/uploadFile", methods=["POST"])
 def upload_file():
     global manager
@@ -76,37 +153,170 @@ def upload_file():
         uploaded_file = request.files["file"]
         filename = secure_filename(uploaded_file.filename)
         print(filename)
+
+        # Os mesmos bytes já foram indexados: nada a embutir de novo
+        upload_registry = get_upload_registry()
+        content_hash, size = upload_digest(uploaded_file)
+        upload = upload_registry.get(content_hash, "file")
+        if upload is not None:
+            return "File already inserted as {}".format(", ".join(upload["doc_ids"])), 200
+
         diretorio_atual = os.getcwd()
         upload_folder = 'uploads/'
-        os.makedirs(upload_folder, exist_ok=True)
         # filepath = os.path.join(diretorio_atual, 'documents', os.path.basename(filename))
-        filepath = os.path.join(diretorio_atual, upload_folder, uploaded_file.filename)
+        filepath = unique_upload_path(filename, os.path.join(diretorio_atual, upload_folder))
         print(filepath)
 
-        uploaded_file.save(filepath)
+        save_upload(uploaded_file, filepath)
 
         if request.form.get("filename_as_doc_id", None) is not None:
-            manager.insert_into_index(filepath, doc_id=filename)
+            doc_ids = manager.insert_into_index(filepath, doc_id=filename)._getvalue()
+            # O documento substituído deixa de valer para a deduplicação
+            upload_registry.forget_documents([filename])
         else:
-            manager.insert_into_index(filepath)
+            doc_ids = manager.insert_into_index(filepath)._getvalue()
+        upload_registry.record(content_hash, "file", size=size, doc_ids=doc_ids)
     except Exception as e:
         # cleanup temp file
-        if filepath is not None and os.path.exists(filepath):
-            os.remove(filepath)
+        if filepath is not None:
+            remove_upload(filepath)
         return "Error: {}".format(str(e)), 500
 
     # cleanup temp file
-    if filepath is not None and os.path.exists(filepath):
-        os.remove(filepath)
+    if filepath is not None:
+        remove_upload(filepath)
 
     return "File inserted!", 200
 
+@main.route("/uploadFiles", methods=["POST"])
+def upload_files():
+    global manager
+    uploaded_files = request.files.getlist("files")
+    if not uploaded_files:
+        return "Please send a POST request with one or more files in the 'files' field", 400
+
+    filepaths = []
+    try:
+        diretorio_atual = os.getcwd()
+        upload_folder = 'uploads/'
+        upload_registry = get_upload_registry()
+
+        filename_as_doc_id = request.form.get("filename_as_doc_id", None) is not None
+        doc_ids = []
+        uploads = []
+        already_inserted = 0
+        for uploaded_file in uploaded_files:
+            # Arquivos já indexados (ou repetidos no mesmo envio) não são embutidos de novo
+            content_hash, size = upload_digest(uploaded_file)
+            if upload_registry.get(content_hash, "file") is not None or content_hash in {h for h, _ in uploads}:
+                already_inserted += 1
+                continue
+            filename = secure_filename(uploaded_file.filename)
+            if filename_as_doc_id and filename in doc_ids:
+                # Mesmo doc_id duas vezes no envio: o último arquivo substitui o anterior
+                position = doc_ids.index(filename)
+                remove_upload(filepaths.pop(position))
+                doc_ids.pop(position)
+                uploads.pop(position)
+            # Cada arquivo num caminho próprio: nomes iguais não se sobrescrevem; o nome fica só como doc_id
+            filepath = unique_upload_path(filename, os.path.join(diretorio_atual, upload_folder))
+            filepaths.append(filepath)
+            save_upload(uploaded_file, filepath)
+            doc_ids.append(filename)
+            uploads.append((content_hash, size))
+
+        if filepaths:
+            if filename_as_doc_id:
+                ids_by_file = manager.insert_many_into_index(filepaths, doc_ids=doc_ids, by_file=True)._getvalue()
+                # Os documentos substituídos deixam de valer para a deduplicação
+                upload_registry.forget_documents(doc_ids)
+            else:
+                ids_by_file = manager.insert_many_into_index(filepaths, by_file=True)._getvalue()
+            for (content_hash, size), file_doc_ids in zip(uploads, ids_by_file):
+                upload_registry.record(content_hash, "file", size=size, doc_ids=file_doc_ids)
+    except Exception as e:
+        return "Error: {}".format(str(e)), 500
+    finally:
+        # cleanup temp files
+        for filepath in filepaths:
+            remove_upload(filepath)
+
+    if already_inserted:
+        return "{} files inserted, {} already inserted!".format(len(filepaths), already_inserted), 200
+    return "{} files inserted!".format(len(filepaths)), 200
+
+@main.route("/updateFile", methods=["POST"])
+def update_file():
+    """
+    Inserts a file, or replaces the document stored under the same doc_id (the `doc_id` form field,
+    the file name by default). Video prompt content (_Video.json) is re-indexed section by section.
+    """
+    global manager
+    if 'file' not in request.files:
+        return "Please send a POST request with a file", 400
+
+    filepath = None
+    try:
+        uploaded_file = request.files["file"]
+        filename = secure_filename(uploaded_file.filename)
+        doc_id = request.form.get("doc_id", None) or filename
+
+        upload_registry = get_upload_registry()
+        content_hash, size = upload_digest(uploaded_file)
+        upload = upload_registry.get(content_hash, "file")
+        if upload is not None and doc_id in upload["doc_ids"]:
+            return make_response(jsonify({"doc_id": doc_id, "unchanged": True})), 200
+
+        upload_folder = 'uploads/'
+        filepath = unique_upload_path(filename, os.path.join(os.getcwd(), upload_folder))
+        save_upload(uploaded_file, filepath)
+
+        summary = manager.upsert_document(filepath, doc_id)._getvalue()
+        # A versão anterior do documento deixa de valer para a deduplicação
+        upload_registry.forget_documents([doc_id])
+        upload_registry.record(content_hash, "file", size=size, doc_ids=[doc_id])
+    except Exception as e:
+        return "Error: {}".format(str(e)), 500
+    finally:
+        # cleanup temp file
+        if filepath is not None:
+            remove_upload(filepath)
+
+    return make_response(jsonify(summary)), 200
+
+@main.route("/deleteDocument", methods=["POST", "DELETE"])
+def delete_document():
+    global manager
+    data = request.get_json(silent=True) or {}
+    doc_id = data.get("doc_id") or request.form.get("doc_id") or request.args.get("doc_id")
+    if not doc_id:
+        return "Please include the doc_id of the document to delete", 400
+
+    try:
+        found = manager.delete_document_from_index(doc_id)._getvalue()
+    except Exception as e:
+        return "Error: {}".format(str(e)), 500
+    # Enviar o mesmo arquivo de novo deve voltar a indexá-lo
+    get_upload_registry().forget_documents([doc_id])
+    if not found:
+        return "Document {} not found".format(doc_id), 404
+
+    return "Document {} deleted!".format(doc_id), 200
+
 @main.route("/getDocuments", methods=["GET"])
 def get_documents():
-    document_list = manager.get_documents_list()._getvalue()
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", None, type=int)
+    document_list = manager.get_documents_list(offset=offset, limit=limit)._getvalue()
 
     return make_response(jsonify(document_list)), 200
 
+@main.route("/embeddingCacheStats", methods=["GET"])
+def get_embedding_cache_stats():
+    stats = manager.get_embedding_cache_stats()._getvalue()
+
+    return make_response(jsonify(stats)), 200
+
 @main.route("/uploadVideo", methods=["POST"])
 def upload_video():
     client = config_video_indexer_client()
@@ -134,22 +344,19 @@ def upload_video():
         video_id = client.upload_video(video_name, newfilepath, video_description=description, language=language, wait_for_index=True)
         content_prompt = client.generate_prompt(video_id, operation='get_prompt_content')
         
-        # adicionar content_prompt em um json e adicionar ele no index com o manager
+        # adicionar content_prompt no index com o manager, direto da memória (uma seção por node)
         url, _ = newfilepath.split(".")
         content_path = url + "_Video.json"
-        # print(content_path)
-        with open(content_path, 'w') as file:
-            json.dump(content_prompt, file, indent=4)
-        
+
         uploaded_file.save(newfilepath)
         # print(f"Chegamos aqui no vídeo: {video_id}")
 
         _, content_file = content_path.rsplit("/", 1)
         # print(content_file)
         if request.form.get("filename_as_doc_id", None) is not None:
-            manager.insert_into_index(content_path, doc_id=content_file)
+            manager.insert_video_content(content_prompt, content_file, video_name=video_name)
         else:
-            manager.insert_into_index(content_path)
+            manager.insert_video_content(content_prompt, str(video_id), video_name=video_name)
     except Exception as e:
         # cleanup temp file
         if newfilepath is not None and os.path.exists(newfilepath):
@@ -164,7 +371,8 @@ def upload_video():
 
     return "File inserted!", 200
 
-from .tasks import process_video
+from .tasks import process_video, resume_video_job, cancel_video_job
+from .tools.video.job_checkpoints import get_job_checkpoints
 @main.route("/uploadVideoAsync", methods=["POST"])
 def upload_video_async():
     args = request.args
@@ -179,30 +387,49 @@ def upload_video_async():
         # Processa o arquivo
         uploaded_file = request.files["file"]
         filename = secure_filename(uploaded_file.filename)
+
+        # Mesmo vídeo já enviado: devolve o que já existe, sem novo upload, prompt ou embedding
+        upload_registry = get_upload_registry()
+        content_hash, size = upload_digest(uploaded_file)
+        upload = upload_registry.get(content_hash, "video")
+        if upload is not None and upload["status"] == "done":
+            return jsonify({"message": "Video already indexed", "task_id": upload["job_id"],
+                            "video_id": upload["video_id"], "doc_id": upload["doc_ids"][0]}), 200
+        if upload is not None and upload["status"] == "processing":
+            job = get_job_checkpoints().get(upload["job_id"])
+            if job is not None and not job.get("error"):
+                return jsonify({"message": "Video is already being processed", "task_id": upload["job_id"]}), 202
         
         diretorio_atual = os.getcwd()
-        newfilepath = os.path.join(diretorio_atual, 'documents', os.path.basename(filename)).replace("\\", "/")
-        content_path = newfilepath.rsplit(".", 1)[0] + "_Video.json"
+        documents_folder = os.path.join(diretorio_atual, 'documents')
+        # Cada vídeo num caminho próprio: dois vídeos com o mesmo nome não sobrescrevem a mídia um do outro
+        newfilepath = unique_upload_path(filename, documents_folder).replace("\\", "/")
         # Salva o arquivo temporariamente
-        uploaded_file.save(newfilepath)
+        save_upload(uploaded_file, newfilepath)
         
         # client = config_video_indexer_client()
-        video_name, _ = filename.split(".")
+        video_name = filename.rsplit(".", 1)[0]
+        # O doc_id (e o prompt content salvo) levam o id do job, para um vídeo não substituir as seções de outro
+        job_id = str(uuid.uuid4())
+        content_file = f"{video_name}_{job_id}_Video.json"
+        content_path = os.path.join(documents_folder, content_file).replace("\\", "/")
         
+        # Registrado antes da task, que atualiza a linha ao avançar
+        upload_registry.record(content_hash, "video", size=size, doc_ids=[content_file], job_id=job_id, status="processing")
+
         # Chama a task Celery para processar o vídeo em background
-        task = process_video.delay(video_name, description, language, newfilepath, content_path, partition)
+        task = process_video.apply_async(args=(video_name, description, language, newfilepath, content_path, partition),
+                                         kwargs={"content_hash": content_hash}, task_id=job_id)
 
-        return jsonify({"message": "File is being processed", "task_id": task.id}), 202
+        return jsonify({"message": "File is being processed", "task_id": task.id, "doc_id": content_file}), 202
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-redis_client = redis.StrictRedis(host='127.0.0.1', port=6380, db=0)
-def delete_key_after_delay(key, delay):
-    time.sleep(delay)
-    redis_client.delete(key)
+from .tools.video.progress_store import get_progress_store, EXCLUDE_TTL_SEC
 @main.route("/uploadVideo_status", methods=["GET","POST"])
 def upload_video_status():
+    progress_store = get_progress_store()
     if request.method == "POST":
         data = request.get_json()
         # videoId = data.get("videoId")
@@ -211,72 +438,101 @@ def upload_video_status():
         # print(f"No endpoint:{(video_name)}|{type(video_name)}:{progress}|{type(video_name)}")
 
         if video_name and progress:
-            # Armazena ou atualiza o progresso no Redis
-            redis_client.set(f"video:{video_name}", progress)
-            
             # if progress == "Generating":
             #     return jsonify({"message": f"Generating prompt content for video {video_name}"}), 200
 
-            # Verifica se o progresso é 100% e apaga o registro se for o caso
+            # "Exclude": o frontend já viu o fim do upload, o registro expira em seguida
             if progress == "Exclude":
                 print("Upload Concluído")
-                thread = threading.Thread(target=delete_key_after_delay, args=(f"video:{video_name}", 2))
-                thread.start()
+                progress_store.set(video_name, progress, ttl=EXCLUDE_TTL_SEC)
                 return jsonify({"message": "Progress Completed and deleted!"}), 200
 
+            # Armazena ou atualiza o progresso no Redis
+            progress_store.set(video_name, progress)
             return jsonify({"message": "Progress updated successfully!"}), 200
         else:
             return jsonify({"error": "Invalid data!"}), 400
 
     elif request.method == "GET":
-        # Recupera o progresso de todos os vídeos, ignorando chaves irrelevantes
-        all_progress = {}
-        for key in redis_client.keys():
-            key_name = key.decode("utf-8")
-            if key_name.startswith("video:"):  # Supondo que você use um prefixo para as chaves de vídeo
-                value_type = redis_client.type(key).decode("utf-8")
-                if value_type == 'string':
-                    all_progress[key_name] = redis_client.get(key).decode("utf-8")
-                else:
-                    all_progress[key_name] = f"Value type is {value_type}, cannot decode."
+        # Progresso de todos os vídeos, com o prefixo "video:" esperado pelo frontend
+        all_progress = {f"video:{video_name}": progress for video_name, progress in progress_store.all().items()}
         return jsonify(all_progress), 200
 
+# Comentário enviado quando nada muda, para proxies não fecharem a conexão
+SSE_KEEPALIVE_SEC = 15
+
+@main.route("/uploadVideo_events", methods=["GET"])
+def upload_video_events():
+    """
+    Server-sent events with the progress of the videos, as JSON {"name", "progress", "videoId"}: the
+    current progress of every video on connection, then each change as the workers publish it (see
+    ProgressStore.report). Replaces polling GET /uploadVideo_status.
+    """
+    progress_store = get_progress_store()
+
+    def generate():
+        # Inscreve antes de ler o estado atual, para não perder eventos entre os dois
+        pubsub = progress_store.subscribe()
+        try:
+            for video_name, progress in progress_store.all().items():
+                yield "data: {}\n\n".format(json.dumps({"name": video_name, "progress": progress}))
+            while True:
+                message = pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_KEEPALIVE_SEC)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                data = message["data"]
+                yield "data: {}\n\n".format(data.decode("utf-8") if isinstance(data, bytes) else data)
+        finally:
+            pubsub.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @main.route('/task_status/<task_id>', methods=["GET"])
 def get_task_status(task_id):
-    task = process_video.AsyncResult(task_id)
-    if task.state == 'PENDING':
-        response = {
-            'state': task.state,
-            'progress': 0
-        }
-    elif task.state == 'PROGRESS':
-        response = {
-            'state': task.state,
-            'progress': task.info.get('current', 0) / task.info.get('total', 1) * 100
-        }
-    elif task.state != 'FAILURE':
-        response = {
-            'state': task.state,
-            'progress': 100,
-            'result': task.info
-        }
-    else:
-        response = {
-            'state': task.state,
-            'progress': 0,
-            'result': str(task.info)  # traceback
-        }
+    """
+    Status of a video job (the task id returned by /uploadVideoAsync), read from its checkpoints:
+    `process_video` only starts the job, the stages and the poller run long after it returned.
+    """
+    job = get_job_checkpoints().get(task_id)
+    if job is None:
+        # Not started yet (still queued) or unknown
+        return jsonify({'state': 'PENDING', 'progress': 0, 'job_id': task_id})
+    status = get_job_checkpoints().status(job)
+    state = {'cancelled': 'REVOKED', 'failed': 'FAILURE', 'done': 'SUCCESS', 'running': 'PROGRESS'}[status['state']]
+    response = {
+        'state': state,
+        'stage': status['stage'],
+        'progress': status['progress'],
+        'job_id': task_id,
+        'video_id': job.get('video_id') or None,
+    }
+    if status['error']:
+        response['result'] = status['error']
     return jsonify(response)
 
 
-
-
+@main.route('/resume_video/<job_id>', methods=["POST"])
+def resume_video(job_id):
+    """
+    Restarts a video job (the task id returned by /uploadVideoAsync) at the stage that failed; a video
+    already uploaded is not uploaded again.
+    """
+    if get_job_checkpoints().get(job_id) is None:
+        return jsonify({"error": f"Unknown video job {job_id}"}), 404
+    resume_video_job.delay(job_id)
+    return jsonify({"message": "Video job resumed", "job_id": job_id}), 202
 
 @main.route("/cancel/<task_id>")
 def cancel(task_id):
-    task = process_video.AsyncResult(task_id)
-    task.abort()
+    # Marks the video job cancelled; its stages and the poller stop at their next step
+    if not cancel_video_job(task_id):
+        return jsonify({"error": f"Unknown video job {task_id}"}), 404
     return "CANCELED!"
 
 from .forms import MyForm
@@ -1,4 +1,4 @@
-from celery import shared_task
+from celery import shared_task, Task
 from celery.contrib.abortable import AbortableTask
 from requests.exceptions import ConnectionError, Timeout
 
@@ -23,65 +23,254 @@ def add_user(self, form_data):
 
 import os
 import json
+from celery import signature
+from celery.signals import worker_ready
 from .routes import config_video_indexer_client
 from .routes import manager
+from .tools.video.index_poller import get_index_poller
+from .tools.video.job_checkpoints import get_job_checkpoints
+from .tools.upload_store import get_upload_registry
+from .tools.video.progress_store import report_progress
 
-@shared_task(bind=True)
-def process_video(self, video_name, description, language, newfilepath, content_path, partition):
-    doc_id=None
-    client = config_video_indexer_client()
-    
-    max_retries = 3  # Número máximo de tentativas de reconexão
-    retry_count = 0
-    wait_time = 10  # Tempo de espera entre tentativas, em segundos
-    
-    # Realiza o upload do vídeo e a geração do prompt
-    # video_name, _ = filename.split(".")
-    # video_id = client.upload_video(video_name, newfilepath, video_description=description, language=language, wait_for_index=True)
+def report_video_status(video_name, progress, video_id=None):
+    # Publicado direto no Redis (ProgressStore), sem passar pelo Flask
+    report_progress(video_name, progress, video_id)
+
+def schedule_index_poller(countdown=0):
+    """
+    Makes sure one `poll_video_index` tick is pending. Called whenever a video starts waiting and at
+    the end of every tick while videos are still waiting.
+    """
+    if get_index_poller().claim_schedule(countdown + 30):
+        poll_video_index.apply_async(countdown=countdown)
+
+@worker_ready.connect
+def resume_index_poller(**kwargs):
+    # Videos tracked before a restart are still in Redis; the pending tick may have been lost with the worker
+    if get_index_poller().pending():
+        poll_video_index.delay()
+
+@shared_task
+def poll_video_index():
+    """
+    One tick of the central poller: checks every video whose next check is due (in batches, see
+    `IndexPoller`), starts the continuation of the ones that finished and schedules the next tick.
+    No worker waits on a video between two ticks, so any number of videos can be in flight.
+    """
+    poller = get_index_poller()
+    poller.release_schedule()
     try:
-        video_id = client.upload_video(video_name=video_name, video_path_or_url=newfilepath, video_description=description, partition=partition, language=language)
-        # print(f"ID DO VIDEO --->{video_id}")
-    except Exception as e:
-        # Outras exceções que não são relacionadas a conexão
-        print(f"Erro durante o processamento de upload: {e}")
-        res = requests.post("http://127.0.0.1:5000/uploadVideo_status", json={"name": video_name, "progress": "Failed"})
-        return f"Video failed to upload!"
-            
-    while retry_count < max_retries:
+        client = config_video_indexer_client()
+        for entry, outcome in poller.poll_once(client):
+            print(f"Video {entry['video_id']} ({entry['kind']}): {outcome['state']}")
+            signature(entry["continuation"]).apply_async(kwargs=outcome)
+    finally:
+        wait = poller.seconds_until_next()
+        if wait is not None:
+            schedule_index_poller(wait)
+
+# Stages of a video job: upload -> await index (poller) -> fetch prompt -> await prompt (poller) -> insert.
+# Each stage checkpoints its outputs (see JobCheckpoints) and transient errors are retried by Celery with
+# a growing countdown, never by sleeping in the worker; a stage out of retries fails its job (VideoStageTask).
+STAGE_RETRY = dict(autoretry_for=(ConnectionError, Timeout), retry_backoff=10, retry_backoff_max=600, max_retries=5)
+
+def upload_progress_logger(video_name, step=0.1):
+    """Progress callback for `upload_by_file` that prints every `step` (10%) of the bytes sent."""
+    next_report = [step]
+    def report(sent, total):
+        if total and sent / total >= next_report[0]:
+            print(f"Upload de {video_name}: {sent / total:.0%} ({sent // (1024 * 1024)} MB)")
+            next_report[0] = (int(sent / total / step) + 1) * step
+    return report
+
+def update_video_upload(job, **fields):
+    """Keeps the upload registry row of the video file (see /uploadVideoAsync) in step with its job."""
+    if not job.get('content_hash'):
+        return
+    upload_registry = get_upload_registry()
+    upload = upload_registry.get(job['content_hash'], "video")
+    # The file may have been sent again since, under a newer job
+    if upload is not None and upload['job_id'] == job['job_id']:
+        upload_registry.update(job['content_hash'], "video", **fields)
+
+def cancel_video_job(job_id):
+    """
+    Cancels a video job: the stage running finishes its current step and stops, the poller forgets the
+    video and the upload registry lets the same file be sent again.
+
+    :return: False if the job does not exist
+    """
+    checkpoints = get_job_checkpoints()
+    if not checkpoints.cancel(job_id):
+        return False
+    job = checkpoints.get(job_id)
+    update_video_upload(job, status="failed")
+    report_video_status(job['video_name'], "Cancelled", job.get('video_id') or None)
+    return True
+
+def stop_if_cancelled(job):
+    """True (and a log line) if the job was cancelled; the stage should return at once."""
+    if get_job_checkpoints().cancelled(job):
+        print(f"Video job {job['job_id']} ({job['video_name']}) cancelled")
+        return True
+    return False
+
+def fail_video_job(job, error):
+    print(f"Erro durante o processamento de {job['video_name']}: {error}")
+    get_job_checkpoints().fail(job['job_id'], str(error))
+    # Um novo envio do mesmo arquivo deve tentar de novo
+    update_video_upload(job, status="failed")
+    report_video_status(job['video_name'], "Failed", job.get('video_id') or None)
+
+class VideoStageTask(Task):
+    """
+    Base of the stage tasks. A stage that raises for good (a transient error that outlasted its retries,
+    or any error the stage does not handle) fails its job: otherwise the checkpoint would stay "running"
+    and the upload registry row "processing", and the same file could never be sent again.
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        job_id = kwargs.get('job_id') or (args[0] if args else None)
+        job = get_job_checkpoints().get(job_id) if job_id else None
+        if job is not None and not get_job_checkpoints().cancelled(job):
+            fail_video_job(job, exc)
+
+@shared_task(bind=True)
+def process_video(self, video_name, description, language, newfilepath, content_path, partition, content_hash=None):
+    """
+    Starts a video job whose id is this task id; see `resume_video_job` for the stages. `content_hash`
+    is the SHA-256 of the video file, whose upload registry row follows the job.
+    """
+    _, content_file = content_path.rsplit("/", 1)
+    get_job_checkpoints().create(
+        self.request.id, video_name=video_name, description=description, language=language,
+        media_path=newfilepath, content_path=content_path, doc_id=content_file, partition=partition,
+        content_hash=content_hash,
+    )
+    upload_video_stage.delay(self.request.id)
+    return self.request.id
+
+@shared_task
+def resume_video_job(job_id):
+    """
+    Runs the stage that follows the last checkpoint of the job, e.g. after it failed or the worker died.
+    An uploaded video is never uploaded again.
+    """
+    checkpoints = get_job_checkpoints()
+    job = checkpoints.get(job_id)
+    if job is None:
+        return f"Unknown video job {job_id}"
+    # A failed or cancelled job that is resumed is running again
+    checkpoints.reopen(job_id)
+    job.pop('error', None)
+    job.pop('cancelled', None)
+    update_video_upload(job, status="processing")
+    stage = job.get('stage')
+    if stage == 'created':
+        upload_video_stage.delay(job_id)
+    elif stage == 'uploaded':
+        await_video_index(job)
+    elif stage == 'indexed':
+        fetch_prompt_stage.delay(job_id)
+    elif stage == 'prompt_ready':
+        insert_prompt_stage.delay(job_id)
+    return f"Video job {job_id} resumed after stage {stage}"
+
+def await_video_index(job):
+    continuation = fetch_prompt_stage.s(job_id=job['job_id'])
+    get_index_poller().track(job['video_id'], continuation, kind="index", video_name=job['video_name'],
+                             language=job['language'] or 'auto', job_id=job['job_id'])
+    schedule_index_poller()
+
+@shared_task(bind=True, base=VideoStageTask, **STAGE_RETRY)
+def upload_video_stage(self, job_id):
+    """
+    Uploads the video of the job, unless a previous attempt already did, and waits for its index.
+
+    A ConnectionError/Timeout while the file is sent is retried. If Video Indexer had already created
+    the video, the retry finds it by its external id (the job id) and does not send it again; otherwise
+    the whole file is sent again, the upload cannot be resumed halfway.
+    """
+    checkpoints = get_job_checkpoints()
+    job = checkpoints.get(job_id)
+    if stop_if_cancelled(job):
+        return f"Video job {job_id} cancelled"
+    if not checkpoints.done(job, 'uploaded'):
+        client = config_video_indexer_client()
         try:
-            
-            ## Implementar retry a partir daqui
-            client.upload_video(video_id=video_id, video_name=video_name, language=language, op="wait")
-            
-            # requests.post("http://127.0.0.1:5000/uploadVideo_status", json={"videoId": video_id, "name": video_name, "progress": "Generating"})
-            content_prompt = client.generate_prompt(video_id, operation='get_prompt_content')
-
-            # Salva o prompt em um arquivo JSON
-            with open(content_path, 'w') as file:
-                json.dump(content_prompt, file, indent=4)
-
-            # Insere no index
-            _, content_file = content_path.rsplit("/", 1)
-            if content_file is not None:
-                manager.insert_into_index(content_path, doc_id=content_file)
-            else:
-                manager.insert_into_index(content_path)
-
-            requests.post("http://127.0.0.1:5000/uploadVideo_status", json={"videoId": video_id, "name": video_name, "progress": "Finished"})
-            return f"Video {video_id} processed successfully!"
-        
-        except (ConnectionError, Timeout) as e:
-            print(f"Erro de conexão: {e}. Tentando reconectar... ({retry_count+1}/{max_retries})")
-            retry_count += 1
-            time.sleep(wait_time)  # Espera antes de tentar reconectar
-            
+            # An attempt may have uploaded the video and died before the checkpoint; the job id is its external id
+            video_id = client.upload_manager.find_video_by_external_id(job_id)
+            if video_id is None:
+                # Cancelled before the file was sent (or between two attempts): nothing to upload
+                if stop_if_cancelled(checkpoints.get(job_id)):
+                    return f"Video job {job_id} cancelled"
+                video_id = client.upload_manager.upload_by_file(
+                    media_path=job['media_path'], video_name=job['video_name'], video_description=job['description'],
+                    partition=job['partition'], language=job['language'] or 'auto', external_id=job_id,
+                    progress_callback=upload_progress_logger(job['video_name']),
+                )
+        except (ConnectionError, Timeout):
+            raise
         except Exception as e:
-            # Outras exceções que não são relacionadas a conexão
-            print(f"Erro durante o processamento: {e}")
-            requests.post("http://127.0.0.1:5000/uploadVideo_status", json={"name": video_name, "progress": "Failed"})
-            break
-    
-        if retry_count == max_retries:
-            raise Exception("Não foi possível restabelecer a conexão após várias tentativas.")
-    
-    
+            fail_video_job(job, e)
+            return f"Video failed to upload!"
+        checkpoints.complete(job_id, 'uploaded', video_id=video_id)
+        job['video_id'] = video_id
+        update_video_upload(job, video_id=video_id)
+        # Cancelled while the file was being sent
+        if stop_if_cancelled(checkpoints.get(job_id)):
+            return f"Video job {job_id} cancelled"
+
+    await_video_index(job)
+    return f"Video {job['video_id']} uploaded, waiting for the index"
+
+@shared_task(bind=True, base=VideoStageTask, **STAGE_RETRY)
+def fetch_prompt_stage(self, job_id, state="Processed"):
+    """Starts the prompt content generation of the indexed video and waits for it through the poller."""
+    checkpoints = get_job_checkpoints()
+    job = checkpoints.get(job_id)
+    if stop_if_cancelled(job):
+        return f"Video job {job_id} cancelled"
+    if state != "Processed":
+        fail_video_job(job, f"the video was not indexed ({state})")
+        return f"Video {job['video_id']} was not indexed: {state}"
+    checkpoints.complete(job_id, 'indexed')
+
+    client = config_video_indexer_client()
+    language = job['language'] or 'auto'
+    if client.content_manager.find_prompt_content(job['video_id'], language=language) is None:
+        client.content_manager.request_prompt_content(job['video_id'])
+    continuation = insert_prompt_stage.s(job_id=job_id)
+    get_index_poller().track(job['video_id'], continuation, kind="prompt", video_name=job['video_name'], language=language,
+                             result_path=job['content_path'], first_check_in=0, job_id=job_id)
+    schedule_index_poller()
+    return f"Prompt content of {job['video_id']} requested"
+
+@shared_task(bind=True, base=VideoStageTask, autoretry_for=(ConnectionError, Timeout, EOFError, ConnectionRefusedError), retry_backoff=10,
+             retry_backoff_max=600, max_retries=5)
+def insert_prompt_stage(self, job_id, state="Ready", prompt_path=None):
+    """Indexes the prompt content saved by the poller, one section per node."""
+    checkpoints = get_job_checkpoints()
+    job = checkpoints.get(job_id)
+    if stop_if_cancelled(job):
+        return f"Video job {job_id} cancelled"
+    if state != "Ready":
+        fail_video_job(job, f"the prompt content was not generated ({state})")
+        return f"Prompt content of {job['video_id']} was not generated: {state}"
+
+    prompt_path = prompt_path or job.get('prompt_path') or job['content_path']
+    if not os.path.exists(prompt_path):
+        # The checkpointed file is gone, fetch the prompt content again
+        fetch_prompt_stage.delay(job_id)
+        return f"Prompt content of {job['video_id']} missing, fetching it again"
+    checkpoints.complete(job_id, 'prompt_ready', prompt_path=prompt_path)
+
+    with open(prompt_path, encoding="utf-8") as f:
+        content_prompt = json.load(f)
+    # Re-processing a video only re-indexes the sections that changed
+    manager.insert_video_content(content_prompt, job['doc_id'], video_name=job['video_name'], partition=job['partition'] or None)
+    checkpoints.complete(job_id, 'inserted')
+    update_video_upload(job, video_id=job['video_id'], doc_ids=[job['doc_id']], status="done")
+
+    report_video_status(job['video_name'], "Finished", job['video_id'])
+    return f"Video {job['video_id']} processed successfully!"
@@ -0,0 +1,163 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+
+SESSION_KEY = "chat:session:"
+# Sessions nobody writes to disappear after this long
+SESSION_TTL_SEC = int(os.getenv("CHAT_SESSION_TTL", str(24 * 3600)))
+# Once the stored turns exceed this many tokens, the oldest ones are summarized
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+# How long a compaction may run before another one can be claimed for the same session
+COMPACTION_CLAIM_SEC = 120
+
+# Replaces the compacted turns by the summary, only if the session still exists: the check and the
+# writes run in one script so a session deleted in between is not recreated with just a summary
+COMPACT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('LTRIM', KEYS[2], tonumber(ARGV[1]), -1)
+redis.call('HINCRBY', KEYS[1], 'history_tokens', -tonumber(ARGV[2]))
+redis.call('HINCRBY', KEYS[1], 'compactions', 1)
+redis.call('HSET', KEYS[1], 'summary', ARGV[3], 'summary_tokens', ARGV[4])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+return 1
+"""
+
+
+class ChatSession:
+    """
+    One conversation as read from Redis: the rolling summary of the compacted turns and the turns
+    kept verbatim, each with its token count.
+    """
+
+    def __init__(self, session_id: str, summary: str = "", summary_tokens: int = 0,
+                 turns: Optional[List[Tuple[Dict[str, str], int]]] = None, partition: Optional[str] = None):
+        self.session_id = session_id
+        self.summary = summary
+        self.summary_tokens = summary_tokens
+        self.turns = turns or []
+        self.partition = partition
+
+    @property
+    def history_tokens(self) -> int:
+        return sum(tokens for _, tokens in self.turns)
+
+
+class ChatSessionStore:
+    """
+    Conversation sessions of the /chat endpoint, kept in Redis so any index server process (and a
+    restart) sees the same history.
+
+    Each session is a hash (summary, summary_tokens, history_tokens, partition) and a list of turns,
+    JSON {"role", "content", "tokens"}. Turns are counted once, when they are added, and the hash
+    keeps the running total, so checking the budget after a turn reads no history. When the total
+    goes over the budget the oldest turns are replaced by a summary (`compact`) by a background
+    worker: a call sends the summary and the recent turns, never the whole conversation.
+    """
+
+    def __init__(self, redis_client: redis.Redis, token_budget: int = HISTORY_TOKEN_BUDGET,
+                 ttl: int = SESSION_TTL_SEC):
+        self.redis = redis_client
+        self.token_budget = token_budget
+        self.ttl = ttl
+        self._compact = self.redis.register_script(COMPACT_SCRIPT)
+
+    def load(self, session_id: str) -> ChatSession:
+        """
+        :return: The session; a new one has no summary and no turns
+        """
+        pipe = self.redis.pipeline()
+        pipe.hgetall(SESSION_KEY + session_id)
+        pipe.lrange(SESSION_KEY + session_id + ":turns", 0, -1)
+        meta, raw_turns = pipe.execute()
+        meta = {_decode(k): _decode(v) for k, v in meta.items()}
+        turns = []
+        for raw in raw_turns:
+            turn = json.loads(raw)
+            turns.append(({"role": turn["role"], "content": turn["content"]}, int(turn["tokens"])))
+        return ChatSession(
+            session_id,
+            summary=meta.get("summary", ""),
+            summary_tokens=int(meta.get("summary_tokens", 0)),
+            turns=turns,
+            partition=meta.get("partition") or None,
+        )
+
+    def append(self, session_id: str, turns: List[Tuple[Dict[str, str], int]], partition: Optional[str] = None) -> int:
+        """
+        Adds turns (message, tokens) at the end of the session
+
+        :return: The tokens of the stored turns, including the new ones
+        """
+        key = SESSION_KEY + session_id
+        pipe = self.redis.pipeline()
+        pipe.rpush(key + ":turns", *[
+            json.dumps({"role": message["role"], "content": message["content"], "tokens": tokens})
+            for message, tokens in turns
+        ])
+        pipe.hincrby(key, "history_tokens", sum(tokens for _, tokens in turns))
+        pipe.hset(key, mapping={"updated_at": str(time.time()), "partition": partition or ""})
+        pipe.expire(key, self.ttl)
+        pipe.expire(key + ":turns", self.ttl)
+        history_tokens = pipe.execute()[1]
+        return int(history_tokens)
+
+    def over_budget(self, history_tokens: int) -> bool:
+        return history_tokens > self.token_budget
+
+    def turns_to_compact(self, session: ChatSession, keep_last: int = 2) -> int:
+        """
+        :return: How many of the oldest turns to summarize so the rest fit in half the budget (the
+            latest `keep_last` turns always stay verbatim)
+        """
+        target, total, count = self.token_budget // 2, session.history_tokens, 0
+        while total > target and count < len(session.turns) - keep_last:
+            total -= session.turns[count][1]
+            count += 1
+        return count
+
+    def claim_compaction(self, session_id: str) -> bool:
+        """
+        :return: True if the caller should compact the session, False if a compaction is already running
+        """
+        return bool(self.redis.set(SESSION_KEY + session_id + ":compacting", "1", nx=True, ex=COMPACTION_CLAIM_SEC))
+
+    def release_compaction(self, session_id: str) -> None:
+        self.redis.delete(SESSION_KEY + session_id + ":compacting")
+
+    def compact(self, session_id: str, count: int, removed_tokens: int, summary: str, summary_tokens: int) -> bool:
+        """
+        Replaces the first `count` turns by `summary`. Turns are only ever added at the end of the
+        list, so turns added while the summary was written are kept.
+
+        :return: False if the session was deleted while the summary was written (nothing is changed)
+        """
+        key = SESSION_KEY + session_id
+        return bool(self._compact(keys=[key, key + ":turns"],
+                                  args=[count, removed_tokens, summary, summary_tokens, self.ttl]))
+
+    def delete(self, session_id: str) -> bool:
+        """
+        :return: True if the session existed
+        """
+        key = SESSION_KEY + session_id
+        return bool(self.redis.delete(key, key + ":turns", key + ":compacting"))
+
+
+def _decode(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+_chat_sessions: Optional[ChatSessionStore] = None
+
+
+def get_chat_sessions() -> ChatSessionStore:
+    global _chat_sessions
+    if _chat_sessions is None:
+        # DB 2: apart from Celery (DB 0) and the video progress (DB 1)
+        _chat_sessions = ChatSessionStore(redis.StrictRedis.from_url(os.getenv("CHAT_REDIS_URL", "redis://127.0.0.1:6380/2")))
+    return _chat_sessions
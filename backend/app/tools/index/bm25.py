@@ -0,0 +1,370 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+POSTINGS_FILE = "postings.npz"
+# Changes saved since the last full rewrite of POSTINGS_FILE, one JSON line per save
+POSTINGS_LOG_FILE = "postings.log"
+NODES_FILE = "nodes.sqlite3"
+# The log is folded into POSTINGS_FILE once it is this large and at least half the size of the snapshot
+COMPACT_MIN_LOG_BYTES = 1024 * 1024
+TOKEN = re.compile(r"\w+")
+COMBINING_MARKS = re.compile(r"[\u0300-\u036f]")
+PHRASE = re.compile(r'"([^"]+)"')
+MAX_TF = 65535
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased words with accents removed, so "Vídeo" and "video" are the same term."""
+    folded = text.lower()
+    if not folded.isascii():
+        folded = COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", folded))
+    return TOKEN.findall(folded)
+
+
+def quoted_phrases(query_text: str) -> List[str]:
+    """Phrases written between double quotes, which the keyword search must match exactly."""
+    return [phrase for phrase in PHRASE.findall(query_text) if tokenize(phrase)]
+
+
+def bm25_weights(tfs: np.ndarray, lengths: np.ndarray, doc_freq: int, doc_count: int, avg_len: float,
+                 k1: float = 1.2, b: float = 0.75) -> np.ndarray:
+    """
+    BM25 score of one term in each document that contains it.
+
+    :param tfs: Occurrences of the term in each document.
+    :param lengths: Number of terms of each document.
+    :param doc_freq: Number of documents containing the term.
+    :param doc_count: Number of documents.
+    :param avg_len: Average number of terms per document.
+    """
+    idf = math.log(1.0 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+    return idf * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lengths / (avg_len or 1.0)))
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[NodeWithScore]], top_k: int,
+                           k: int = 60) -> List[NodeWithScore]:
+    """
+    Merges ranked lists of nodes: every node scores sum(1 / (k + rank)) over the lists it appears in,
+    so rankings with incomparable scores (cosine, BM25) can be combined.
+    """
+    fused: Dict[str, float] = {}
+    nodes: Dict[str, BaseNode] = {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            node_id = result.node.node_id
+            fused[node_id] = fused.get(node_id, 0.0) + 1.0 / (k + rank)
+            nodes.setdefault(node_id, result.node)
+    best = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [NodeWithScore(node=nodes[node_id], score=fused[node_id]) for node_id in best]
+
+
+class BM25Index:
+    """
+    Incremental BM25 keyword index over the nodes of the vector index.
+
+    Each term has two parallel arrays, the rows of the nodes that contain it (uint32) and the term
+    frequencies (uint16), so postings cost 6 bytes per (term, node) pair. Nodes are numbered by row;
+    their payload (text and metadata) lives in a SQLite side table, so keyword results can be
+    returned without touching the vector store. Deleted nodes are only marked dead.
+
+    `save` appends the nodes added and removed since the previous save to `postings.log` and then
+    commits the side table, so a write costs the size of the change, not of the index. When the log
+    grows past half the size of the `postings.npz` snapshot, the postings are rewritten to a new
+    snapshot and the log starts over; loading replays the log on top of the snapshot.
+    """
+
+    def __init__(self, persist_dir: str, k1: float = 1.2, b: float = 0.75):
+        self.persist_dir = persist_dir
+        self.k1 = k1
+        self.b = b
+        os.makedirs(persist_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._vocab: Dict[str, int] = {}
+        self._rows: List[array] = []
+        self._tfs: List[array] = []
+        self._doc_len = array("I")
+        self._alive = bytearray()
+        self._live = 0
+        self._live_len = 0
+        # Changes not yet saved: (row, length, term counts) of added nodes and the rows removed
+        self._pending_adds: List[tuple] = []
+        self._pending_deletes: List[int] = []
+
+        self._conn = sqlite3.connect(os.path.join(persist_dir, NODES_FILE), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            " row INTEGER PRIMARY KEY,"
+            " node_id TEXT NOT NULL UNIQUE,"
+            " ref_doc_id TEXT,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS nodes_ref_doc_id ON nodes(ref_doc_id)")
+        self._conn.commit()
+        self._load()
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _load(self) -> None:
+        path = os.path.join(self.persist_dir, POSTINGS_FILE)
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                terms = saved["vocab"].tobytes().decode("utf-8").split("\n") if saved["vocab"].size else []
+                offsets, rows, tfs = saved["offsets"], saved["rows"], saved["tfs"]
+                for term_id, term in enumerate(terms):
+                    self._vocab[term] = term_id
+                    self._rows.append(array("I", rows[offsets[term_id]:offsets[term_id + 1]].tobytes()))
+                    self._tfs.append(array("H", tfs[offsets[term_id]:offsets[term_id + 1]].tobytes()))
+                self._doc_len = array("I", saved["doc_len"].tobytes())
+                self._alive = bytearray(saved["alive"].tobytes())
+        self._replay_log()
+
+        # Rows written after the last save were never committed; drop any leftover to stay in sync
+        self._conn.execute("DELETE FROM nodes WHERE row >= ?", (len(self._doc_len),))
+        self._conn.commit()
+
+        alive = np.frombuffer(self._alive, dtype=bool)
+        doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+        self._live = int(alive.sum())
+        self._live_len = int(doc_len[alive].sum())
+        del alive, doc_len
+
+    def _replay_log(self) -> None:
+        path = os.path.join(self.persist_dir, POSTINGS_LOG_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "r+b") as log:
+            end = 0
+            for line in log:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    change = None
+                if change is None or not line.endswith(b"\n"):
+                    # Last line cut short by a crash (that save never committed its nodes); cut it
+                    # off so the next save starts on a line of its own
+                    log.truncate(end)
+                    break
+                end += len(line)
+                for row, length, counts in change["adds"]:
+                    # Rows already in the snapshot (the log outlived a compaction) are skipped
+                    if row == len(self._doc_len):
+                        self._append_row(row, length, counts)
+                for row in change["deletes"]:
+                    if row < len(self._alive):
+                        self._alive[row] = 0
+
+    def _append_row(self, row: int, length: int, counts: Dict[str, int]) -> None:
+        for term, tf in counts.items():
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                term_id = self._vocab[term] = len(self._rows)
+                self._rows.append(array("I"))
+                self._tfs.append(array("H"))
+            self._rows[term_id].append(row)
+            self._tfs[term_id].append(tf if tf < MAX_TF else MAX_TF)
+        self._doc_len.append(length)
+        self._alive.append(1)
+
+    def save(self) -> None:
+        """
+        Persists the changes made since the last save: appended to the log, or, once the log is
+        large enough, with a full rewrite of the snapshot.
+        """
+        with self._lock:
+            if not self._pending_adds and not self._pending_deletes:
+                self._conn.commit()
+                return
+            snapshot_path = os.path.join(self.persist_dir, POSTINGS_FILE)
+            log_path = os.path.join(self.persist_dir, POSTINGS_LOG_FILE)
+            change = json.dumps({"adds": self._pending_adds, "deletes": self._pending_deletes}).encode("utf-8")
+            with open(log_path, "ab") as log:
+                log.write(change + b"\n")
+                log.flush()
+                os.fsync(log.fileno())
+                log_size = log.tell()
+            self._pending_adds, self._pending_deletes = [], []
+            snapshot_size = os.path.getsize(snapshot_path) if os.path.exists(snapshot_path) else 0
+            if log_size >= COMPACT_MIN_LOG_BYTES and log_size * 2 >= snapshot_size:
+                self._write_snapshot()
+            self._conn.commit()
+
+    def compact(self) -> None:
+        """Saves the pending changes, rewrites the snapshot with everything and empties the log."""
+        self.save()
+        with self._lock:
+            self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        offsets = np.zeros(len(self._rows) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(rows) for rows in self._rows])
+        path = os.path.join(self.persist_dir, POSTINGS_FILE)
+        # np.savez appends .npz to names without it, so the temporary name keeps the extension
+        tmp_path = path[:-len(".npz")] + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            vocab=np.frombuffer("\n".join(self._vocab).encode("utf-8"), dtype=np.uint8),
+            offsets=offsets,
+            rows=np.frombuffer(b"".join(rows.tobytes() for rows in self._rows), dtype=np.uint32),
+            tfs=np.frombuffer(b"".join(tfs.tobytes() for tfs in self._tfs), dtype=np.uint16),
+            doc_len=np.array(self._doc_len, dtype=np.uint32),
+            alive=np.array(self._alive, dtype=np.uint8).astype(bool),
+        )
+        os.replace(tmp_path, path)
+        # A crash before this point replays the log on the new snapshot, which skips what it already has
+        open(os.path.join(self.persist_dir, POSTINGS_LOG_FILE), "wb").close()
+
+    # --- writes ---
+
+    @staticmethod
+    def tokenize_nodes(nodes: Sequence[BaseNode]) -> List[Counter]:
+        """Term counts of `nodes`, for `add`; can be computed before taking any lock."""
+        return [Counter(tokenize(node.get_content(metadata_mode=MetadataMode.NONE))) for node in nodes]
+
+    def add(self, nodes: Sequence[BaseNode], tokenized: Optional[List[Counter]] = None) -> None:
+        """
+        Indexes the text of `nodes`. A node id that is already indexed is replaced.
+
+        :param tokenized: The result of `tokenize_nodes(nodes)`, if already computed.
+        """
+        if tokenized is None:
+            tokenized = self.tokenize_nodes(nodes)
+
+        with self._lock:
+            self._tombstone(self._rows_for("node_id", [node.node_id for node in nodes]))
+            records = []
+            for node, counts in zip(nodes, tokenized):
+                row = len(self._doc_len)
+                length = sum(counts.values())
+                self._append_row(row, length, counts)
+                self._pending_adds.append((row, length, dict(counts)))
+                self._live += 1
+                self._live_len += length
+                payload = node_to_metadata_dict(node, remove_text=False, flat_metadata=False)
+                records.append((row, node.node_id, node.ref_doc_id, json.dumps(payload)))
+            self._conn.executemany(
+                "INSERT INTO nodes (row, node_id, ref_doc_id, payload) VALUES (?, ?, ?, ?)", records
+            )
+
+    def delete_ref_doc(self, ref_doc_id: str) -> None:
+        with self._lock:
+            self._tombstone(self._rows_for("ref_doc_id", [ref_doc_id]))
+
+    def delete_nodes(self, node_ids: Sequence[str]) -> None:
+        with self._lock:
+            self._tombstone(self._rows_for("node_id", node_ids))
+
+    def _tombstone(self, rows: Sequence[int]) -> None:
+        for row in rows:
+            if self._alive[row]:
+                self._alive[row] = 0
+                self._pending_deletes.append(row)
+                self._live -= 1
+                self._live_len -= self._doc_len[row]
+        self._conn.executemany("DELETE FROM nodes WHERE row = ?", [(row,) for row in rows])
+
+    def _rows_for(self, column: str, values: Sequence[str]) -> List[int]:
+        rows: List[int] = []
+        values = list(values)
+        for i in range(0, len(values), 500):
+            chunk = values[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(
+                row for (row,) in self._conn.execute(
+                    f"SELECT row FROM nodes WHERE {column} IN ({placeholders})", chunk
+                )
+            )
+        return rows
+
+    # --- reads ---
+
+    def search(self, query_text: str, top_k: int, partition: Optional[str] = None) -> List[NodeWithScore]:
+        """
+        Returns the `top_k` nodes with the highest BM25 score for the words of `query_text`. Phrases
+        between double quotes must also appear verbatim (after tokenization) in the node text.
+        With `partition`, only nodes whose `partition` metadata matches are returned.
+        """
+        terms = set(tokenize(query_text))
+        phrases = [" ".join(tokenize(phrase)) for phrase in quoted_phrases(query_text)]
+        required = {term for phrase in phrases for term in phrase.split()}
+
+        with self._lock:
+            if not terms or self._live == 0:
+                return []
+            live = self._live
+            avg_len = self._live_len / live
+            all_rows, all_scores, all_required = [], [], []
+            for term in terms:
+                term_id = self._vocab.get(term)
+                if term_id is None:
+                    if term in required:
+                        return []
+                    continue
+                rows = np.array(self._rows[term_id], dtype=np.int64)
+                tfs = np.array(self._tfs[term_id], dtype=np.float32)
+                keep = np.frombuffer(self._alive, dtype=bool)[rows]
+                rows, tfs = rows[keep], tfs[keep]
+                if rows.size == 0:
+                    continue
+                lengths = np.frombuffer(self._doc_len, dtype=np.uint32)[rows].astype(np.float32)
+                all_rows.append(rows)
+                all_required.append(np.full(rows.size, term in required))
+                all_scores.append(bm25_weights(tfs, lengths, rows.size, live, avg_len, self.k1, self.b))
+
+        if not all_rows:
+            return []
+        rows, inverse = np.unique(np.concatenate(all_rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+
+        order = np.argsort(-scores, kind="stable")
+        if required:
+            # Only nodes containing every word of the phrases can contain the phrases
+            hits = np.bincount(inverse, weights=np.concatenate(all_required), minlength=rows.shape[0])
+            order = order[hits[order] == len(required)]
+        results: List[NodeWithScore] = []
+        # Phrase and partition matches are checked on the payloads, best scores first, a page at a time
+        page = top_k if not phrases and partition is None else max(top_k * 10, 50)
+        for start in range(0, order.shape[0], page):
+            chunk = order[start:start + page]
+            payloads = self._payloads_for_rows(rows[chunk].tolist())
+            for index in chunk.tolist():
+                payload = payloads.get(int(rows[index]))
+                if payload is None:
+                    continue
+                node = metadata_dict_to_node(json.loads(payload))
+                if partition is not None and node.metadata.get("partition") != partition:
+                    continue
+                if phrases:
+                    text = " " + " ".join(tokenize(node.get_content(metadata_mode=MetadataMode.NONE))) + " "
+                    if not all(f" {phrase} " in text for phrase in phrases):
+                        continue
+                results.append(NodeWithScore(node=node, score=float(scores[index])))
+                if len(results) == top_k:
+                    return results
+        return results
+
+    def _payloads_for_rows(self, rows: List[int]) -> Dict[int, str]:
+        payloads: Dict[int, str] = {}
+        with self._lock:
+            for i in range(0, len(rows), 500):
+                chunk = rows[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                payloads.update(self._conn.execute(
+                    f"SELECT row, payload FROM nodes WHERE row IN ({placeholders})", chunk
+                ).fetchall())
+        return payloads
@@ -0,0 +1,106 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from llama_index.core.vector_stores.types import (
+    FilterCondition,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
+from llama_index.vector_stores.azurecosmosnosql import AzureCosmosDBNoSqlVectorSearch
+
+DELETE_QUERY_BATCH = 100
+
+
+class CosmosVectorStore(AzureCosmosDBNoSqlVectorSearch):
+    """
+    AzureCosmosDBNoSqlVectorSearch with working deletes and metadata filters.
+
+    Items are stored with the node id as `id`, but the container is partitioned by another path
+    (PARTITION_KEY, `/text` by default), so an item can only be deleted together with the value of
+    its partition key. The upstream `delete(ref_doc_id)` passes the ref doc id as both, which deletes
+    nothing, and `delete_nodes` is not implemented. Both are done here by first reading the ids and
+    partition key values of the matching items.
+
+    The upstream query also ignores `query.filters`; EQ filters on metadata keys (e.g. `partition`)
+    are added to the WHERE clause here.
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CosmosVectorStore"
+
+    def _partition_key_path(self) -> List[str]:
+        partition_key = self._cosmos_container_properties["partition_key"]
+        path = partition_key["paths"][0] if isinstance(partition_key, dict) else partition_key.path
+        return [part for part in path.split("/") if part]
+
+    def _delete_items(self, query: str, parameters: List[Dict[str, Any]]) -> int:
+        path = self._partition_key_path()
+        projection = "c.id, c" + "".join(f"[\"{part}\"]" for part in path) + " AS partition_value"
+        items = list(self._container.query_items(
+            query=f"SELECT {projection} FROM c WHERE {query}",
+            parameters=parameters,
+            enable_cross_partition_query=True,
+        ))
+        for item in items:
+            self._container.delete_item(item["id"], partition_key=item.get("partition_value"))
+        return len(items)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Deletes every node of document `ref_doc_id`."""
+        self._delete_items(
+            f"c.{self._metadata_key}.ref_doc_id = @ref_doc_id",
+            [{"name": "@ref_doc_id", "value": ref_doc_id}],
+        )
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None,
+                     **delete_kwargs: Any) -> None:
+        if filters is not None:
+            raise NotImplementedError("Deleting by metadata filters is not supported by CosmosVectorStore")
+        node_ids = list(node_ids or [])
+        for i in range(0, len(node_ids), DELETE_QUERY_BATCH):
+            batch = node_ids[i:i + DELETE_QUERY_BATCH]
+            self._delete_items("ARRAY_CONTAINS(@ids, c.id)", [{"name": "@ids", "value": batch}])
+
+    def count(self) -> int:
+        """Number of nodes stored in the container."""
+        return next(iter(self._container.query_items(
+            query="SELECT VALUE COUNT(1) FROM c", enable_cross_partition_query=True,
+        )), 0)
+
+    def _filter_clause(self, filters: Optional[MetadataFilters]) -> Tuple[str, List[Dict[str, Any]]]:
+        if filters is None or not filters.filters:
+            return "", []
+        clauses, parameters = [], []
+        for i, metadata_filter in enumerate(filters.filters):
+            if isinstance(metadata_filter, MetadataFilters) or metadata_filter.operator != FilterOperator.EQ:
+                raise NotImplementedError("Only EQ metadata filters are supported by CosmosVectorStore")
+            clauses.append(f"c.{self._metadata_key}[\"{metadata_filter.key}\"] = @filter{i}")
+            parameters.append({"name": f"@filter{i}", "value": metadata_filter.value})
+        joiner = " OR " if filters.condition == FilterCondition.OR else " AND "
+        return " WHERE " + joiner.join(clauses), parameters
+
+    def _query(self, query: VectorStoreQuery) -> VectorStoreQueryResult:
+        where, parameters = self._filter_clause(query.filters)
+        distance = f"VectorDistance(c.{self._embedding_key}, @embedding)"
+        # The embeddings themselves are not returned, the query result only needs text and metadata
+        items = self._container.query_items(
+            query=f"SELECT TOP @k c.{self._id_key}, c.{self._text_key}, c.{self._metadata_key}, {distance} AS SimilarityScore"
+                  f" FROM c{where} ORDER BY {distance}",
+            parameters=[
+                {"name": "@k", "value": query.similarity_top_k},
+                {"name": "@embedding", "value": query.query_embedding},
+                *parameters,
+            ],
+            enable_cross_partition_query=True,
+        )
+        nodes, ids, scores = [], [], []
+        for item in items:
+            node = metadata_dict_to_node(item[self._metadata_key])
+            node.set_content(item[self._text_key])
+            nodes.append(node)
+            ids.append(item[self._id_key])
+            scores.append(item["SimilarityScore"])
+        return VectorStoreQueryResult(nodes=nodes, similarities=scores, ids=ids)
@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class DocumentRegistry:
+    """
+    Keeps track of the documents inserted in the index (id, preview, source, partition and timestamps)
+    in a SQLite table. Each insert writes only its own rows, and listing is paged, so neither startup
+    nor inserts depend on the size of the corpus.
+
+    The `document_nodes` table maps each document to the ids of its nodes in the vector store, with
+    the section and content hash they were built from, so documents can be deleted or updated
+    without scanning the vector store.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " doc_id TEXT PRIMARY KEY,"
+            " preview TEXT NOT NULL,"
+            " source TEXT,"
+            " partition TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS document_nodes ("
+            " node_id TEXT PRIMARY KEY,"
+            " doc_id TEXT NOT NULL,"
+            " section_key TEXT,"
+            " content_hash TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS document_nodes_doc_id ON document_nodes(doc_id)")
+        self._conn.commit()
+
+    def upsert_many(self, records: Iterable[Dict[str, Any]]) -> None:
+        """
+        Adds or updates documents in a single transaction. `created_at` is kept for documents that
+        are already registered.
+
+        :param records: Dictionaries with `doc_id`, `preview` and optionally `source` and `partition`.
+        """
+        now = time.time()
+        rows = [
+            (r["doc_id"], r["preview"], r.get("source"), r.get("partition"), now, now)
+            for r in records
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO documents (doc_id, preview, source, partition, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(doc_id) DO UPDATE SET"
+                " preview = excluded.preview,"
+                " source = excluded.source,"
+                " partition = excluded.partition,"
+                " updated_at = excluded.updated_at",
+                rows,
+            )
+            self._conn.commit()
+
+    def list_documents(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns one page of documents, in insertion order.
+
+        :param offset: Number of documents to skip.
+        :param limit: Maximum number of documents to return. If None, returns all remaining documents.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, preview, source, partition, created_at, updated_at FROM documents"
+                " ORDER BY rowid LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_id, preview, source, partition, created_at, updated_at FROM documents"
+                " WHERE doc_id = ?",
+                (doc_id,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def delete(self, doc_id: str) -> bool:
+        """
+        Removes a document and its node mapping.
+
+        :return: True if the document was registered.
+        """
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,)).rowcount
+            self._conn.execute("DELETE FROM document_nodes WHERE doc_id = ?", (doc_id,))
+            self._conn.commit()
+        return deleted > 0
+
+    def add_nodes(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """
+        Records nodes of documents in a single transaction.
+
+        :param entries: Dictionaries with `node_id`, `doc_id` and optionally `section_key` and `content_hash`.
+        """
+        rows = [(e["node_id"], e["doc_id"], e.get("section_key"), e.get("content_hash")) for e in entries]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO document_nodes (node_id, doc_id, section_key, content_hash)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def get_nodes(self, doc_id: str) -> List[Dict[str, Any]]:
+        """Returns the nodes recorded for `doc_id`, in insertion order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT node_id, doc_id, section_key, content_hash FROM document_nodes"
+                " WHERE doc_id = ? ORDER BY rowid",
+                (doc_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def remove_nodes(self, node_ids: Iterable[str]) -> None:
+        node_ids = list(node_ids)
+        with self._lock:
+            self._conn.executemany("DELETE FROM document_nodes WHERE node_id = ?", [(n,) for n in node_ids])
+            self._conn.commit()
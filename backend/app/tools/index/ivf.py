@@ -0,0 +1,150 @@
+import os
+from array import array
+from typing import List, Optional
+
+import numpy as np
+
+CENTROIDS_FILE = "ivf-centroids.npy"
+ASSIGNMENTS_FILE = "ivf-assignments.npy"
+ASSIGN_BLOCK_ROWS = 65536
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of a NumpyVectorStore.
+
+    The vectors are clustered with spherical k-means into `nlist` lists; a query only scores the rows
+    of the `nprobe` lists whose centroids are closest to it. New rows are appended to the list of their
+    nearest centroid, deleted rows stay in their list and are skipped by the store's tombstones until
+    the store is compacted (`compact`).
+    Centroids and row assignments are saved as .npy files next to the vectors.
+
+    :param nlist: Number of lists. 0 picks about 4 * sqrt(rows) when the index is trained.
+    :param nprobe: Default number of lists scanned per query; higher means better recall, slower queries.
+    :param min_rows: The index is trained only once the store holds this many rows; smaller stores are
+                     searched exhaustively.
+    """
+
+    def __init__(self, persist_dir: str, nlist: int = 0, nprobe: int = 16, min_rows: int = 10_000,
+                 train_iterations: int = 10, seed: int = 0):
+        self.persist_dir = persist_dir
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_rows = min_rows
+        self.train_iterations = train_iterations
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_rows = 0
+        self._assignments = array("i")
+        self._lists: List[array] = []
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def load(self, count: int) -> bool:
+        """
+        Loads the saved index. Returns False when there is none, or when it does not cover exactly
+        `count` rows (e.g. the process stopped between an insert and a persist).
+        """
+        centroids_path = os.path.join(self.persist_dir, CENTROIDS_FILE)
+        assignments_path = os.path.join(self.persist_dir, ASSIGNMENTS_FILE)
+        if not (os.path.exists(centroids_path) and os.path.exists(assignments_path)):
+            return False
+
+        assignments = np.load(assignments_path)
+        if assignments.shape[0] != count:
+            return False
+
+        self.centroids = np.load(centroids_path)
+        self.trained_rows = count
+        self._set_assignments(assignments)
+        return True
+
+    def save(self) -> None:
+        if not self.trained:
+            return
+        for name, data in ((CENTROIDS_FILE, self.centroids),
+                           (ASSIGNMENTS_FILE, np.frombuffer(self._assignments, dtype=np.int32))):
+            path = os.path.join(self.persist_dir, name)
+            # np.save appends .npy to names without it, so the temporary name keeps the extension
+            tmp_path = path[:-len(".npy")] + ".tmp.npy"
+            np.save(tmp_path, data)
+            os.replace(tmp_path, path)
+
+    def needs_training(self, count: int) -> bool:
+        """True when the store is big enough to train, or has grown 4x since the last training."""
+        if count < self.min_rows:
+            return False
+        return not self.trained or count >= 4 * self.trained_rows
+
+    def train(self, vectors: np.ndarray) -> None:
+        """
+        Clusters `vectors` (all rows of the store, L2-normalized) with spherical k-means on a sample,
+        then assigns every row to its nearest centroid.
+        """
+        count = vectors.shape[0]
+        nlist = self.nlist or int(4 * np.sqrt(count))
+        # k-means needs a few dozen points per centroid to give balanced lists
+        nlist = max(1, min(nlist, count // 39))
+
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(count, nlist * 64)
+        sample = np.asarray(vectors[np.sort(rng.choice(count, size=sample_size, replace=False))], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind="stable")
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            sums[~empty] = np.add.reduceat(sample[order], starts[~empty], axis=0)
+            if empty.any():
+                # Restart empty lists from random sample points
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms == 0, 1, norms)
+
+        self.centroids = centroids.astype(np.float32)
+        self.trained_rows = count
+        self._set_assignments(self._assign(vectors))
+
+    def add(self, start_row: int, vectors: np.ndarray) -> None:
+        """Appends rows `start_row .. start_row + len(vectors)` to the lists of their nearest centroids."""
+        labels = self._assign(vectors)
+        self._assignments.extend(labels.tolist())
+        for offset, label in enumerate(labels.tolist()):
+            self._lists[label].append(start_row + offset)
+
+    def compact(self, live_rows: np.ndarray) -> None:
+        """Keeps only `live_rows` (sorted), renumbered from 0, after the store rewrote its arrays the same way."""
+        assignments = np.frombuffer(self._assignments, dtype=np.int32)[live_rows]
+        self.trained_rows = min(self.trained_rows, live_rows.shape[0])
+        self._set_assignments(assignments)
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Rows of the `nprobe` lists closest to `query`, copied so later inserts can grow the lists."""
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        scores = self.centroids @ query
+        probe = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        parts = [np.array(self._lists[label], dtype=np.int64) for label in probe.tolist()]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        labels = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], ASSIGN_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+            labels[start:start + block.shape[0]] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def _set_assignments(self, assignments: np.ndarray) -> None:
+        assignments = np.asarray(assignments, dtype=np.int32)
+        self._assignments = array("i", assignments.tobytes())
+        self._lists = [array("q") for _ in range(self.centroids.shape[0])]
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.centroids.shape[0] + 1))
+        for label in range(self.centroids.shape[0]):
+            self._lists[label] = array("q", order[bounds[label]:bounds[label + 1]].astype(np.int64).tobytes())
@@ -0,0 +1,565 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+from .ivf import IVFIndex
+from .quantization import QUANTIZATIONS, approx_scores, code_specs, encode
+
+NODES_FILE = "nodes.sqlite3"
+INITIAL_CAPACITY = 1024
+METADATA_KEY = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+ARRAY_FILE = re.compile(r"^(vectors|codes|scales)-\d+(\.\d+)?\.npy$")
+ANN_METHODS = ("none", "ivf")
+# `persist` rewrites the arrays without the tombstoned rows once they are this share of the rows
+COMPACT_DEAD_FRACTION = 0.25
+COMPACT_BLOCK_ROWS = 65536
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest finite scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+    top = top[np.argsort(-scores[top])]
+    return top[np.isfinite(scores[top])]
+
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Local vector store that keeps every embedding in one contiguous float32 matrix.
+
+    The matrix lives in a `vectors-<capacity>.npy` file inside `persist_dir` and is opened as a memory
+    map, so starting the store does not read the vectors. Inserts write the new rows in place; when the
+    file is full its contents are copied to a new file with twice the capacity. Node payloads and
+    metadata live in a SQLite side table keyed by row number.
+
+    Vectors are L2-normalized on insert, so cosine similarity is a single matrix-vector product, and
+    the top k rows are selected with `argpartition`. Deleted rows are tombstoned and skipped; once they
+    are COMPACT_DEAD_FRACTION of the rows, `persist` rewrites the arrays with the live rows only (see
+    `compact`), so replaced documents do not grow the files and the scans forever.
+
+    With `quantization` set to "float16" or "int8" (one scale per vector), a compressed copy of the
+    matrix is kept next to it. Queries scan only the compressed copy, which is 2x or ~4x smaller to
+    keep in memory, and re-rank the best `similarity_top_k * rerank_factor` rows exactly with their
+    float32 vectors, which are read from disk only for that shortlist.
+    With `ann="ivf"`, stores of at least `ann_min_rows` rows are clustered into an inverted-file index
+    (see `IVFIndex`) and a query only scores the rows of its `ivf_nprobe` closest lists. `nprobe` can
+    also be passed per query through `vector_store_kwargs`.
+    Metadata keys listed in `indexed_metadata_keys` get a SQLite expression index, so EQ/IN filters
+    on them do not scan every payload.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    persist_dir: str
+    indexed_metadata_keys: List[str] = ["partition"]
+    quantization: str = "none"
+    rerank_factor: int = 4
+    ann: str = "none"
+    ivf_nlist: int = 0
+    ivf_nprobe: int = 16
+    ann_min_rows: int = 10_000
+
+    _lock: Any = PrivateAttr()
+    _conn: Any = PrivateAttr()
+    _arrays: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _files: Dict[str, str] = PrivateAttr(default_factory=dict)
+    _alive: Any = PrivateAttr()
+    _count: int = PrivateAttr(default=0)
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _ivf: Optional[IVFIndex] = PrivateAttr(default=None)
+    _generation: int = PrivateAttr(default=0)
+
+    def __init__(self, persist_dir: str, indexed_metadata_keys: Optional[List[str]] = None, **kwargs: Any):
+        if indexed_metadata_keys is not None:
+            kwargs["indexed_metadata_keys"] = indexed_metadata_keys
+        super().__init__(persist_dir=persist_dir, **kwargs)
+        if self.quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {self.quantization!r}, expected one of {QUANTIZATIONS}")
+        if self.ann not in ANN_METHODS:
+            raise ValueError(f"Unknown ANN method {self.ann!r}, expected one of {ANN_METHODS}")
+        os.makedirs(persist_dir, exist_ok=True)
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(os.path.join(persist_dir, NODES_FILE), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            " row INTEGER PRIMARY KEY,"
+            " node_id TEXT NOT NULL UNIQUE,"
+            " ref_doc_id TEXT,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS nodes_ref_doc_id ON nodes(ref_doc_id)")
+        for key in self.indexed_metadata_keys:
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS nodes_meta_{key} ON nodes({self._metadata_expr(key)})"
+            )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tombstones (row INTEGER PRIMARY KEY)")
+        self._conn.commit()
+        self._load()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def __len__(self) -> int:
+        return int(self._alive[:self._count].sum())
+
+    def __bool__(self) -> bool:
+        # StorageContext.from_defaults tests `if vector_store:`, an empty store must not look missing
+        return True
+
+    # --- storage ---
+
+    def _load(self) -> None:
+        meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+        self._count = int(meta.get("count", 0))
+        self._dim = int(meta["dim"]) if "dim" in meta else None
+        self._generation = int(meta.get("compactions", 0))
+
+        for name in ("vectors", "codes", "scales"):
+            if f"{name}_file" in meta:
+                self._files[name] = meta[f"{name}_file"]
+                self._arrays[name] = np.lib.format.open_memmap(
+                    os.path.join(self.persist_dir, self._files[name]), mode="r+"
+                )
+        if self._dim is not None and meta.get("quantization", "none") != self.quantization:
+            self._rebuild_codes()
+        self._remove_stale_files()
+
+        capacity = self._capacity()
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:self._count] = True
+        dead = [row for (row,) in self._conn.execute("SELECT row FROM tombstones")]
+        if dead:
+            self._alive[np.asarray(dead, dtype=np.int64)] = False
+
+        if self.ann == "ivf":
+            self._ivf = IVFIndex(self.persist_dir, nlist=self.ivf_nlist, nprobe=self.ivf_nprobe,
+                                 min_rows=self.ann_min_rows)
+            # A missing or outdated index (inserts after the last persist) is rebuilt from the vectors
+            if not self._ivf.load(self._count) and self._ivf.needs_training(self._count):
+                self._ivf.train(self._arrays["vectors"][:self._count])
+
+    def _capacity(self) -> int:
+        return self._arrays["vectors"].shape[0] if "vectors" in self._arrays else 0
+
+    def _array_specs(self) -> Dict[str, Any]:
+        return {"vectors": (np.dtype(np.float32), (self._dim,)), **code_specs(self.quantization, self._dim)}
+
+    def _allocate(self, name: str, capacity: int, rows: Optional[np.ndarray] = None) -> None:
+        """
+        Creates the file of array `name` with room for `capacity` rows and copies the live rows into it:
+        every row, or only `rows` (renumbered from 0) when compacting.
+        """
+        dtype, row_shape = self._array_specs()[name]
+        # A compaction may keep the capacity, its files are told apart by the compaction number
+        file_name = f"{name}-{capacity}.npy" if rows is None else f"{name}-{capacity}.{self._generation + 1}.npy"
+        grown = np.lib.format.open_memmap(
+            os.path.join(self.persist_dir, file_name), mode="w+", dtype=dtype, shape=(capacity, *row_shape)
+        )
+        if name in self._arrays and rows is None:
+            grown[:self._count] = self._arrays[name][:self._count]
+        elif name in self._arrays:
+            for start in range(0, rows.shape[0], COMPACT_BLOCK_ROWS):
+                block = rows[start:start + COMPACT_BLOCK_ROWS]
+                grown[start:start + block.shape[0]] = self._arrays[name][block]
+        grown.flush()
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f"{name}_file", file_name))
+
+        # Queries that already hold the old array keep reading it until they finish
+        self._arrays[name] = grown
+        self._files[name] = file_name
+
+    def _rebuild_codes(self) -> None:
+        """Re-encodes the compressed arrays after `quantization` changed for an existing store."""
+        specs = self._array_specs()
+        for name in ("codes", "scales"):
+            self._arrays.pop(name, None)
+            self._files.pop(name, None)
+            self._conn.execute("DELETE FROM meta WHERE key = ?", (f"{name}_file",))
+
+        capacity = self._capacity()
+        for name in specs:
+            if name != "vectors":
+                self._allocate(name, capacity)
+        vectors = self._arrays["vectors"]
+        for start in range(0, self._count, 65536):
+            end = min(start + 65536, self._count)
+            for name, codes in encode(self.quantization, np.asarray(vectors[start:end])).items():
+                self._arrays[name][start:end] = codes
+        for name in specs:
+            self._arrays[name].flush()
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('quantization', ?)", (self.quantization,))
+        self._conn.commit()
+
+    def _reserve(self, needed: int, dim: int) -> None:
+        """Makes room for `needed` rows, doubling the capacity of the array files when they are full."""
+        if self._dim is None:
+            self._dim = dim
+        elif dim != self._dim:
+            raise ValueError(f"Embedding has {dim} dimensions, the store was created with {self._dim}")
+
+        capacity = self._capacity()
+        if needed <= capacity:
+            return
+
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+
+        for name in self._array_specs():
+            self._allocate(name, new_capacity)
+        self._conn.commit()
+
+        alive = np.zeros(new_capacity, dtype=bool)
+        alive[:self._alive.shape[0]] = self._alive
+        self._alive = alive
+        self._remove_stale_files()
+
+    def _remove_stale_files(self) -> None:
+        """Deletes array files left behind by a grow. Files still mapped (on Windows) are retried later."""
+        current = set(self._files.values())
+        for name in os.listdir(self.persist_dir):
+            if ARRAY_FILE.match(name) and name not in current:
+                try:
+                    os.remove(os.path.join(self.persist_dir, name))
+                except OSError:
+                    pass
+
+    def _tombstone(self, rows: Sequence[int]) -> None:
+        if not rows:
+            return
+        self._conn.executemany("DELETE FROM nodes WHERE row = ?", [(row,) for row in rows])
+        self._conn.executemany("INSERT OR IGNORE INTO tombstones (row) VALUES (?)", [(row,) for row in rows])
+        self._alive[np.asarray(rows, dtype=np.int64)] = False
+
+    def persist(self, persist_path: Optional[str] = None, fs: Optional[Any] = None) -> None:
+        """
+        Flushes the matrix to disk, compacting it first if enough rows are tombstoned. The files always
+        live in `persist_dir`; the path given by `StorageContext.persist` is ignored.
+        """
+        with self._lock:
+            self.compact(COMPACT_DEAD_FRACTION)
+            for array in self._arrays.values():
+                array.flush()
+            self._conn.commit()
+            if self._ivf is not None:
+                self._ivf.save()
+
+    def compact(self, min_dead_fraction: float = 0.0) -> bool:
+        """
+        Rewrites the arrays with the live rows only, renumbered in their order, and drops the tombstones.
+
+        The new files are written first and switched to in one SQLite transaction (row numbers of the
+        payloads, file names, count), so a crash leaves either the old or the new store. Queries that
+        were scanning the old rows search again (see `query`).
+
+        :param min_dead_fraction: Compacts only if at least this share of the rows is tombstoned.
+        :return: True if the store was compacted.
+        """
+        with self._lock:
+            live_rows = np.flatnonzero(self._alive[:self._count])
+            dead = self._count - live_rows.shape[0]
+            if dead == 0 or dead < min_dead_fraction * self._count:
+                return False
+
+            capacity = INITIAL_CAPACITY
+            while capacity < live_rows.shape[0]:
+                capacity *= 2
+            for name in self._array_specs():
+                self._allocate(name, capacity, live_rows)
+
+            # Rows are renumbered through negative values, so no two payloads ever share a row
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS row_map (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+            self._conn.execute("DELETE FROM row_map")
+            self._conn.executemany("INSERT INTO row_map (old, new) VALUES (?, ?)",
+                                   zip(live_rows.tolist(), range(live_rows.shape[0])))
+            self._conn.execute("UPDATE nodes SET row = -1 - (SELECT new FROM row_map WHERE old = nodes.row)")
+            self._conn.execute("UPDATE nodes SET row = -1 - row")
+            self._conn.execute("DELETE FROM row_map")
+            self._conn.execute("DELETE FROM tombstones")
+            self._count = live_rows.shape[0]
+            self._generation += 1
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("count", str(self._count)), ("compactions", str(self._generation))],
+            )
+            self._conn.commit()
+
+            self._alive = np.zeros(capacity, dtype=bool)
+            self._alive[:self._count] = True
+            if self._ivf is not None and self._ivf.trained:
+                self._ivf.compact(live_rows)
+                self._ivf.save()
+            self._remove_stale_files()
+            print(f"Compacted the local vector store: {dead} deleted rows removed, {self._count} left")
+            return True
+
+    # --- writes ---
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+
+        embeddings = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            # Re-adding a node id replaces the previous row
+            node_ids = [node.node_id for node in nodes]
+            self._tombstone(self._rows_for("node_id", node_ids))
+
+            start = self._count
+            self._reserve(start + len(nodes), embeddings.shape[1])
+            end = start + len(nodes)
+            self._arrays["vectors"][start:end] = embeddings
+            for name, codes in encode(self.quantization, embeddings).items():
+                self._arrays[name][start:end] = codes
+
+            rows = []
+            for offset, node in enumerate(nodes):
+                payload = node_to_metadata_dict(node, remove_text=False, flat_metadata=self.flat_metadata)
+                rows.append((start + offset, node.node_id, node.ref_doc_id, json.dumps(payload)))
+            self._conn.executemany(
+                "INSERT INTO nodes (row, node_id, ref_doc_id, payload) VALUES (?, ?, ?, ?)", rows
+            )
+
+            self._count = start + len(nodes)
+            self._alive[start:self._count] = True
+            if self._ivf is not None:
+                if self._ivf.needs_training(self._count):
+                    self._ivf.train(self._arrays["vectors"][:self._count])
+                elif self._ivf.trained:
+                    self._ivf.add(start, embeddings)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("count", str(self._count)), ("dim", str(self._dim)), ("quantization", self.quantization)],
+            )
+            self._conn.commit()
+
+        return node_ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        with self._lock:
+            self._tombstone(self._rows_for("ref_doc_id", [ref_doc_id]))
+            self._conn.commit()
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None,
+                     **delete_kwargs: Any) -> None:
+        with self._lock:
+            rows = []
+            if node_ids:
+                rows.extend(self._rows_for("node_id", node_ids))
+            if filters is not None:
+                rows.extend(self._rows_matching(filters).tolist())
+            self._tombstone(sorted(set(rows)))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tombstone(np.flatnonzero(self._alive[:self._count]).tolist())
+            self._conn.commit()
+
+    # --- reads ---
+
+    def _rows_for(self, column: str, values: Sequence[str]) -> List[int]:
+        rows: List[int] = []
+        values = list(values)
+        for i in range(0, len(values), 500):
+            chunk = values[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.extend(
+                row for (row,) in self._conn.execute(
+                    f"SELECT row FROM nodes WHERE {column} IN ({placeholders})", chunk
+                )
+            )
+        return rows
+
+    @staticmethod
+    def _metadata_expr(key: str) -> str:
+        # The JSON path is inlined (not bound) so SQLite can match it against the expression indexes
+        if not METADATA_KEY.match(key):
+            raise ValueError(f"Unsupported metadata key: {key!r}")
+        return f"json_extract(payload, '$.{key}')"
+
+    def _rows_matching(self, filters: MetadataFilters) -> np.ndarray:
+        """Translates EQ/IN metadata filters into a SQL query over the node payloads."""
+        clauses, params = [], []
+        for metadata_filter in filters.filters:
+            if not isinstance(metadata_filter, MetadataFilter):
+                raise NotImplementedError("Nested metadata filters are not supported by NumpyVectorStore")
+            expr = self._metadata_expr(metadata_filter.key)
+            if metadata_filter.operator == FilterOperator.EQ:
+                clauses.append(f"{expr} = ?")
+                params.append(metadata_filter.value)
+            elif metadata_filter.operator == FilterOperator.IN:
+                values = list(metadata_filter.value)
+                clauses.append(f"{expr} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                raise NotImplementedError(
+                    f"Filter operator {metadata_filter.operator} is not supported by NumpyVectorStore"
+                )
+        if not clauses:
+            return np.flatnonzero(self._alive[:self._count])
+
+        joiner = " OR " if filters.condition == FilterCondition.OR else " AND "
+        rows = [row for (row,) in self._conn.execute(
+            f"SELECT row FROM nodes WHERE {joiner.join(clauses)}", params
+        )]
+        return np.asarray(rows, dtype=np.int64)
+
+    def _candidate_rows(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        """Rows allowed by the query filters, or None when every live row is a candidate."""
+        candidates = None
+        if query.filters is not None:
+            candidates = self._rows_matching(query.filters)
+        if query.doc_ids:
+            by_doc = np.asarray(self._rows_for("ref_doc_id", query.doc_ids), dtype=np.int64)
+            candidates = by_doc if candidates is None else np.intersect1d(candidates, by_doc)
+        if query.node_ids:
+            by_node = np.asarray(self._rows_for("node_id", query.node_ids), dtype=np.int64)
+            candidates = by_node if candidates is None else np.intersect1d(candidates, by_node)
+        return candidates
+
+    def _search(self, arrays: Dict[str, np.ndarray], alive: np.ndarray, query_embedding: np.ndarray,
+                candidates: Optional[np.ndarray], k: int):
+        """
+        Returns the rows and cosine scores of the `k` best candidates (every live row when `candidates`
+        is None), best first.
+        """
+        vectors = arrays["vectors"]
+        if self.quantization == "none":
+            if candidates is None:
+                scores = np.asarray(vectors @ query_embedding)
+                scores[~alive] = -np.inf
+            else:
+                scores = np.asarray(vectors[candidates] @ query_embedding)
+            top = top_k_indices(scores, k)
+            rows = top if candidates is None else candidates[top]
+            return rows, scores[top]
+
+        approx = approx_scores(self.quantization, arrays, query_embedding, candidates)
+        if candidates is None:
+            approx[~alive] = -np.inf
+        shortlist = top_k_indices(approx, k * self.rerank_factor)
+        shortlist_rows = np.sort(shortlist if candidates is None else candidates[shortlist])
+
+        # Exact re-rank; sorted rows keep the reads from the float32 file sequential
+        exact = np.asarray(vectors[shortlist_rows] @ query_embedding)
+        top = top_k_indices(exact, k)
+        return shortlist_rows[top], exact[top]
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise NotImplementedError(f"Query mode {query.mode} is not supported by NumpyVectorStore")
+        if query.query_embedding is None:
+            raise ValueError("NumpyVectorStore needs a query embedding")
+        if self._count == 0:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        q = np.asarray(query.query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm > 0:
+            q /= norm
+
+        while True:
+            result = self._query_once(query, q, **kwargs)
+            # None: the store was compacted during the scan and the rows found are numbered differently
+            if result is not None:
+                return result
+
+    def _query_once(self, query: VectorStoreQuery, q: np.ndarray, **kwargs: Any) -> Optional[VectorStoreQueryResult]:
+        # Only the bookkeeping is read under the lock; the scan runs unlocked so that concurrent
+        # queries do not serialize on each other
+        with self._lock:
+            generation = self._generation
+            count = self._count
+            arrays = {name: array[:count] for name, array in self._arrays.items()}
+            alive = self._alive[:count]
+            candidates = self._candidate_rows(query)
+            if self._ivf is not None and self._ivf.trained:
+                probed = self._ivf.candidates(q, kwargs.get("nprobe"))
+                # A filter narrower than the probed lists is cheaper to search exactly
+                if candidates is None:
+                    candidates = np.sort(probed)
+                elif candidates.size > probed.size:
+                    candidates = np.intersect1d(candidates, probed)
+            if candidates is not None:
+                candidates = candidates[alive[candidates]]
+                if candidates.size == 0:
+                    return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        top_rows, top_scores = self._search(arrays, alive, q, candidates, query.similarity_top_k)
+
+        with self._lock:
+            if self._generation != generation:
+                return None
+            payloads = self._payloads_for_rows(top_rows.tolist())
+        nodes, similarities = [], []
+        for row, score in zip(top_rows.tolist(), top_scores.tolist()):
+            # A row deleted while the query was running has no payload anymore
+            if row in payloads:
+                nodes.append(metadata_dict_to_node(json.loads(payloads[row])))
+                similarities.append(float(score))
+        return VectorStoreQueryResult(
+            nodes=nodes,
+            similarities=similarities,
+            ids=[node.node_id for node in nodes],
+        )
+
+    def _payloads_for_rows(self, rows: List[int]) -> Dict[int, str]:
+        payloads: Dict[int, str] = {}
+        with self._lock:
+            for i in range(0, len(rows), 500):
+                chunk = rows[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                payloads.update(self._conn.execute(
+                    f"SELECT row, payload FROM nodes WHERE row IN ({placeholders})", chunk
+                ).fetchall())
+        return payloads
+
+    def _nodes_for_rows(self, rows: List[int]) -> List[BaseNode]:
+        payloads = self._payloads_for_rows(rows)
+        return [metadata_dict_to_node(json.loads(payloads[row])) for row in rows if row in payloads]
+
+    def get_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None,
+                  **kwargs: Any) -> List[BaseNode]:
+        with self._lock:
+            if node_ids is not None:
+                rows = self._rows_for("node_id", node_ids)
+            elif filters is not None:
+                rows = self._rows_matching(filters).tolist()
+            else:
+                rows = np.flatnonzero(self._alive[:self._count]).tolist()
+            return self._nodes_for_rows(rows)
@@ -0,0 +1,65 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+QUANTIZATIONS = ("none", "float16", "int8")
+
+# Compressed rows are widened to float32 one block at a time, so a scan never allocates more than
+# SCAN_BLOCK_ROWS * dim * 4 bytes on top of the compressed matrix
+SCAN_BLOCK_ROWS = 8192
+
+
+def code_specs(quantization: str, dim: int) -> Dict[str, Tuple[np.dtype, Tuple[int, ...]]]:
+    """
+    Arrays (name -> dtype, per-row shape) that hold the compressed copy of the vectors.
+
+    :param quantization: "none", "float16" or "int8".
+    :param dim: Number of dimensions of the vectors.
+    """
+    if quantization == "none":
+        return {}
+    if quantization == "float16":
+        return {"codes": (np.dtype(np.float16), (dim,))}
+    if quantization == "int8":
+        return {"codes": (np.dtype(np.int8), (dim,)), "scales": (np.dtype(np.float32), ())}
+    raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+
+
+def encode(quantization: str, vectors: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Compresses float32 vectors. int8 uses symmetric scalar quantization with one scale per vector
+    (max |x| / 127), so each vector keeps its full int8 range.
+    """
+    if quantization == "none":
+        return {}
+    if quantization == "float16":
+        return {"codes": vectors.astype(np.float16)}
+    if quantization == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return {"codes": codes, "scales": scales.astype(np.float32)}
+    raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+
+
+def approx_scores(quantization: str, arrays: Dict[str, np.ndarray], query: np.ndarray,
+                  rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Approximate dot products between `query` and the compressed vectors, computed block by block.
+
+    :param arrays: The arrays described by `code_specs`, sliced to the live row count.
+    :param query: The float32 query vector.
+    :param rows: Optional subset of rows to score. If None, every row is scored.
+    :return: One float32 score per scored row.
+    """
+    codes = arrays["codes"]
+    scales = arrays.get("scales")
+    total = codes.shape[0] if rows is None else rows.shape[0]
+    scores = np.empty(total, dtype=np.float32)
+    for start in range(0, total, SCAN_BLOCK_ROWS):
+        end = min(start + SCAN_BLOCK_ROWS, total)
+        selector = slice(start, end) if rows is None else rows[start:end]
+        scores[start:end] = codes[selector].astype(np.float32) @ query
+        if scales is not None:
+            scores[start:end] *= scales[selector]
+    return scores
@@ -0,0 +1,123 @@
+import time
+from typing import Any, List, Optional, Sequence
+
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+# The node counts of the tiers are compared again this often
+COMPLETENESS_RECHECK_SEC = 300
+
+
+def merge_results(results: Sequence[VectorStoreQueryResult], top_k: int) -> VectorStoreQueryResult:
+    """
+    Merges the results of several stores by similarity (higher is better), keeping the first copy of
+    a node found in more than one of them.
+    """
+    seen, merged = set(), []
+    for result in results:
+        for position, node in enumerate(result.nodes or []):
+            node_id = result.ids[position] if result.ids else node.node_id
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            similarity = result.similarities[position] if result.similarities else 0.0
+            merged.append((similarity, node_id, node))
+    merged.sort(key=lambda item: item[0], reverse=True)
+    merged = merged[:top_k]
+    return VectorStoreQueryResult(
+        nodes=[node for _, _, node in merged],
+        similarities=[similarity for similarity, _, _ in merged],
+        ids=[node_id for _, node_id, _ in merged],
+    )
+
+
+class TieredVectorStore(BasePydanticVectorStore):
+    """
+    Pairs a local hot tier with a remote cold tier (Cosmos DB).
+
+    Writes and deletes go to both tiers. Queries are answered by the hot tier alone while it holds
+    as many nodes as the cold tier; otherwise (e.g. documents inserted before the hot tier was
+    enabled, or by a process that writes to Cosmos DB only) both tiers are queried and their results
+    merged by similarity, so nodes stored only in Cosmos DB are still found. The counts are compared
+    on the first query and again every COMPLETENESS_RECHECK_SEC, complete or not.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    _hot: Any = PrivateAttr()
+    _cold: Any = PrivateAttr()
+    _hot_complete: bool = PrivateAttr(default=False)
+    _checked_at: Optional[float] = PrivateAttr(default=None)
+
+    def __init__(self, hot: BasePydanticVectorStore, cold: BasePydanticVectorStore, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._hot = hot
+        self._cold = cold
+        self._hot_complete = False
+        self._checked_at = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TieredVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return self._cold.client
+
+    @property
+    def hot(self) -> BasePydanticVectorStore:
+        return self._hot
+
+    @property
+    def cold(self) -> BasePydanticVectorStore:
+        return self._cold
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        ids = self._hot.add(nodes, **add_kwargs)
+        self._cold.add(nodes, **add_kwargs)
+        return ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._hot.delete(ref_doc_id, **delete_kwargs)
+        self._cold.delete(ref_doc_id, **delete_kwargs)
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None,
+                     **delete_kwargs: Any) -> None:
+        self._hot.delete_nodes(node_ids=node_ids, filters=filters, **delete_kwargs)
+        self._cold.delete_nodes(node_ids=node_ids, filters=filters, **delete_kwargs)
+
+    def hot_is_complete(self) -> bool:
+        """
+        True if the hot tier held every node of the cold tier when the counts were last compared. Writes
+        made here go to both tiers, but not the ones of other processes, so a complete hot tier is
+        checked again too.
+        """
+        if self._checked_at is not None and time.time() - self._checked_at < COMPLETENESS_RECHECK_SEC:
+            return self._hot_complete
+        self._checked_at = time.time()
+        try:
+            self._hot_complete = len(self._hot) >= self._cold.count()
+        except Exception as e:
+            print(f"Could not compare the sizes of the vector store tiers: {e}")
+        return self._hot_complete
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        result = self._hot.query(query, **kwargs)
+        if self.hot_is_complete():
+            return result
+        return merge_results([result, self._cold.query(query, **kwargs)], query.similarity_top_k)
+
+    def get_nodes(self, node_ids: Optional[List[str]] = None, filters: Optional[MetadataFilters] = None,
+                  **kwargs: Any) -> List[BaseNode]:
+        return self._hot.get_nodes(node_ids=node_ids, filters=filters, **kwargs)
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        self._hot.persist(persist_path, fs=fs)
+        self._cold.persist(persist_path, fs=fs)
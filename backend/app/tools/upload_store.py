@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import Request
+
+# Bytes read at a time when a file has to be hashed or copied
+CHUNK_SIZE = 1024 * 1024
+
+# Uploaded files are spooled here while the request is parsed; keep it on the same disk as
+# uploads/ and documents/ so saving them is a rename
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", os.path.join("uploads", ".incoming"))
+UPLOAD_REGISTRY_PATH = os.getenv("UPLOAD_REGISTRY_PATH", "uploads.sqlite3")
+
+
+class HashingFile:
+    """
+    File part of a multipart request, written to disk as werkzeug parses the body while its SHA-256
+    is computed. The request is read once, chunk by chunk: the hash is known as soon as the body is
+    parsed and `keep` moves the file into place without copying it. A file that is not kept is
+    removed when the request closes it.
+    """
+
+    def __init__(self, folder: str):
+        os.makedirs(folder, exist_ok=True)
+        fd, self.name = tempfile.mkstemp(dir=folder, suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.kept = False
+
+    def write(self, data: bytes) -> int:
+        self._sha256.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+    def keep(self, dest_path: str) -> None:
+        """Moves the spooled file to `dest_path`."""
+        self._file.flush()
+        try:
+            os.replace(self.name, dest_path)
+        except OSError:
+            # Another disk: fall back to a copy
+            shutil.move(self.name, dest_path)
+        self.kept = True
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+        if not self.kept and os.path.exists(self.name):
+            os.remove(self.name)
+
+
+class UploadRequest(Request):
+    """
+    Request class of the app: uploaded files are spooled to UPLOAD_SPOOL_DIR through `HashingFile`
+    instead of werkzeug's temporary files, see `upload_digest` and `save_upload`.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingFile(UPLOAD_SPOOL_DIR)
+
+
+def upload_digest(uploaded_file) -> Tuple[str, int]:
+    """
+    Returns the SHA-256 (hex) and the size of an uploaded file. Free for files spooled by
+    `UploadRequest`; other streams are read once in chunks and rewound.
+
+    :param uploaded_file: A werkzeug FileStorage.
+    :return: A tuple (sha256, size).
+    """
+    stream = uploaded_file.stream
+    if isinstance(stream, HashingFile):
+        return stream.hexdigest(), stream.size
+
+    sha256 = hashlib.sha256()
+    size = 0
+    stream.seek(0)
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        sha256.update(chunk)
+        size += len(chunk)
+    stream.seek(0)
+    return sha256.hexdigest(), size
+
+
+def save_upload(uploaded_file, dest_path: str) -> None:
+    """
+    Saves an uploaded file to `dest_path`: a rename for files spooled by `UploadRequest`, a chunked
+    copy otherwise.
+
+    :param uploaded_file: A werkzeug FileStorage.
+    :param dest_path: Where to save the file; its folder is created if needed.
+    """
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    stream = uploaded_file.stream
+    if isinstance(stream, HashingFile):
+        stream.keep(dest_path)
+    else:
+        stream.seek(0)
+        with open(dest_path, "wb") as dest:
+            shutil.copyfileobj(stream, dest, CHUNK_SIZE)
+
+
+def unique_upload_path(filename: str, folder: str = "uploads") -> str:
+    """
+    A path for an uploaded file that no other upload uses: `filename` inside a new temporary folder
+    under `folder`, so the file keeps its name (and the readers its type and file_name metadata)
+    even when two uploads have the same name. Remove it with `remove_upload`.
+    """
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(tempfile.mkdtemp(dir=folder, prefix=".upload-"), filename)
+
+
+def remove_upload(path: str) -> None:
+    """Removes a file saved at a `unique_upload_path` and its folder."""
+    if os.path.exists(path):
+        os.remove(path)
+    folder = os.path.dirname(path)
+    if os.path.basename(folder).startswith(".upload-"):
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+class UploadRegistry:
+    """
+    Maps the SHA-256 of every uploaded file to what was built from it (the document ids, and for
+    videos the Video Indexer id and the job), in a SQLite table. Uploading the same bytes again is
+    answered from here, without a second Video Indexer upload, prompt generation or embedding.
+
+    `kind` separates documents ("file") from videos ("video"); a video row goes from "processing"
+    to "done" or "failed" with its job. Rows pointing to a deleted or replaced document are removed
+    with `forget_documents`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " content_hash TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " size INTEGER,"
+            " doc_ids TEXT,"
+            " video_id TEXT,"
+            " job_id TEXT,"
+            " status TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (content_hash, kind))"
+        )
+        self._conn.commit()
+
+    def get(self, content_hash: str, kind: str) -> Optional[Dict[str, Any]]:
+        """
+        :param content_hash: SHA-256 of the file.
+        :param kind: "file" or "video".
+        :return: The row of the file, with `doc_ids` as a list, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM uploads WHERE content_hash = ? AND kind = ?", (content_hash, kind)
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["doc_ids"] = json.loads(record["doc_ids"]) if record["doc_ids"] else []
+        return record
+
+    def record(self, content_hash: str, kind: str, size: Optional[int] = None, doc_ids: Optional[List[str]] = None,
+               video_id: Optional[str] = None, job_id: Optional[str] = None, status: str = "done") -> None:
+        """
+        Adds or replaces the row of a file.
+
+        :param content_hash: SHA-256 of the file.
+        :param kind: "file" or "video".
+        :param size: Size of the file in bytes.
+        :param doc_ids: Ids of the documents built from the file.
+        :param video_id: Video Indexer id, for videos.
+        :param job_id: Id of the video job, for videos.
+        :param status: "processing", "done" or "failed".
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO uploads (content_hash, kind, size, doc_ids, video_id, job_id, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(content_hash, kind) DO UPDATE SET"
+                " size = excluded.size,"
+                " doc_ids = excluded.doc_ids,"
+                " video_id = excluded.video_id,"
+                " job_id = excluded.job_id,"
+                " status = excluded.status,"
+                " updated_at = excluded.updated_at",
+                (content_hash, kind, size, json.dumps(doc_ids or []), video_id, job_id, status, now, now),
+            )
+            self._conn.commit()
+
+    def update(self, content_hash: str, kind: str, **fields) -> None:
+        """
+        Updates some columns of a row, e.g. `video_id` once the video is uploaded.
+
+        :param fields: Any of doc_ids, video_id, job_id and status.
+        """
+        allowed = {"doc_ids", "video_id", "job_id", "status"}
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"Unknown upload fields {sorted(unknown)}, expected some of {sorted(allowed)}")
+        if "doc_ids" in fields:
+            fields["doc_ids"] = json.dumps(fields["doc_ids"] or [])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE uploads SET {assignments} WHERE content_hash = ? AND kind = ?",
+                (*fields.values(), content_hash, kind),
+            )
+            self._conn.commit()
+
+    def forget_documents(self, doc_ids: Iterable[str]) -> int:
+        """
+        Removes the rows of the files that built any of `doc_ids`, so uploading them again indexes
+        them again.
+
+        :return: The number of rows removed.
+        """
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return 0
+        placeholders = ", ".join("?" for _ in doc_ids)
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM uploads WHERE EXISTS ("
+                f" SELECT 1 FROM json_each(uploads.doc_ids) WHERE json_each.value IN ({placeholders}))",
+                doc_ids,
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+
+_upload_registry: Optional[UploadRegistry] = None
+
+
+def get_upload_registry() -> UploadRegistry:
+    global _upload_registry
+    if _upload_registry is None:
+        _upload_registry = UploadRegistry(UPLOAD_REGISTRY_PATH)
+    return _upload_registry
@@ -1,8 +1,9 @@
-import tiktoken
 import os
-# from openai import AzureOpenAI
+from openai import AzureOpenAI
 from dotenv import load_dotenv
 import json
+from conversation import ConversationBuffer
+from section_index import get_section_index, section_text
 
 # Função para carregar o conteúdo do arquivo JSON
 def load_prompt_content(file_path):
@@ -41,56 +42,29 @@ client = AzureOpenAI(
 system_message = {"role": "system", "content": "You are a helpful assistant."}
 max_response_tokens = 250
 token_limit = 4096
-conversation = []
-conversation.append(system_message)
-
-def num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613"):
-    """Return the number of tokens used by a list of messages."""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-    except KeyError:
-        print("Warning: model not found. Using cl100k_base encoding.")
-        encoding = tiktoken.get_encoding("cl100k_base")
-    if model in {
-        "gpt-3.5-turbo-0613",
-        "gpt-3.5-turbo-16k-0613",
-        "gpt-4-0314",
-        "gpt-4-32k-0314",
-        "gpt-4-0613",
-        "gpt-4-32k-0613",
-        }:
-        tokens_per_message = 3
-        tokens_per_name = 1
-    elif model == "gpt-3.5-turbo-0301":
-        tokens_per_message = 4  # every message follows <|start|>{role/name}\n{content}<|end|>\n
-        tokens_per_name = -1  # if there's a name, the role is omitted
-    elif "gpt-3.5-turbo" in model:
-        print("Warning: gpt-3.5-turbo may update over time. Returning num tokens assuming gpt-3.5-turbo-0613.")
-        return num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613")
-    elif "gpt-4" in model:
-        print("Warning: gpt-4 may update over time. Returning num tokens assuming gpt-4-0613.")
-        return num_tokens_from_messages(messages, model="gpt-4-0613")
-    else:
-        raise NotImplementedError(
-            f"""num_tokens_from_messages() is not implemented for model {model}."""
-        )
-    num_tokens = 0
-    for message in messages:
-        num_tokens += tokens_per_message
-        for key, value in message.items():
-            num_tokens += len(encoding.encode(value))
-            if key == "name":
-                num_tokens += tokens_per_name
-    num_tokens += 3  # every reply is primed with <|start|>assistant<|message|>
-    return num_tokens
-
-
-# Adicionar insights ao contexto do chatbot
-for insight in insights:
-    conversation.append({
-        "role": "system",
-        "content": f"Video section from {insight['start']} to {insight['end']}:\n{insight['content']}"
-    })
+# Cada mensagem é contada uma vez; as mais antigas saem quando o limite é atingido
+conversation = ConversationBuffer(system_message, token_limit=token_limit, max_response_tokens=max_response_tokens)
+
+# "retrieval": a cada pergunta só as seções mais relevantes do vídeo vão no prompt
+# "full": todas as seções entram no contexto (as mais antigas saem quando o limite é atingido)
+chat_mode = os.getenv("VIDEO_CHAT_MODE", "retrieval")
+top_k_sections = int(os.getenv("VIDEO_CHAT_TOP_K", "4"))
+# Tokens das seções recuperadas por pergunta, independente da duração do vídeo
+context_token_budget = int(os.getenv("VIDEO_CHAT_CONTEXT_TOKENS", "1500"))
+embedding_model = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
+
+def embed_texts(texts):
+    response = client.embeddings.create(model=embedding_model, input=texts)
+    return [item.embedding for item in response.data]
+
+if chat_mode == "full":
+    # Adicionar insights ao contexto do chatbot
+    for insight in insights:
+        conversation.append({"role": "system", "content": section_text(insight)})
+    section_index = None
+else:
+    # Embeddings das seções calculados uma vez por vídeo (salvos em VIDEO_SECTION_INDEX_DIR)
+    section_index = get_section_index(insights, embed_fn=embed_texts, model_name=embedding_model)
 
 
 ## Teste de bibs
@@ -121,15 +95,16 @@ print(reader)
 while True:
     user_input = input("Q:")      
     conversation.append({"role": "user", "content": user_input})
-    conv_history_tokens = num_tokens_from_messages(conversation)
 
-    while conv_history_tokens + max_response_tokens >= token_limit:
-        del conversation[1] 
-        conv_history_tokens = num_tokens_from_messages(conversation)
+    context = []
+    if section_index is not None:
+        sections = section_index.context_message(user_input, top_k=top_k_sections, max_tokens=context_token_budget,
+                                                 count=conversation.count)
+        context = [sections] if sections is not None else []
 
     response = client.chat.completions.create(
         model="gpt-35-turbo", # model = "deployment_name".
-        messages=conversation,
+        messages=conversation.messages(context),
         temperature=0.7,
         max_tokens=max_response_tokens
     )
@@ -1,3 +1,4 @@
 from .video_indexer_client import VideoIndexerClient
+from .async_video_indexer_client import AsyncVideoIndexerClient, index_videos
 from .account_token_provider import get_arm_access_token, get_account_access_token_async
 from .Consts import Consts
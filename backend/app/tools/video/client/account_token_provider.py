@@ -1,7 +1,26 @@
+import os
+
 import requests
 from azure.identity import DefaultAzureCredential
 
 from app.tools.video.client.Consts import Consts
+from app.tools.video.client.http_session import get_session
+from app.tools.video.client.token_cache import credential_id
+
+# Building the credential chain is slow; one instance serves the whole process
+_credential = None
+
+
+def arm_credential_id(consts:Consts) -> str:
+    '''
+    Identifies the credential `get_arm_access_token` signs in with (the tenant and client or user that
+    DefaultAzureCredential reads from the environment) and the subscription, as a hash for the token cache keys
+
+    :param consts: Consts object
+    :return: Hash of the tenant, client id, user name and subscription
+    '''
+    return credential_id(os.getenv("AZURE_TENANT_ID"), os.getenv("AZURE_CLIENT_ID"), os.getenv("AZURE_USERNAME"),
+                         consts.SubscriptionId)
 
 
 def get_arm_access_token(consts:Consts) -> str:
@@ -12,7 +31,10 @@ def get_arm_access_token(consts:Consts) -> str:
     :param consts: Consts object
     :return: Access token for the Azure Resource Manager
     '''
-    credential = DefaultAzureCredential()
+    global _credential
+    if _credential is None:
+        _credential = DefaultAzureCredential()
+    credential = _credential
     scope = f"{consts.AzureResourceManager}/.default" 
     token = credential.get_token(scope)
     return token.token
@@ -47,7 +69,7 @@ def get_account_access_token_async(consts, arm_access_token, permission_type='Co
     if video_id is not None:
         params['videoId'] = video_id
 
-    response = requests.post(url, json=params, headers=headers)
+    response = get_session().post(url, json=params, headers=headers)
     
     # check if the response is valid
     response.raise_for_status()
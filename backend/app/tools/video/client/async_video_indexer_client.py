@@ -0,0 +1,154 @@
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.tools.video.client.Consts import Consts
+from app.tools.video.client.video_indexer_client import VideoIndexerClient
+from app.tools.video.progress_store import report_progress
+
+from app.tools.video.client.managers.async_video_upload import AsyncVideoUploadManager
+from app.tools.video.client.managers.async_video_content import AsyncVideoContentManager
+from app.tools.video.client.managers.async_video_summary import AsyncVideoSummaryManager
+
+MAX_CONNECTIONS = int(os.getenv("VI_HTTP_POOL_SIZE", "20"))
+
+
+class AsyncVideoIndexerClient:
+    '''
+    asyncio version of VideoIndexerClient. All the calls of the managers share one `httpx.AsyncClient`
+    (`self.http`), so a single event loop can upload, poll and fetch the prompt content of many
+    videos at once over a few kept-alive connections.
+
+    Tokens and account details come from the same shared token cache as the sync client; the rare
+    refreshes run in a worker thread so they never block the loop.
+
+        async with AsyncVideoIndexerClient() as client:
+            await client.authenticate_async(consts)
+            video_id = await client.upload_video(video_name, path)
+    '''
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, report_progress: bool = True):
+        self.consts = None
+        self._auth = VideoIndexerClient()
+        self._report_progress = report_progress
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+
+        self.upload_manager = AsyncVideoUploadManager(self)
+        self.content_manager = AsyncVideoContentManager(self)
+        self.summary_manager = AsyncVideoSummaryManager(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    # Authentication
+    async def authenticate_async(self, consts:Consts) -> None:
+        self.consts = consts
+        await asyncio.to_thread(self._auth.authenticate_async, consts)
+
+    async def get_account_async(self) -> dict:
+        '''
+        Get information about the account
+        '''
+        return await asyncio.to_thread(self._auth.get_account_async)
+
+    async def access_token(self) -> str:
+        return await asyncio.to_thread(lambda: self._auth.vi_access_token)
+
+    async def account_url(self) -> str:
+        account = await self.get_account_async()
+        return f'{self.consts.ApiEndpoint}/{account["location"]}/Accounts/{account["properties"]["accountId"]}'
+
+    async def report_progress(self, video_name: str, progress, video_id: Optional[str] = None) -> None:
+        '''
+        Publishes the indexing progress (see ProgressStore), like the sync managers do. Failures are only printed
+        '''
+        if not self._report_progress:
+            return
+        await asyncio.to_thread(report_progress, video_name, progress, video_id)
+
+    async def upload_video(self, video_name: Optional[str] = None, video_path_or_url: str = '', wait_for_index: bool = False, video_description: str = '',
+                           privacy: str = 'Private', partition='', language: str = 'auto', op: Optional[str] = None, video_id: Optional[str] = None) -> str:
+        '''
+        Same as VideoIndexerClient.upload_video: uploads by URL or file path, or waits for the index when op == 'wait'
+        '''
+        if video_path_or_url.startswith("http"):
+            return await self.upload_manager.upload_by_url(
+                video_name=video_name,
+                video_url=video_path_or_url,
+                wait_for_index=wait_for_index,
+                video_description=video_description,
+                privacy=privacy
+            )
+        elif op == 'wait':
+            return await self.upload_manager.wait_for_index(video_id=video_id, video_name=video_name, language=language)
+        else:
+            return await self.upload_manager.upload_by_file(
+                media_path=video_path_or_url,
+                video_name=video_name,
+                wait_for_index=wait_for_index,
+                video_description=video_description,
+                privacy=privacy,
+                partition=partition,
+                language=language
+            )
+
+    async def generate_prompt(self, video_id: str, operation:str='', promptStyle: str = 'Full', timeout_sec:Optional[int]=None) -> Optional[dict]:
+        '''
+        Same as VideoIndexerClient.generate_prompt: 'get_insight' or 'get_prompt_content'
+        '''
+        if operation == 'get_insight':
+            return await self.content_manager.get_raw_insight(video_id=video_id)
+        elif operation == 'get_prompt_content':
+            return await self.content_manager.get_prompt(video_id=video_id, promptStyle=promptStyle, timeout_sec=timeout_sec)
+        else:
+            raise ValueError("Operation parameter passed must be 'get_insight' or 'get_prompt_content'")
+
+    async def list_videos(self) -> dict:
+        url = f'{await self.account_url()}/Videos'
+        response = await self.http.get(url, params={'accessToken': await self.access_token()})
+        response.raise_for_status()
+        return response.json()
+
+    async def video_summary(self, video_id: str, operation: str = '', summary_id: Optional[str] = None, model_name: Optional[str] = "gpt-35-turbo",
+                            sum_len: Optional[str] = "Long", sum_style: Optional[str] = "Neutral") -> Optional[dict]:
+        if operation == 'list':
+            return await self.summary_manager.list_summaries(video_id=video_id, summary_id=summary_id)
+        elif operation == 'create':
+            return await self.summary_manager.create_summary(video_id=video_id, model_name=model_name, sum_len=sum_len, sum_style=sum_style)
+        else:
+            raise ValueError("Operation parameter passed must be 'list' or 'create'")
+
+
+async def index_videos(client: AsyncVideoIndexerClient, videos: List[Dict], concurrency: int = 10) -> List[Dict]:
+    '''
+    Uploads every video, waits for its index and fetches its prompt content, `concurrency` videos at a time
+
+    :param client: An authenticated AsyncVideoIndexerClient
+    :param videos: Dicts with the keyword arguments of `upload_by_file` (media_path, video_name, partition, ...)
+    :param concurrency: Maximum number of videos being processed at the same time
+    :return: One dict per video, in order: {"video_id", "prompt_content"} or {"error"}
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(video):
+        async with semaphore:
+            try:
+                video_id = await client.upload_manager.upload_by_file(**video)
+                await client.upload_manager.wait_for_index(video_id, video.get('video_name') or video_id, video.get('language', 'auto'))
+                prompt_content = await client.generate_prompt(video_id, operation='get_prompt_content')
+                return {"video_id": video_id, "prompt_content": prompt_content}
+            except Exception as e:
+                print(f"Erro durante o processamento de {video.get('media_path')}: {e}")
+                return {"error": str(e)}
+
+    return await asyncio.gather(*(process(video) for video in videos))
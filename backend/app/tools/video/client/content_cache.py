@@ -0,0 +1,173 @@
+import glob
+import gzip
+import json
+import os
+import re
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+CACHE_DIR = os.getenv("VI_CONTENT_CACHE_DIR", "vi_content_cache")
+# Entries younger than this are used without asking Video Indexer; older ones are revalidated
+# (ETag / Last-Modified) or, without validators, downloaded again
+MAX_AGE_SEC = int(os.getenv("VI_CONTENT_CACHE_MAX_AGE", "3600"))
+
+# Kinds of content: "prompt" (PromptContent) and "index" (raw insights)
+KINDS = ("prompt", "index")
+
+
+class CachedContent:
+    '''
+    One cached response: the path of its gzip body and the metadata saved with it
+    '''
+
+    def __init__(self, path: str, meta: Dict[str, Any]):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.meta.get('fetched_at', 0)
+
+    def open(self):
+        '''Binary stream over the decompressed body'''
+        return gzip.open(self.path, 'rb')
+
+    def json(self) -> Any:
+        with self.open() as body:
+            return json.load(body)
+
+
+class ContentCache:
+    '''
+    On-disk cache of the prompt content and raw insights of the videos, one gzip file per
+    (kind, video_id, promptStyle, language) with a small JSON file beside it holding the ETag and
+    Last-Modified of the response
+
+    Prompt content and insights are multi-MB JSON documents that only change when the video is
+    indexed again or the prompt content is regenerated. Within MAX_AGE_SEC they are read from
+    here; after that the client sends the validators (If-None-Match / If-Modified-Since) and a
+    304 answer renews the entry without downloading the body again.
+
+        entry = cache.load('index', video_id, language='English')
+        if entry is not None and cache.is_fresh(entry):
+            return entry.json()
+    '''
+
+    def __init__(self, folder: str = CACHE_DIR, max_age_sec: int = MAX_AGE_SEC):
+        self.folder = folder
+        self.max_age_sec = max_age_sec
+
+    def _base_path(self, kind: str, video_id: str, variant: Mapping[str, Optional[str]]) -> str:
+        if kind not in KINDS:
+            raise ValueError(f"Unknown content kind {kind!r}, expected one of {KINDS}")
+        parts = [video_id] + [str(variant[name] or '') for name in sorted(variant)]
+        name = '-'.join(re.sub(r'[^A-Za-z0-9_.]', '_', part) for part in parts)
+        return os.path.join(self.folder, kind, name)
+
+    def load(self, kind: str, video_id: str, **variant) -> Optional[CachedContent]:
+        '''
+        :param kind: "prompt" or "index"
+        :param video_id: The video ID
+        :param variant: What else the content depends on, e.g. promptStyle and language
+        :return: The cached entry, or None
+        '''
+        base = self._base_path(kind, video_id, variant)
+        try:
+            with open(base + '.meta.json', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(base + '.json.gz'):
+            return None
+        return CachedContent(base + '.json.gz', meta)
+
+    def is_fresh(self, entry: Optional[CachedContent]) -> bool:
+        return entry is not None and entry.age < self.max_age_sec
+
+    @staticmethod
+    def validators(entry: Optional[CachedContent]) -> Dict[str, str]:
+        '''
+        :return: The conditional request headers for `entry` (empty if it has no validators)
+        '''
+        headers = {}
+        if entry is not None and entry.meta.get('etag'):
+            headers['If-None-Match'] = entry.meta['etag']
+        if entry is not None and entry.meta.get('last_modified'):
+            headers['If-Modified-Since'] = entry.meta['last_modified']
+        return headers
+
+    def save(self, kind: str, video_id: str, body: bytes, headers: Optional[Mapping[str, str]] = None, **variant) -> CachedContent:
+        '''
+        Stores a response body, compressed, with its validators
+
+        :param body: The raw JSON body of the response
+        :param headers: The response headers (ETag and Last-Modified are kept)
+        '''
+        return self.save_stream(kind, video_id, [body], headers, **variant)
+
+    def save_stream(self, kind: str, video_id: str, chunks: Iterable[bytes], headers: Optional[Mapping[str, str]] = None,
+                    **variant) -> CachedContent:
+        '''
+        Same as `save`, for a body read chunk by chunk (e.g. `response.iter_content`), so a multi-MB
+        response never sits whole in memory
+        '''
+        base = self._base_path(kind, video_id, variant)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(base), suffix='.tmp')
+        size = 0
+        # Written to temporary files and renamed, so a reader never sees half an entry
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6) as body:
+                for chunk in chunks:
+                    body.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, base + '.json.gz')
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        headers = headers or {}
+        meta = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+            'size': size,
+        }
+        self._write(base + '.meta.json', json.dumps(meta).encode('utf-8'))
+        return CachedContent(base + '.json.gz', meta)
+
+    def discard(self, entry: CachedContent) -> None:
+        '''Removes one entry, e.g. the index of a video that is still being processed'''
+        for path in (entry.path, entry.path[:-len('.json.gz')] + '.meta.json'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def touch(self, entry: CachedContent) -> None:
+        '''Marks `entry` as just revalidated (the API answered 304 Not Modified)'''
+        entry.meta['fetched_at'] = time.time()
+        self._write(entry.path[:-len('.json.gz')] + '.meta.json', json.dumps(entry.meta).encode('utf-8'))
+
+    def invalidate(self, kind: str, video_id: str) -> None:
+        '''Removes every variant of the `kind` content of a video, e.g. when its prompt content is regenerated'''
+        prefix = self._base_path(kind, video_id, {})
+        for path in glob.glob(glob.escape(prefix) + '*'):
+            name = os.path.basename(path)
+            if name.startswith(os.path.basename(prefix) + '-') or name.startswith(os.path.basename(prefix) + '.'):
+                os.remove(path)
+
+    def _write(self, path: str, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+_content_cache: Optional[ContentCache] = None
+
+
+def get_content_cache() -> ContentCache:
+    global _content_cache
+    if _content_cache is None:
+        _content_cache = ContentCache()
+    return _content_cache
@@ -0,0 +1,29 @@
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Connections kept open to the Video Indexer and ARM endpoints, shared by every client of the process
+POOL_SIZE = int(os.getenv("VI_HTTP_POOL_SIZE", "20"))
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    '''
+    The process-wide `requests.Session` used by the sync VideoIndexerClient and its managers, so
+    consecutive calls reuse the same TLS connections instead of opening one per request
+    '''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
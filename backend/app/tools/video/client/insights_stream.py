@@ -0,0 +1,132 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator
+
+try:
+    import ijson
+except ImportError:  # optional: without it the whole document is parsed
+    ijson = None
+
+# Fields that can be read from a video index, by their path in the JSON ("item" is every element of a list)
+INDEX_FIELDS = {
+    'state': 'state',
+    'progress': 'videos.item.processingProgress',
+    'duration': 'summarizedInsights.duration.seconds',
+    'transcript': 'videos.item.insights.transcript.item',
+    'labels': 'videos.item.insights.labels.item',
+    'keywords': 'videos.item.insights.keywords.item',
+    'topics': 'videos.item.insights.topics.item',
+}
+# Fields that collect every match; the others keep the first one
+LIST_FIELDS = {'transcript', 'labels', 'keywords', 'topics'}
+
+
+def extract_index_fields(stream, fields: Iterable[str] = ('state', 'progress')) -> Dict[str, Any]:
+    '''
+    Reads only some fields of a video index (the JSON of the Get Video Index API)
+
+    With `ijson` installed the document is parsed incrementally from `stream`: only the requested
+    fields are built in memory, and reading stops as soon as every requested field that is not a
+    list has been found (`state` comes first in the document, so a state check reads a few bytes of
+    a multi-MB index). Without it the whole document is loaded with `json.load`.
+
+    :param stream: Binary file-like object with the JSON, e.g. `CachedContent.open()` or a raw HTTP response
+    :param fields: Names from INDEX_FIELDS
+    :return: {field: value}; list fields are lists, missing scalar fields are None
+    '''
+    fields = list(fields)
+    unknown = [field for field in fields if field not in INDEX_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown index fields {unknown}, expected some of {sorted(INDEX_FIELDS)}")
+    result = {field: [] if field in LIST_FIELDS else None for field in fields}
+
+    if ijson is None:
+        index = json.load(stream)
+        for field in fields:
+            values = list(_walk(index, INDEX_FIELDS[field].split('.')))
+            result[field] = values if field in LIST_FIELDS else next(iter(values), None)
+        return result
+
+    targets = {INDEX_FIELDS[field]: field for field in fields}
+    scalars_left = {field for field in fields if field not in LIST_FIELDS}
+    lists_requested = any(field in LIST_FIELDS for field in fields)
+
+    def store(field, value):
+        if field in LIST_FIELDS:
+            result[field].append(value)
+        elif field in scalars_left:
+            result[field] = value
+            scalars_left.discard(field)
+
+    builder, field, depth = None, None, 0
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if depth == 0:
+                    store(field, builder.value)
+                    builder = None
+            continue
+        if prefix not in targets or event in ('map_key', 'end_map', 'end_array'):
+            continue
+        if event in ('start_map', 'start_array'):
+            field, builder, depth = targets[prefix], ijson.ObjectBuilder(), 1
+            builder.event(event, value)
+        else:
+            store(targets[prefix], value)
+        if not scalars_left and not lists_requested:
+            break
+    return result
+
+
+def _walk(value: Any, path: list) -> Iterator[Any]:
+    if not path:
+        yield value
+        return
+    head, rest = path[0], path[1:]
+    if head == 'item':
+        for element in value if isinstance(value, list) else []:
+            yield from _walk(element, rest)
+    elif isinstance(value, dict) and head in value:
+        yield from _walk(value[head], rest)
+
+
+class _AsyncChunkReader:
+    '''
+    Blocking file-like view of an async byte iterator, for a worker thread: every read waits for the
+    next chunks on the event loop that owns the iterator
+    '''
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks
+        self._loop = loop
+        self._buffer = bytearray()
+        self._done = False
+
+    async def _next(self) -> bytes:
+        return await self._chunks.__anext__()
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._done and (size is None or size < 0 or len(self._buffer) < size):
+            try:
+                self._buffer += asyncio.run_coroutine_threadsafe(self._next(), self._loop).result()
+            except StopAsyncIteration:
+                self._done = True
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+async def extract_index_fields_async(chunks: AsyncIterator[bytes], fields: Iterable[str] = ('state', 'progress')) -> Dict[str, Any]:
+    '''
+    `extract_index_fields` for an async body, e.g. `response.aiter_bytes()` of an httpx stream. The
+    parsing runs in a worker thread and pulls the chunks as it needs them, so it stops reading as early
+    and keeps as little in memory as the synchronous version
+    '''
+    reader = _AsyncChunkReader(chunks, asyncio.get_running_loop())
+    return await asyncio.to_thread(extract_index_fields, reader, fields)
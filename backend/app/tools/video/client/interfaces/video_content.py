@@ -3,14 +3,34 @@ from abc import ABC, abstractmethod
 
 class VideoContentManagerInterface(ABC):
     @abstractmethod
-    def get_raw_insight(self, video_id: str) -> dict:
+    def get_raw_insight(self, video_id: str, language: Optional[str] = None, refresh: bool = False) -> dict:
         """
         Description
         """
         ...
 
     @abstractmethod
-    def get_prompt(self, video_id: str, promptStyle: str = 'Full', timeout_sec:Optional[int]=None, check_alreay_exists=True) -> Optional[dict]:
+    def get_prompt(self, video_id: str, promptStyle: str = 'Full', timeout_sec:Optional[int]=None, check_alreay_exists=True,
+                   language: Optional[str] = None) -> Optional[dict]:
+        """
+        Description
+        """
+        ...
+
+class AsyncVideoContentManagerInterface(ABC):
+    """
+    The same operations as VideoContentManagerInterface, as coroutines (AsyncVideoIndexerClient).
+    """
+    @abstractmethod
+    async def get_raw_insight(self, video_id: str, language: Optional[str] = None, refresh: bool = False) -> dict:
+        """
+        Description
+        """
+        ...
+
+    @abstractmethod
+    async def get_prompt(self, video_id: str, promptStyle: str = 'Full', timeout_sec:Optional[int]=None, check_alreay_exists=True,
+                         language: Optional[str] = None) -> Optional[dict]:
         """
         Description
         """
@@ -7,4 +7,15 @@ class VideoSummaryManagerInterface(ABC):
         ...
     @abstractmethod
     def create_summary(self, video_id: str, model_name: str = "gpt-35-turbo", sum_len: str = "Long", sum_style: str = "Neutral") -> Optional[dict]:
+        ...
+
+class AsyncVideoSummaryManagerInterface(ABC):
+    """
+    The same operations as VideoSummaryManagerInterface, as coroutines (AsyncVideoIndexerClient).
+    """
+    @abstractmethod
+    async def list_summaries(self, video_id: str, summary_id: Optional[str] = None) -> Optional[dict]:
+        ...
+    @abstractmethod
+    async def create_summary(self, video_id: str, model_name: str = "gpt-35-turbo", sum_len: str = "Long", sum_style: str = "Neutral") -> Optional[dict]:
         ...
\ No newline at end of file
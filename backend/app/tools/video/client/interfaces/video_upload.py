@@ -12,7 +12,8 @@ class VideoUploadManagerInterface(ABC):
 
     @abstractmethod
     def upload_by_file(self, media_path:str, video_name:Optional[str]=None,
-                        wait_for_index:bool=False, video_description:str='', privacy='Private', partition='', language:str = 'auto') -> str:
+                        wait_for_index:bool=False, video_description:str='', privacy='Private', partition='', language:str = 'auto',
+                        external_id:Optional[str]=None) -> str:
         """
         Uploads a local file and starts the video indexing process.
         """
@@ -20,6 +21,34 @@ class VideoUploadManagerInterface(ABC):
 
     @abstractmethod
     def wait_for_index(self, video_id:str, video_name:str, language:str='auto', timeout_sec:Optional[int]=None) -> None:
+        """
+        Waits for the video to finish the indexing process.
+        """
+        ...
+
+class AsyncVideoUploadManagerInterface(ABC):
+    """
+    The same operations as VideoUploadManagerInterface, as coroutines (AsyncVideoIndexerClient).
+    """
+    @abstractmethod
+    async def upload_by_url(self, video_name: str, video_url: str,
+                            wait_for_index: bool = False, video_description: str = '', privacy: str = 'Private') -> str:
+        """
+        Uploads a video by URL and starts the video indexing process.
+        """
+        ...
+
+    @abstractmethod
+    async def upload_by_file(self, media_path:str, video_name:Optional[str]=None,
+                             wait_for_index:bool=False, video_description:str='', privacy='Private', partition='', language:str = 'auto',
+                             external_id:Optional[str]=None) -> str:
+        """
+        Uploads a local file and starts the video indexing process.
+        """
+        ...
+
+    @abstractmethod
+    async def wait_for_index(self, video_id:str, video_name:str, language:str='auto', timeout_sec:Optional[int]=None) -> None:
         """
         Waits for the video to finish the indexing process.
         """
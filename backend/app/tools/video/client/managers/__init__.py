@@ -1,3 +1,6 @@
 from .video_content import VideoContentManager
 from .video_upload import VideoUploadManager
 from .video_summary import VideoSummaryManager
+from .async_video_content import AsyncVideoContentManager
+from .async_video_upload import AsyncVideoUploadManager
+from .async_video_summary import AsyncVideoSummaryManager
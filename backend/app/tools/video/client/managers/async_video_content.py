@@ -0,0 +1,133 @@
+from app.tools.video.client.interfaces.video_content import AsyncVideoContentManagerInterface
+from app.tools.video.client.content_cache import get_content_cache
+from typing import Optional
+import logging, time, asyncio
+
+logger = logging.getLogger(__name__)
+
+class AsyncVideoContentManager(AsyncVideoContentManagerInterface):
+    '''
+    asyncio version of VideoContentManager, every request goes through the pooled `client.http`
+    '''
+    def __init__(self, client):
+        self.client = client
+
+    async def get_raw_insight(self, video_id: str, language: Optional[str] = None, refresh: bool = False) -> dict:
+        '''
+        Gets the video index. Calls the index API
+        (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Search-Videos)
+        The index of a processed video is kept in the local content cache (see ContentCache).
+
+        :param video_id: The video ID
+        :param language: The language to translate video insights
+        :param refresh: Ignore the local cache
+        '''
+        cache = get_content_cache()
+        entry = None if refresh else await asyncio.to_thread(cache.load, 'index', video_id, language=language)
+        if cache.is_fresh(entry):
+            return await asyncio.to_thread(entry.json)
+
+        url = f'{await self.client.account_url()}/Videos/{video_id}/Index'
+
+        params = {
+            'accessToken': await self.client.access_token()
+        }
+        if language:
+            params['language'] = language
+
+        response = await self.client.http.get(url, params=params, headers=cache.validators(entry))
+        if response.status_code == 304 and entry is not None:
+            await asyncio.to_thread(cache.touch, entry)
+            return await asyncio.to_thread(entry.json)
+
+        response.raise_for_status()
+
+        search_result = response.json()
+        # Only a finished index stops changing
+        if search_result.get('state') == 'Processed':
+            await asyncio.to_thread(cache.save, 'index', video_id, response.content, response.headers, language=language)
+        return search_result
+
+    async def get_prompt(self, video_id: str, promptStyle: str = 'Full', timeout_sec:Optional[int]=None, check_alreay_exists=True,
+                         poll_interval_sec:float=10, language: Optional[str] = None) -> Optional[dict]:
+        '''
+        Gets the prompt content for the video, waits until the prompt content is ready.
+        If the prompt content is not ready within the timeout, it will return None.
+
+        :param video_id: The video ID
+        :param promptStyle: 'Full' or 'Summarized'
+        :param timeout_sec: The timeout in seconds
+        :param check_alreay_exists: If True, checks if the prompt content already exists
+        :param poll_interval_sec: Seconds between two checks
+        :param language: The language of the video, part of the cache key
+        :return: The prompt content for the video, otherwise None
+        '''
+        if check_alreay_exists:
+            prompt_content = await self.__get_prompt_content(video_id, raise_on_not_found=False, promptStyle=promptStyle, language=language)
+            if prompt_content is not None:
+                logger.info("Prompt content already exists for video %s", video_id)
+                return prompt_content
+
+        url = f'{await self.client.account_url()}/Videos/{video_id}/PromptContent'
+
+        params = {
+            'accessToken': await self.client.access_token(),
+            'modelName': 'GPT3_5Turbo',
+            'promptStyle': promptStyle
+        }
+
+        logger.info("Prompt content generation for %s started", video_id)
+        response = await self.client.http.post(url, params=params, headers={"Content-Type": "application/json"})
+
+        response.raise_for_status()
+        # The cached prompt content is about to be replaced
+        await asyncio.to_thread(get_content_cache().invalidate, 'prompt', video_id)
+
+        start_time = time.time()
+        while True:
+            prompt_content = await self.__get_prompt_content(video_id, raise_on_not_found=False, promptStyle=promptStyle, language=language)
+            if prompt_content is not None:
+                return prompt_content
+
+            if timeout_sec is not None and time.time() - start_time > timeout_sec:
+                logger.warning("Timeout of %s seconds reached waiting for the prompt content of %s", timeout_sec, video_id)
+                return None
+
+            logger.info("Prompt content of %s is not ready yet, checking again in %s seconds", video_id, poll_interval_sec)
+            await asyncio.sleep(poll_interval_sec)
+
+    async def __get_prompt_content(self, video_id:str, raise_on_not_found:bool=True, promptStyle:str='Full',
+                                   language: Optional[str] = None) -> Optional[dict]:
+        '''
+        Calls the promptContent API.
+        Raises an exception or returns None if the prompt content is not found according to the `raise_on_not_found`.
+        Prompt content that is ready is kept in the local content cache (see ContentCache).
+
+        :param video_id: The video ID
+        :param raise_on_not_found: If True, raises an exception if the prompt content is not found.
+        :param promptStyle: Part of the cache key
+        :param language: Part of the cache key
+        :return: The prompt content for the video, otherwise None
+        '''
+        cache = get_content_cache()
+        entry = await asyncio.to_thread(cache.load, 'prompt', video_id, promptStyle=promptStyle, language=language)
+        if cache.is_fresh(entry):
+            return await asyncio.to_thread(entry.json)
+
+        url = f'{await self.client.account_url()}/Videos/{video_id}/PromptContent'
+
+        params = {
+            'accessToken': await self.client.access_token()
+        }
+
+        response = await self.client.http.get(url, params=params, headers=cache.validators(entry))
+        if response.status_code == 304 and entry is not None:
+            await asyncio.to_thread(cache.touch, entry)
+            return await asyncio.to_thread(entry.json)
+        if not raise_on_not_found and response.status_code == 404:
+            return None
+
+        response.raise_for_status()
+
+        await asyncio.to_thread(cache.save, 'prompt', video_id, response.content, response.headers, promptStyle=promptStyle, language=language)
+        return response.json()
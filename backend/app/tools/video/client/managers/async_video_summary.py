@@ -0,0 +1,61 @@
+from app.tools.video.client.interfaces.video_summary import AsyncVideoSummaryManagerInterface
+from app.tools.video.client.managers.video_summary import validate_summary_parameters
+from typing import Optional
+import httpx
+
+class AsyncVideoSummaryManager(AsyncVideoSummaryManagerInterface):
+    '''
+    asyncio version of VideoSummaryManager, every request goes through the pooled `client.http`
+    '''
+    def __init__(self, client):
+        self.client = client
+
+    async def list_summaries(self, video_id: str, summary_id: Optional[str] = None) -> Optional[dict]:
+        params = {'accessToken': await self.client.access_token()}
+        if summary_id is None:
+            sum_id = ''
+            params.update({'pageNumber': "0", 'pageSize': "20"})
+        else:
+            sum_id = f'/{summary_id}'
+
+        url = f'{await self.client.account_url()}/Videos/{video_id}/Summaries/Textual{sum_id}'
+
+        try:
+            response = await self.client.http.get(url, params=params)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            print(f"HTTP error occurred: {e}")
+            raise
+        except httpx.HTTPError as e:
+            print(f"Error occurred: {e}")
+            raise
+
+    async def create_summary(self, video_id: str, model_name: str = "gpt-35-turbo", sum_len: str = "Long", sum_style: str = "Neutral") -> Optional[dict]:
+        """
+        Cria um resumo textual para um vídeo, veja `VideoSummaryManager.create_summary`.
+
+        :raises ValueError: Se os valores de sum_len, sum_style ou model_name forem inválidos.
+        :raises HTTPStatusError: Se a solicitação HTTP falhar.
+        """
+        validate_summary_parameters(sum_len, sum_style, model_name)
+
+        url = f'{await self.client.account_url()}/Videos/{video_id}/Summaries/Textual'
+
+        params = {
+            'accessToken': await self.client.access_token(),
+            'deploymentName': model_name,
+            'length': sum_len,
+            'style': sum_style
+        }
+
+        try:
+            response = await self.client.http.post(url, params=params)
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            print(f"HTTP error occurred: {e}")
+            raise
+        except httpx.HTTPError as e:
+            print(f"Error occurred: {e}")
+            raise
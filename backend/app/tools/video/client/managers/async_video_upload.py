@@ -0,0 +1,202 @@
+from app.tools.video.client.interfaces.video_upload import AsyncVideoUploadManagerInterface
+from app.tools.video.client.managers.video_upload import get_file_name_no_extension
+from app.tools.video.client.insights_stream import extract_index_fields_async
+from app.tools.video.client.multipart_stream import MultipartFileStream
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import os, time, asyncio
+
+class AsyncVideoUploadManager(AsyncVideoUploadManagerInterface):
+    '''
+    asyncio version of VideoUploadManager, every request goes through the pooled `client.http`
+    '''
+    def __init__(self, client):
+        self.client = client
+
+    async def upload_by_url(self, video_name:str, video_url:str,
+                        wait_for_index:bool=False, video_description:str='', privacy='Private') -> str:
+        '''
+        Uploads a video and starts the video index.
+        Calls the uploadVideo API (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Upload-Video)
+
+        :param video_name: The name of the video
+        :param video_url: Link to publicly accessed video URL
+        :param wait_for_index: Should this method wait for index operation to complete
+        :param video_description: The description of the video
+        :param privacy: The privacy mode of the video
+        :return: Video Id of the video being indexed, otherwise throws exception
+        '''
+        parsed_url = urlparse(video_url)
+        if not parsed_url.scheme or not parsed_url.netloc:
+            raise Exception(f'Invalid video URL: {video_url}')
+
+        url = f'{await self.client.account_url()}/Videos'
+
+        params = {
+            'accessToken': await self.client.access_token(),
+            'name': video_name,
+            'description': video_description,
+            'privacy': privacy,
+            'videoUrl': video_url
+        }
+
+        response = await self.client.http.post(url, params=params)
+
+        response.raise_for_status()
+
+        video_id = response.json().get('id')
+        print(f'Video ID {video_id} was uploaded successfully')
+
+        if wait_for_index:
+            await self.wait_for_index(video_id, video_name)
+
+        return video_id
+
+    async def upload_by_file(self, media_path:str, video_name:Optional[str]=None,
+                        wait_for_index:bool=False, video_description:str='', privacy='Private', partition='', language:str = 'auto',
+                        external_id:Optional[str]=None) -> str:
+        '''
+        Uploads a local file and starts the video index.
+        Calls the uploadVideo API (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Upload-Video)
+
+        :param media_path: The path to the local file
+        :param video_name: The name of the video, if not provided, the file name will be used
+        :param video_description: The description of the video
+        :param privacy: The privacy mode of the video
+        :param partition: The partition of the video
+        :param external_id: Stored with the video, so it can be found again with `find_video_by_external_id`
+        :param language: The language of the video
+        :return: Video Id of the video being indexed, otherwise throws excpetion
+        '''
+        if video_name is None:
+            video_name = get_file_name_no_extension(media_path)
+
+        if not os.path.exists(media_path):
+            raise Exception(f'Could not find the local file {media_path}')
+
+        url = f'{await self.client.account_url()}/Videos'
+
+        params = {
+            'name': video_name[:80],
+            'description': video_description,
+            'privacy': privacy,
+            'partition': partition,
+            'language': language,
+            **({'externalId': external_id} if external_id else {}),
+            'accessToken': await self.client.access_token(),
+        }
+
+        print(f'Uploading {media_path} using multipart/form-data post request...')
+
+        # Streamed from disk in worker threads: `files=` would read the whole file on the event loop
+        with MultipartFileStream(media_path) as body:
+            response = await self.client.http.post(url, params=params, content=body.aiter(),
+                                                   headers={'Content-Type': body.content_type, 'Content-Length': str(body.len)})
+
+        if response.is_error:
+            await self.client.report_progress(video_name, "Failed")
+        response.raise_for_status()
+
+        video_id = response.json().get('id')
+
+        if wait_for_index:
+            await self.wait_for_index(video_id, video_name, language)
+
+        return video_id
+
+    async def wait_for_index(self, video_id:str, video_name:str, language:str='auto', timeout_sec:Optional[int]=None,
+                             poll_interval_sec:float=5) -> None:
+        '''
+        Checks the indexing state every `poll_interval_sec` seconds until it is 'Processed' or 'Failed',
+        with the lightweight `get_video_state`. Other videos keep being served by the event loop while this one waits.
+
+        :param video_id: The video ID to wait for
+        :param video_name: The name used in the progress reports
+        :param language: Kept for compatibility, the state does not depend on it
+        :param timeout_sec: The timeout in seconds
+        :param poll_interval_sec: Seconds between two checks
+        '''
+        print(f'Checking if video {video_id} has finished indexing...')
+        start_time = time.time()
+        while True:
+            video_result = await self.get_video_state(video_id)
+            video_state = video_result.get('state')
+            progress = video_result.get('processingProgress')
+
+            if video_state == 'Processed':
+                await self.client.report_progress(video_name, "100%", video_id)
+                print(f'The video index has completed for video ID {video_id}.')
+                break
+            elif video_state == 'Failed':
+                await self.client.report_progress(video_name, "Failed", video_id)
+                print(f"The video index failed for video ID {video_id}.")
+                break
+
+            await self.client.report_progress(video_name, progress, video_id)
+            print(f'The video index state is {video_state} {progress}')
+
+            if timeout_sec is not None and time.time() - start_time > timeout_sec:
+                print(f'Timeout of {timeout_sec} seconds reached. Exiting...')
+                break
+
+            await asyncio.sleep(poll_interval_sec)
+
+    async def is_video_processed(self, video_id:str) -> bool:
+        return (await self.get_video_state(video_id)).get('state') == 'Processed'
+
+    async def get_videos_state(self, video_ids: List[str]) -> Dict[str, dict]:
+        '''
+        Gets the indexing state of many videos with one call to the Search Videos API
+        (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Search-Videos)
+
+        :param video_ids: The video IDs, at most a few dozen per call (they go in the query string)
+        :return: {video_id: {"state": ..., "processingProgress": ...}} for the videos found
+        '''
+        url = f'{await self.client.account_url()}/Videos/Search'
+        params = [('accessToken', await self.client.access_token()), ('pageSize', len(video_ids))]
+        params += [('id', video_id) for video_id in video_ids]
+
+        response = await self.client.http.get(url, params=params)
+        response.raise_for_status()
+
+        return {
+            video['id']: {'state': video.get('state'), 'processingProgress': video.get('processingProgress')}
+            for video in response.json().get('results', [])
+        }
+
+    async def get_video_state(self, video_id: str) -> dict:
+        '''
+        Same as VideoUploadManager.get_video_state: Search Videos first, the video index only for a
+        video that search does not return yet
+
+        :return: {"state": ..., "processingProgress": ...}
+        '''
+        state = (await self.get_videos_state([video_id])).get(video_id)
+        if state is not None:
+            return state
+
+        url = f'{await self.client.account_url()}/Videos/{video_id}/Index'
+        params = {
+            'accessToken': await self.client.access_token(),
+        }
+        # Streamed: only the first bytes of a multi-MB index are read (see extract_index_fields)
+        async with self.client.http.stream('GET', url, params=params) as response:
+            response.raise_for_status()
+            fields = await extract_index_fields_async(response.aiter_bytes(), ('state', 'progress'))
+        return {'state': fields['state'], 'processingProgress': fields['progress']}
+
+    async def find_video_by_external_id(self, external_id: str) -> Optional[str]:
+        '''
+        :param external_id: The external ID given to `upload_by_file`
+        :return: The ID of the video uploaded with this external ID, or None
+        '''
+        url = f'{await self.client.account_url()}/Videos/Search'
+        params = {
+            'accessToken': await self.client.access_token(),
+            'externalId': external_id,
+        }
+        response = await self.client.http.get(url, params=params)
+        response.raise_for_status()
+
+        results = response.json().get('results', [])
+        return results[0]['id'] if results else None
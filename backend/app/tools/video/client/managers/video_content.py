@@ -1,20 +1,46 @@
 from app.tools.video.client.interfaces.video_content import VideoContentManagerInterface
-from typing import Optional
-import time, requests
+from app.tools.video.client.http_session import get_session
+from app.tools.video.client.content_cache import get_content_cache
+from app.tools.video.client.insights_stream import extract_index_fields
+from typing import Any, Dict, Iterable, Optional
+import logging, time, requests
+
+logger = logging.getLogger(__name__)
+
+
+def not_modified(response, entry) -> bool:
+    '''
+    True if the API answered 304 Not Modified to the validators of the cached `entry`. A 304 without a
+    cached entry (no validators were sent) has no body to use and raises, instead of being cached empty.
+    '''
+    if response.status_code != 304:
+        return False
+    if entry is None:
+        raise requests.HTTPError(f'304 Not Modified without a cached copy: {response.url}', response=response)
+    return True
 
 class VideoContentManager(VideoContentManagerInterface):
     def __init__(self, client):
         self.client = client
         
-    def get_raw_insight(self, video_id: str) -> dict:
+    def get_raw_insight(self, video_id: str, language: Optional[str] = None, refresh: bool = False) -> dict:
         '''
         Gets the video index. Calls the index API
         (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Search-Videos)
-        Prints the video metadata, otherwise throws an exception
+        Prints the video metadata, otherwise throws an exception.
+        The index of a processed video is kept in the local content cache (see ContentCache).
 
         :param video_id: The video ID
+        :param language: The language to translate video insights
+        :param refresh: Ignore the local cache
         '''
-        print(f"Getting Raw insights for video with ID {video_id}")
+        logger.debug("Getting raw insights of video %s", video_id)
+
+        cache = get_content_cache()
+        entry = None if refresh else cache.load('index', video_id, language=language)
+        if cache.is_fresh(entry):
+            logger.debug("Raw insights of %s read from the local cache", video_id)
+            return entry.json()
 
         url =   f'{self.client.consts.ApiEndpoint}/{self.client.account["location"]}/Accounts/{self.client.account["properties"]["accountId"]}/' + \
                 f'Videos/{video_id}/Index'
@@ -22,35 +48,108 @@ class VideoContentManager(VideoContentManagerInterface):
         params = {
             'accessToken': self.client.vi_access_token
         }
+        if language:
+            params['language'] = language
 
-        response = requests.get(url, params=params)
+        response = get_session().get(url, params=params, headers=cache.validators(entry))
+        if not_modified(response, entry):
+            cache.touch(entry)
+            return entry.json()
 
         response.raise_for_status()
 
         search_result = response.json()
-        print(f'Here are the search results: \n{search_result}')
+        # Only a finished index stops changing
+        if search_result.get('state') == 'Processed':
+            cache.save('index', video_id, response.content, response.headers, language=language)
+        # The index of a long video is tens of MB, only a summary is logged
+        logger.info("Raw insights of %s: state %s, %d KB", video_id, search_result.get('state'), len(response.content) // 1024)
         return search_result
+
+    def get_insight_fields(self, video_id: str, fields: Iterable[str] = ('state', 'progress', 'transcript', 'labels'),
+                           language: Optional[str] = None, refresh: bool = False) -> Dict[str, Any]:
+        '''
+        Reads only some fields of the video index (see `insights_stream.INDEX_FIELDS`). The index is
+        streamed to the local content cache and parsed incrementally from there, so memory use does not
+        grow with the size of the index (with `ijson` installed).
+
+        :param video_id: The video ID
+        :param fields: The fields to read, e.g. ('state', 'progress') or ('transcript',)
+        :param language: The language to translate video insights
+        :param refresh: Ignore the local cache
+        :return: {field: value}
+        '''
+        cache = get_content_cache()
+        entry = None if refresh else cache.load('index', video_id, language=language)
+        if not cache.is_fresh(entry):
+            url =   f'{self.client.consts.ApiEndpoint}/{self.client.account["location"]}/Accounts/{self.client.account["properties"]["accountId"]}/' + \
+                    f'Videos/{video_id}/Index'
+            params = {
+                'accessToken': self.client.vi_access_token
+            }
+            if language:
+                params['language'] = language
+
+            with get_session().get(url, params=params, headers=cache.validators(entry), stream=True) as response:
+                if not_modified(response, entry):
+                    cache.touch(entry)
+                else:
+                    response.raise_for_status()
+                    entry = cache.save_stream('index', video_id, response.iter_content(64 * 1024), response.headers, language=language)
+
+        with entry.open() as body:
+            values = extract_index_fields(body, set(fields) | {'state'})
+        # Only a finished index stops changing
+        if values['state'] != 'Processed':
+            cache.discard(entry)
+        return {field: values[field] for field in fields}
     
-    def get_prompt(self, video_id: str, promptStyle: str = 'Full', timeout_sec:Optional[int]=None, check_alreay_exists=True) -> Optional[dict]:
+    def get_prompt(self, video_id: str, promptStyle: str = 'Full', timeout_sec:Optional[int]=None, check_alreay_exists=True,
+                   language: Optional[str] = None) -> Optional[dict]:
         '''
         Gets the prompt content for the video, waits until the prompt content is ready.
         If the prompt content is not ready within the timeout, it will return None.
 
         :param video_id: The video ID
+        :param promptStyle: 'Full' or 'Summarized'
         :param timeout_sec: The timeout in seconds
-        :param check_alreay_exists: If True, checks if the prompt content already exists
+        :param check_alreay_exists: If True, checks if the prompt content already exists (in the local cache first)
+        :param language: The language of the video, part of the cache key
         :return: The prompt content for the video, otherwise None
         '''
 
         if check_alreay_exists:
-            prompt_content = self.__get_prompt_content(video_id, raise_on_not_found=False)
+            prompt_content = self.__get_prompt_content(video_id, raise_on_not_found=False, promptStyle=promptStyle, language=language)
             if prompt_content is not None:
-                print(f'Prompt content already exists for video ID {video_id}.')
+                logger.info("Prompt content already exists for video %s", video_id)
                 return prompt_content
 
+        self.request_prompt_content(video_id, promptStyle)
+
+        start_time = time.time()
+        prompt_content = None
+        while prompt_content is None:
+            prompt_content = self.__get_prompt_content(video_id, raise_on_not_found=False, promptStyle=promptStyle, language=language)
+
+            if timeout_sec is not None and time.time() - start_time > timeout_sec:
+                logger.warning("Timeout of %s seconds reached waiting for the prompt content of %s", timeout_sec, video_id)
+                break
+
+            logger.info("Prompt content of %s is not ready yet, checking again in 10 seconds", video_id)
+            time.sleep(10)
+
+        return prompt_content
+    
+    def request_prompt_content(self, video_id: str, promptStyle: str = 'Full') -> None:
+        '''
+        Starts the generation of the prompt content, without waiting for it (see `find_prompt_content`)
+
+        :param video_id: The video ID
+        :param promptStyle: 'Full' or 'Summarized'
+        '''
         """ modelName Allowed values: Llama2 / Phi2 / GPT3_5Turbo / GPT4 """
         url =   f'{self.client.consts.ApiEndpoint}/{self.client.account["location"]}/Accounts/{self.client.account["properties"]["accountId"]}/' + \
-                f'Videos/{video_id}/PromptContent?modelName=GPT3_5Turbo&promptStyle=Full'
+                f'Videos/{video_id}/PromptContent'
 
         headers = {
             "Content-Type": "application/json"
@@ -59,38 +158,44 @@ class VideoContentManager(VideoContentManagerInterface):
         """ promptStyle Allowed values: Full / Summarized """
         params = {
             'accessToken': self.client.vi_access_token,
+            'modelName': 'GPT3_5Turbo',
             'promptStyle': promptStyle
         }
 
-        print(f"Prompt content generation for {video_id=} started...")
-        response = requests.post(url, headers=headers, params=params)
+        logger.info("Prompt content generation for %s started", video_id)
+        response = get_session().post(url, headers=headers, params=params)
 
         response.raise_for_status()
+        # The cached prompt content is about to be replaced
+        get_content_cache().invalidate('prompt', video_id)
 
-        start_time = time.time()
-        prompt_content = None
-        while prompt_content is None:
-            prompt_content = self.__get_prompt_content(video_id, raise_on_not_found=False)
-
-            if timeout_sec is not None and time.time() - start_time > timeout_sec:
-                print(f'Timeout of {timeout_sec} seconds reached. Exiting...')
-                break
-
-            print('Prompt content is not ready yet. Waiting 10 seconds before checking again...')
-            time.sleep(10)
+    def find_prompt_content(self, video_id: str, promptStyle: str = 'Full', language: Optional[str] = None) -> Optional[dict]:
+        '''
+        :param video_id: The video ID
+        :param promptStyle: The style the prompt content was requested with
+        :param language: The language of the video, part of the cache key
+        :return: The prompt content for the video, or None if it is not ready yet
+        '''
+        return self.__get_prompt_content(video_id, raise_on_not_found=False, promptStyle=promptStyle, language=language)
 
-        return prompt_content
-    
-    def __get_prompt_content(self, video_id:str, raise_on_not_found:bool=True) -> Optional[dict]:
+    def __get_prompt_content(self, video_id:str, raise_on_not_found:bool=True, promptStyle:str='Full',
+                             language: Optional[str] = None) -> Optional[dict]:
         '''
         Calls the promptContent API
         Get the prompt content for the video.
         Raises an exception or returns None if the prompt content is not found according to the `raise_on_not_found`.
+        Prompt content that is ready is kept in the local content cache (see ContentCache).
 
         :param video_id: The video ID
         :param raise_on_not_found: If True, raises an exception if the prompt content is not found.
+        :param promptStyle: Part of the cache key
+        :param language: Part of the cache key
         :return: The prompt content for the video, otherwise None
         '''
+        cache = get_content_cache()
+        entry = cache.load('prompt', video_id, promptStyle=promptStyle, language=language)
+        if cache.is_fresh(entry):
+            return entry.json()
 
         url =   f'{self.client.consts.ApiEndpoint}/{self.client.account["location"]}/Accounts/{self.client.account["properties"]["accountId"]}/' + \
                 f'Videos/{video_id}/PromptContent'
@@ -103,10 +208,14 @@ class VideoContentManager(VideoContentManagerInterface):
             'accessToken': self.client.vi_access_token
         }
 
-        response = requests.get(url, params=params)
+        response = get_session().get(url, params=params, headers=cache.validators(entry))
+        if not_modified(response, entry):
+            cache.touch(entry)
+            return entry.json()
         if not raise_on_not_found and response.status_code == 404:
             return None
 
         response.raise_for_status()
 
-        return response.json()
\ No newline at end of file
+        cache.save('prompt', video_id, response.content, response.headers, promptStyle=promptStyle, language=language)
+        return response.json()
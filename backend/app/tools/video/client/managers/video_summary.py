@@ -1,4 +1,5 @@
 from app.tools.video.client.interfaces.video_summary import VideoSummaryManagerInterface
+from app.tools.video.client.http_session import get_session
 from typing import Optional
 import time, requests
 
@@ -28,7 +29,7 @@ class VideoSummaryManager(VideoSummaryManagerInterface):
             }
         
         try:
-            response = requests.get(url, params=params)
+            response = get_session().get(url, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as e:
@@ -68,7 +69,7 @@ class VideoSummaryManager(VideoSummaryManagerInterface):
         }
         
         try:
-            response = requests.post(url, params=params)
+            response = get_session().post(url, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as e:
@@ -79,14 +80,18 @@ class VideoSummaryManager(VideoSummaryManagerInterface):
             raise
 
     def __validate_parameters(self, sum_len: Optional[str] = None, sum_style: Optional[str] = None, model_name: Optional[str] = None):
-        allowed_lengths = ["Medium", "Short", "Long"]
-        if sum_len is not None and sum_len not in allowed_lengths:
-            raise ValueError(f"Invalid length value: {sum_len}. Allowed values are: {', '.join(allowed_lengths)}")
-        
-        allowed_styles = ["Neutral", "Casual", "Formal"]
-        if sum_style is not None and sum_style not in allowed_styles:
-            raise ValueError(f"Invalid style value: {sum_style}. Allowed values are: {', '.join(allowed_styles)}")
-        
-        allowed_models = ["gpt-35-turbo", "gpt-4"]
-        if model_name is not None and model_name not in allowed_models:
-            raise ValueError(f"Invalid model name: {model_name}. Allowed values are: {', '.join(allowed_models)}")
\ No newline at end of file
+        validate_summary_parameters(sum_len, sum_style, model_name)
+
+
+def validate_summary_parameters(sum_len: Optional[str] = None, sum_style: Optional[str] = None, model_name: Optional[str] = None):
+    allowed_lengths = ["Medium", "Short", "Long"]
+    if sum_len is not None and sum_len not in allowed_lengths:
+        raise ValueError(f"Invalid length value: {sum_len}. Allowed values are: {', '.join(allowed_lengths)}")
+    
+    allowed_styles = ["Neutral", "Casual", "Formal"]
+    if sum_style is not None and sum_style not in allowed_styles:
+        raise ValueError(f"Invalid style value: {sum_style}. Allowed values are: {', '.join(allowed_styles)}")
+    
+    allowed_models = ["gpt-35-turbo", "gpt-4"]
+    if model_name is not None and model_name not in allowed_models:
+        raise ValueError(f"Invalid model name: {model_name}. Allowed values are: {', '.join(allowed_models)}")
\ No newline at end of file
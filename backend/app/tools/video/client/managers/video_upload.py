@@ -1,8 +1,16 @@
 from app.tools.video.client.interfaces.video_upload import VideoUploadManagerInterface
-from typing import Optional
+from app.tools.video.client.http_session import get_session
+from typing import Callable, Dict, List, Optional
+from requests.exceptions import ConnectionError, Timeout
+from app.tools.video.client.multipart_stream import MultipartFileStream
+from app.tools.video.progress_store import report_progress
+from app.tools.video.client.insights_stream import extract_index_fields
 from urllib.parse import urlparse
 import os, time, requests
 
+UPLOAD_ATTEMPTS = 3
+UPLOAD_RETRY_WAIT_SEC = 5
+
 def get_file_name_no_extension(file_path):
     return os.path.splitext(os.path.basename(file_path))[0]
 
@@ -42,7 +50,7 @@ class VideoUploadManager(VideoUploadManagerInterface):
             'videoUrl': video_url
         }
 
-        response = requests.post(url, params=params)
+        response = get_session().post(url, params=params)
 
         response.raise_for_status()
 
@@ -55,7 +63,9 @@ class VideoUploadManager(VideoUploadManagerInterface):
         return video_id
 
     def upload_by_file(self, media_path:str, video_name:Optional[str]=None,
-                        wait_for_index:bool=False, video_description:str='', privacy='Private', partition='', language:str = 'auto') -> str:
+                        wait_for_index:bool=False, video_description:str='', privacy='Private', partition='', language:str = 'auto',
+                        external_id:Optional[str]=None, progress_callback:Optional[Callable[[int, int], None]]=None,
+                        max_attempts:int=UPLOAD_ATTEMPTS) -> str:
         '''
         Uploads a local file and starts the video index.
         Calls the uploadVideo API (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Upload-Video)
@@ -66,6 +76,9 @@ class VideoUploadManager(VideoUploadManagerInterface):
         :param video_description: The description of the video
         :param privacy: The privacy mode of the video
         :param partition: The partition of the video
+        :param external_id: Stored with the video, so it can be found again with `find_video_by_external_id`
+        :param progress_callback: Called with (bytes_sent, total_bytes) while the file is sent
+        :param max_attempts: Transfers interrupted by a connection error are sent again, up to this many times
         :return: Video Id of the video being indexed, otherwise throws excpetion
         '''
         # if excluded_ai is None:
@@ -86,19 +99,40 @@ class VideoUploadManager(VideoUploadManagerInterface):
             'privacy': privacy,
             'partition': partition,
             'language': language,
+            **({'externalId': external_id} if external_id else {}),
             'accessToken': self.client.vi_access_token,
         }
 
 
 
-        print('Uploading a local file using multipart/form-data post request to this URL:')
-
-        response = requests.post(url, params=params, files={'file': open(media_path,'rb')}, stream=True)
+        print(f'Uploading {media_path} using a streamed multipart/form-data post request...')
+
+        # The file is read from disk while it is sent (bounded memory). The upload API has no resumable
+        # sessions, so an interrupted transfer is sent again from the start; with an external_id, a
+        # transfer that reached Video Indexer before the connection dropped is found instead of re-sent.
+        with MultipartFileStream(media_path, progress_callback=progress_callback) as body:
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    response = get_session().post(url, params=params, data=body, headers={'Content-Type': body.content_type})
+                    break
+                except (ConnectionError, Timeout) as e:
+                    if attempt == max_attempts:
+                        raise
+                    if external_id:
+                        video_id = self.find_video_by_external_id(external_id)
+                        if video_id is not None:
+                            print(f'Upload of {media_path} was interrupted after reaching Video Indexer: {video_id}')
+                            return video_id
+                    wait = UPLOAD_RETRY_WAIT_SEC * 2 ** (attempt - 1)
+                    print(f'Upload of {media_path} interrupted ({e}), sending again in {wait} seconds ({attempt}/{max_attempts})')
+                    time.sleep(wait)
+                    body.rewind()
+                    params['accessToken'] = self.client.vi_access_token
 
         response.raise_for_status()
 
         if response.status_code != 200:
-            requests.post("http://127.0.0.1:5000/uploadVideo_status", json={"name": video_name, "progress": "Failed"})
+            report_progress(video_name, "Failed")
             print(f'Request failed with status code: {response.status_code}')
 
         video_id = response.json().get('id')
@@ -110,49 +144,37 @@ class VideoUploadManager(VideoUploadManagerInterface):
 
     def wait_for_index(self, video_id:str, video_name:str, language:str='auto', timeout_sec:Optional[int]=None) -> None:
         '''
-        Calls getVideoIndex API in 10 second intervals until the indexing state is 'processed'
-        (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Get-Video-Index).
-        Prints video index when the index is complete, otherwise throws exception.
+        Checks the indexing state every 5 seconds until it is 'Processed' or 'Failed', with the
+        lightweight `get_video_state` instead of downloading the whole video index on every check.
 
         :param video_id: The video ID to wait for
-        :param language: The language to translate video insights
+        :param language: Kept for compatibility, the state does not depend on it
         :param timeout_sec: The timeout in seconds
         '''
         # self.get_account_async() # if account is not initialized, get it
 
-        url = f'{self.client.consts.ApiEndpoint}/{self.client.account["location"]}/Accounts/{self.client.account["properties"]["accountId"]}/' + \
-            f'Videos/{video_id}/Index'
-
-        params = {
-            'accessToken': self.client.vi_access_token,
-            'language': language
-        }
-
         print(f'Checking if video {video_id} has finished indexing...')
         processing = True
         start_time = time.time()
         while processing:
-            response = requests.get(url, params=params)
-
-            response.raise_for_status()
-
-            video_result = response.json()
+            # The token is read again on every poll, long waits outlive the token they started with
+            video_result = self.get_video_state(video_id)
             video_state = video_result.get('state')
-            progress = video_result.get('videos')[0].get('processingProgress')
+            progress = video_result.get('processingProgress')
             # print(progress)
             
             # print(f"Video Name:|{video_name}|")
-            response_status = requests.post("http://127.0.0.1:5000/uploadVideo_status", json={"videoId": video_id, "name": video_name, "progress": progress})
+            report_progress(video_name, progress, video_id)
             # print(f"Resposta JSON::::::{response_status.json()}")
 
             if video_state == 'Processed':
                 processing = False
-                response_status = requests.post("http://127.0.0.1:5000/uploadVideo_status", json={"videoId": video_id, "name": video_name, "progress": "100%"})
-                print(f'The video index has completed. Here is the full JSON of the index for video ID {video_id}: \n{video_result}')
+                report_progress(video_name, "100%", video_id)
+                print(f'The video index has completed for video ID {video_id}.')
                 break
             elif video_state == 'Failed':
                 processing = False
-                response_status = requests.post("http://127.0.0.1:5000/uploadVideo_status", json={"videoId": video_id, "name": video_name, "progress": "Failed"})
+                report_progress(video_name, "Failed", video_id)
                 print(f"The video index failed for video ID {video_id}.")
                 break
 
@@ -167,15 +189,66 @@ class VideoUploadManager(VideoUploadManagerInterface):
     def is_video_processed(self, video_id:str) -> bool:
         # self.client.get_account_async() # if account is not initialized, get it
 
+        return self.get_video_state(video_id).get('state') == 'Processed'
+
+    def get_video_state(self, video_id: str) -> dict:
+        '''
+        Gets the indexing state of one video from the Search Videos API (a few hundred bytes, see
+        `get_videos_state`). A video that search does not return yet is read from the Get Video Index
+        API, streamed and parsed only up to its state and progress.
+
+        :param video_id: The video ID
+        :return: {"state": ..., "processingProgress": ...}
+        '''
+        state = self.get_videos_state([video_id]).get(video_id)
+        if state is not None:
+            return state
+
         url = f'{self.client.consts.ApiEndpoint}/{self.client.account["location"]}/Accounts/{self.client.account["properties"]["accountId"]}/' + \
                 f'Videos/{video_id}/Index'
         params = {
             'accessToken': self.client.vi_access_token,
         }
-        response = requests.get(url, params=params)
+        with get_session().get(url, params=params, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            fields = extract_index_fields(response.raw, ('state', 'progress'))
+        return {'state': fields['state'], 'processingProgress': fields['progress']}
+
+    def get_videos_state(self, video_ids: List[str]) -> Dict[str, dict]:
+        '''
+        Gets the indexing state of many videos with one call to the Search Videos API
+        (https://api-portal.videoindexer.ai/api-details#api=Operations&operation=Search-Videos)
+
+        :param video_ids: The video IDs, at most a few dozen per call (they go in the query string)
+        :return: {video_id: {"state": ..., "processingProgress": ...}} for the videos found
+        '''
+        url = f'{self.client.consts.ApiEndpoint}/{self.client.account["location"]}/Accounts/{self.client.account["properties"]["accountId"]}/' + \
+                'Videos/Search'
+        params = [('accessToken', self.client.vi_access_token), ('pageSize', len(video_ids))]
+        params += [('id', video_id) for video_id in video_ids]
+
+        response = get_session().get(url, params=params)
         response.raise_for_status()
 
-        video_result = response.json()
-        video_state = video_result.get('state')
+        return {
+            video['id']: {'state': video.get('state'), 'processingProgress': video.get('processingProgress')}
+            for video in response.json().get('results', [])
+        }
+
+    def find_video_by_external_id(self, external_id: str) -> Optional[str]:
+        '''
+        :param external_id: The external ID given to `upload_by_file`
+        :return: The ID of the video uploaded with this external ID, or None
+        '''
+        url = f'{self.client.consts.ApiEndpoint}/{self.client.account["location"]}/Accounts/{self.client.account["properties"]["accountId"]}/' + \
+                'Videos/Search'
+        params = {
+            'accessToken': self.client.vi_access_token,
+            'externalId': external_id,
+        }
+        response = get_session().get(url, params=params)
+        response.raise_for_status()
 
-        return video_state == 'Processed'
\ No newline at end of file
+        results = response.json().get('results', [])
+        return results[0]['id'] if results else None
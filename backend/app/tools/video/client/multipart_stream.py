@@ -0,0 +1,107 @@
+import asyncio
+import mimetypes
+import os
+import uuid
+from typing import AsyncIterator, Callable, Optional
+
+# Bytes read from disk at a time; also the granularity of the progress callback
+CHUNK_SIZE = 1024 * 1024
+
+
+class MultipartFileStream:
+    '''
+    multipart/form-data body with a single file field, read from disk as it is sent
+
+    `requests` builds `files=` bodies in memory, so uploading a multi-GB video needed as much RAM.
+    This is a file-like object with a known length: `requests` sends it with a Content-Length header,
+    pulling CHUNK_SIZE (or smaller) reads, so memory use stays bounded whatever the file size.
+
+        with MultipartFileStream(path) as body:
+            session.post(url, data=body, headers={'Content-Type': body.content_type})
+
+    With `httpx.AsyncClient`, send `content=body.aiter()` (and the Content-Length) instead.
+
+    :param media_path: The file to send
+    :param field_name: Name of the form field
+    :param progress_callback: Called with (bytes_sent, total_bytes) as the body is read
+    '''
+
+    def __init__(self, media_path: str, field_name: str = 'file',
+                 progress_callback: Optional[Callable[[int, int], None]] = None):
+        self.media_path = media_path
+        self.progress_callback = progress_callback
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+
+        file_name = os.path.basename(media_path).replace('"', '')
+        file_type = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{file_name}"\r\n'
+            f'Content-Type: {file_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self._file_size = os.path.getsize(media_path)
+        self.len = len(self._head) + self._file_size + len(self._tail)
+
+        self._file = None
+        self._sent = 0
+        self.rewind()
+
+    def __len__(self) -> int:
+        return self.len
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def rewind(self) -> None:
+        '''Starts the body over, e.g. to retry a failed transfer'''
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.media_path, 'rb')
+        self._part = 0  # 0: head, 1: file, 2: tail, 3: done
+        self._offset = 0
+        self._sent = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        size = min(size, CHUNK_SIZE)
+        chunk = b''
+        while not chunk and self._part < 3:
+            if self._part == 0:
+                chunk = self._head[self._offset:self._offset + size]
+                source_len = len(self._head)
+            elif self._part == 1:
+                chunk = self._file.read(size)
+                source_len = self._file_size
+            else:
+                chunk = self._tail[self._offset:self._offset + size]
+                source_len = len(self._tail)
+            self._offset += len(chunk)
+            if self._offset >= source_len or not chunk:
+                self._part += 1
+                self._offset = 0
+        self._sent += len(chunk)
+        if chunk and self.progress_callback is not None:
+            self.progress_callback(self._sent, self.len)
+        return chunk
+
+    async def aiter(self) -> AsyncIterator[bytes]:
+        '''
+        The body as an async iterator, for `httpx.AsyncClient`. Each read runs in a worker thread, so
+        the event loop keeps serving the other videos while a multi-GB file is read from disk
+        '''
+        while True:
+            chunk = await asyncio.to_thread(self.read, CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,180 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import redis
+
+# Tokens are refreshed this many seconds before they expire, so a request never leaves with a token
+# that dies on the way (Video Indexer and ARM tokens live about one hour)
+REFRESH_MARGIN_SEC = int(os.getenv("VI_TOKEN_REFRESH_MARGIN", "300"))
+# Used when the expiry of a token cannot be read from it
+DEFAULT_TOKEN_TTL_SEC = 3300
+ACCOUNT_TTL_SEC = int(os.getenv("VI_ACCOUNT_CACHE_TTL", "86400"))
+REFRESH_LOCK_TTL_MS = 30_000
+# Namespace of the cache keys in Redis, e.g. to share one Redis DB between deployments
+KEY_PREFIX = os.getenv("VI_TOKEN_CACHE_PREFIX", "vi:auth:")
+
+
+def jwt_expiry(token: str) -> Optional[float]:
+    '''
+    Reads the `exp` claim of a JWT without validating it
+
+    :param token: The JWT
+    :return: Expiry as a Unix timestamp, or None if the token is not a JWT with `exp`
+    '''
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return None
+
+
+def credential_id(*parts: Optional[str]) -> str:
+    '''
+    Short hash identifying a credential (tenant, client id, ...), used in the cache keys so processes
+    signed in as different identities never share a token, without writing the ids themselves to Redis
+    '''
+    return hashlib.sha256('\0'.join(part or '' for part in parts).encode('utf-8')).hexdigest()[:16]
+
+
+class TokenCache:
+    '''
+    Cache of access tokens and account details shared by the Flask workers and the Celery workers
+
+    Values are kept in memory and in Redis, so a new process or a new VideoIndexerClient reuses the
+    token fetched by any other one. A token is refreshed once it is within REFRESH_MARGIN_SEC of its
+    expiry; a Redis lock makes sure only one process calls Azure for it while the others keep using
+    the current token. Without Redis the cache still works per process.
+    '''
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self._local: Dict[str, Tuple[Any, float]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._redis = redis.Redis.from_url(redis_url, socket_timeout=2) if redis_url else None
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _read_shared(self, key: str) -> Optional[Tuple[Any, float]]:
+        if self._redis is None:
+            return None
+        try:
+            raw = self._redis.get(KEY_PREFIX + key)
+        except redis.RedisError as e:
+            print(f'[Token cache] Redis unavailable, using the local cache: {e}')
+            return None
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['value'], entry['expires_at']
+
+    def _write_shared(self, key: str, value: Any, expires_at: float) -> None:
+        if self._redis is None:
+            return
+        try:
+            ttl = max(int(expires_at - time.time()), 1)
+            self._redis.set(KEY_PREFIX + key, json.dumps({'value': value, 'expires_at': expires_at}), ex=ttl)
+        except redis.RedisError as e:
+            print(f'[Token cache] Could not share {key} through Redis: {e}')
+
+    def _try_refresh_lock(self, key: str) -> bool:
+        if self._redis is None:
+            return True
+        try:
+            return bool(self._redis.set(KEY_PREFIX + key + ':refresh', '1', nx=True, px=REFRESH_LOCK_TTL_MS))
+        except redis.RedisError:
+            return True
+
+    def _release_refresh_lock(self, key: str) -> None:
+        if self._redis is None:
+            return
+        try:
+            self._redis.delete(KEY_PREFIX + key + ':refresh')
+        except redis.RedisError:
+            pass
+
+    def get(self, key: str, fetch: Callable[[], Any], expires_at: Callable[[Any], float],
+            refresh_margin: float = REFRESH_MARGIN_SEC) -> Any:
+        '''
+        Returns the cached value of `key`, fetching it when missing or about to expire
+
+        :param key: Cache key, must identify the account and the scope of the value
+        :param fetch: Called without arguments to get a new value
+        :param expires_at: Gives the Unix timestamp at which a fetched value expires
+        :param refresh_margin: Seconds before expiry at which the value is refreshed
+        :return: A value that is valid for at least `refresh_margin` seconds, when possible
+        '''
+        entry = self._local.get(key)
+        if entry is not None and entry[1] - refresh_margin > time.time():
+            return entry[0]
+
+        with self._lock_for(key):
+            entry = self._local.get(key)
+            if entry is not None and entry[1] - refresh_margin > time.time():
+                return entry[0]
+
+            shared = self._read_shared(key)
+            if shared is not None:
+                entry = self._local[key] = shared
+                if shared[1] - refresh_margin > time.time():
+                    return shared[0]
+
+            locked = self._try_refresh_lock(key)
+            if not locked:
+                # Another process is refreshing; the current value is still usable until it expires
+                if entry is not None and entry[1] > time.time():
+                    return entry[0]
+                for _ in range(50):
+                    time.sleep(0.1)
+                    shared = self._read_shared(key)
+                    if shared is not None and shared[1] > time.time():
+                        self._local[key] = shared
+                        return shared[0]
+
+            try:
+                value = fetch()
+                expiry = expires_at(value)
+                self._local[key] = (value, expiry)
+                self._write_shared(key, value, expiry)
+            finally:
+                if locked:
+                    self._release_refresh_lock(key)
+            return value
+
+    def invalidate(self, key: str) -> None:
+        '''Drops `key`, e.g. after the API rejected the token'''
+        self._local.pop(key, None)
+        if self._redis is not None:
+            try:
+                self._redis.delete(KEY_PREFIX + key)
+            except redis.RedisError:
+                pass
+
+
+_token_cache: Optional[TokenCache] = None
+
+
+def get_token_cache() -> TokenCache:
+    '''
+    The process-wide token cache, shared through VI_TOKEN_CACHE_REDIS_URL (DB 3 of the Celery Redis by
+    default, so the tokens are not in the broker DB). Set it to an empty value to keep the cache per process.
+    '''
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache(os.getenv("VI_TOKEN_CACHE_REDIS_URL", "redis://127.0.0.1:6380/3") or None)
+    return _token_cache
+
+
+def token_expiry(token: str) -> float:
+    return jwt_expiry(token) or time.time() + DEFAULT_TOKEN_TTL_SEC
+
+
+def account_expiry(_account: Any) -> float:
+    return time.time() + ACCOUNT_TTL_SEC
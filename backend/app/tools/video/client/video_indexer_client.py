@@ -3,7 +3,9 @@ from typing import Optional
 from pprint import pprint
 
 from app.tools.video.client.Consts import Consts
-from app.tools.video.client.account_token_provider import get_arm_access_token, get_account_access_token_async
+from app.tools.video.client.account_token_provider import get_arm_access_token, get_account_access_token_async, arm_credential_id
+from app.tools.video.client.token_cache import get_token_cache, token_expiry, account_expiry
+from app.tools.video.client.http_session import get_session
 
 from app.tools.video.client.managers.video_upload import VideoUploadManager
 from app.tools.video.client.managers.video_content import VideoContentManager
@@ -12,29 +14,64 @@ from app.tools.video.client.managers.video_summary import VideoSummaryManager
 
 class VideoIndexerClient:
     def __init__(self):
-        self.arm_access_token = ''
-        self.vi_access_token = ''
-        self.account = None   
+        self._account = None
         self.consts = None
+        self.token_cache = get_token_cache()
         
         self.upload_manager = VideoUploadManager(self)
         self.content_manager = VideoContentManager(self)
         self.summary_manager = VideoSummaryManager(self)
     
     # Authentication
+    def _cache_key(self, kind: str) -> str:
+        # Scoped to the credential too: the same account reached with another identity gets its own tokens
+        return f'{kind}:{arm_credential_id(self.consts)}:{self.consts.SubscriptionId}/{self.consts.ResourceGroup}/{self.consts.AccountName}'
+
+    @property
+    def arm_access_token(self) -> str:
+        return self.token_cache.get(
+            f'arm:{arm_credential_id(self.consts)}:{self.consts.AzureResourceManager}',
+            lambda: get_arm_access_token(self.consts),
+            token_expiry,
+        )
+
+    @property
+    def vi_access_token(self) -> str:
+        '''
+        Account access token (Contributor, Account scope), read from the shared token cache on every
+        use, so long polling loops keep working after the token they started with has expired
+        '''
+        return self.token_cache.get(
+            self._cache_key('vi:Contributor:Account'),
+            lambda: get_account_access_token_async(self.consts, self.arm_access_token),
+            token_expiry,
+        )
+
+    @property
+    def account(self) -> Optional[dict]:
+        if self._account is None and self.consts is not None:
+            self.get_account_async()
+        return self._account
+
     def authenticate_async(self, consts:Consts) -> None:
+        '''
+        Sets the account to use. Tokens come from the shared token cache and are only requested from
+        Azure when no process holds a valid one
+        '''
         self.consts = consts
-        # Get access tokens
-        self.arm_access_token = get_arm_access_token(self.consts)
-        self.vi_access_token = get_account_access_token_async(self.consts, self.arm_access_token)
+        self.vi_access_token
 
     def get_account_async(self) -> None:
         '''
         Get information about the account
         '''
-        if self.account is not None:
-            return self.account
+        if self._account is not None:
+            return self._account
+
+        self._account = self.token_cache.get(self._cache_key('account'), self._fetch_account, account_expiry, refresh_margin=0)
+        return self._account
 
+    def _fetch_account(self) -> dict:
         headers = {
             'Authorization': 'Bearer ' + self.arm_access_token,
             'Content-Type': 'application/json'
@@ -44,12 +81,13 @@ class VideoIndexerClient:
                 f'{self.consts.ResourceGroup}/providers/Microsoft.VideoIndexer/accounts/{self.consts.AccountName}' + \
                 f'?api-version={self.consts.ApiVersion}'
 
-        response = requests.get(url, headers=headers)
+        response = get_session().get(url, headers=headers)
 
         response.raise_for_status()
 
-        self.account = response.json()
-        print(f'[Account Details] Id:{self.account["properties"]["accountId"]}, Location: {self.account["location"]}')
+        account = response.json()
+        print(f'[Account Details] Id:{account["properties"]["accountId"]}, Location: {account["location"]}')
+        return account
 
     def upload_video(   self, video_name: Optional[str] = None, video_path_or_url: str = '', wait_for_index: bool = False, video_description: str = '',
                         privacy: str = 'Private', partition='', language: str = 'auto', op: Optional[str] = None, video_id: Optional[str] = None ) -> str:
@@ -145,7 +183,7 @@ class VideoIndexerClient:
                 'accessToken': self.vi_access_token
             }           
                 
-        response = requests.get(url, params=params)
+        response = get_session().get(url, params=params)
         
         response.raise_for_status()
         
@@ -0,0 +1,160 @@
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import tiktoken
+
+# Every reply is primed with <|start|>assistant<|message|>
+REPLY_PRIMING_TOKENS = 3
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        print("Warning: model not found. Using cl100k_base encoding.")
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def message_overhead(model: str) -> Tuple[int, int]:
+    """
+    Tokens added by the chat format around each message, and for a `name` field.
+
+    :param model: The model name.
+    :return: A tuple (tokens_per_message, tokens_per_name).
+    """
+    if model in {
+        "gpt-3.5-turbo-0613",
+        "gpt-3.5-turbo-16k-0613",
+        "gpt-4-0314",
+        "gpt-4-32k-0314",
+        "gpt-4-0613",
+        "gpt-4-32k-0613",
+        }:
+        return 3, 1
+    elif model == "gpt-3.5-turbo-0301":
+        return 4, -1  # every message follows <|start|>{role/name}\n{content}<|end|>\n; with a name, the role is omitted
+    # Other models (and Azure deployment names such as gpt-35-turbo) are counted like the -0613 versions
+    return 3, 1
+
+
+def num_tokens_from_messages(messages, model="gpt-3.5-turbo-0613"):
+    """Return the number of tokens used by a list of messages."""
+    buffer = ConversationBuffer(token_limit=None, model=model)
+    return REPLY_PRIMING_TOKENS + sum(buffer.count(message) for message in messages)
+
+
+class ConversationBuffer:
+    """
+    Messages of a chat, kept within the context window of the model.
+
+    The token count of each message is computed once, when it is added, and the buffer keeps a
+    running total, so checking the size of the conversation never encodes the history again.
+    Pinned messages (the system prompt) are always sent; the other messages live in a deque and the
+    oldest ones are evicted, one `popleft` each, when the total plus the tokens reserved for the
+    answer would exceed `token_limit`.
+
+        buffer = ConversationBuffer({"role": "system", "content": "You are a helpful assistant."})
+        buffer.append({"role": "user", "content": question})
+        response = client.chat.completions.create(model=..., messages=buffer.messages(), max_tokens=buffer.max_response_tokens)
+        buffer.append({"role": "assistant", "content": response.choices[0].message.content})
+
+    :param system_message: Pinned first message, if any.
+    :param token_limit: Context window of the model; None disables trimming.
+    :param max_response_tokens: Tokens kept free for the answer.
+    :param model: Model whose tokenizer and chat format are used to count tokens.
+    :param encoding: A tiktoken encoding, instead of the one of `model`.
+    """
+
+    def __init__(self, system_message: Optional[Dict[str, str]] = None, token_limit: Optional[int] = 4096,
+                 max_response_tokens: int = 250, model: str = "gpt-3.5-turbo-0613", encoding=None):
+        self.token_limit = token_limit
+        self.max_response_tokens = max_response_tokens
+        self.model = model
+        self.encoding = encoding
+        self.tokens_per_message, self.tokens_per_name = message_overhead(model)
+        self._pinned: List[Tuple[Dict[str, str], int]] = []
+        self._history: Deque[Tuple[Dict[str, str], int]] = deque()
+        self._total = REPLY_PRIMING_TOKENS
+        if system_message is not None:
+            self.pin(system_message)
+
+    def count(self, message: Dict[str, str]) -> int:
+        """
+        :return: The number of tokens `message` takes in the prompt.
+        """
+        if self.encoding is None:
+            self.encoding = get_encoding(self.model)
+        num_tokens = self.tokens_per_message
+        for key, value in message.items():
+            num_tokens += len(self.encoding.encode(value))
+            if key == "name":
+                num_tokens += self.tokens_per_name
+        return num_tokens
+
+    @property
+    def tokens(self) -> int:
+        """Tokens of the prompt made of every message in the buffer."""
+        return self._total
+
+    def __len__(self) -> int:
+        return len(self._pinned) + len(self._history)
+
+    def pin(self, message: Dict[str, str], tokens: Optional[int] = None) -> None:
+        """Adds a message that is never evicted, sent before the history."""
+        tokens = self.count(message) if tokens is None else tokens
+        self._pinned.append((message, tokens))
+        self._total += tokens
+
+    def append(self, message: Dict[str, str], tokens: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Adds a message to the history and evicts the oldest ones if the prompt no longer fits.
+
+        :param message: A chat message ({"role": ..., "content": ...}).
+        :param tokens: Its token count, if already known (e.g. restored from storage).
+        :return: The evicted messages, oldest first.
+        """
+        tokens = self.count(message) if tokens is None else tokens
+        self._history.append((message, tokens))
+        self._total += tokens
+        return self.trim()
+
+    def extend(self, messages: Iterable[Dict[str, str]]) -> List[Dict[str, str]]:
+        evicted = []
+        for message in messages:
+            evicted.extend(self.append(message))
+        return evicted
+
+    def trim(self, token_limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Evicts the oldest messages until the prompt and the answer fit in `token_limit`. The latest
+        message is always kept.
+
+        :param token_limit: Overrides the limit of the buffer for this call.
+        :return: The evicted messages, oldest first.
+        """
+        token_limit = self.token_limit if token_limit is None else token_limit
+        evicted = []
+        if token_limit is None:
+            return evicted
+        while self._total + self.max_response_tokens > token_limit and len(self._history) > 1:
+            message, tokens = self._history.popleft()
+            self._total -= tokens
+            evicted.append(message)
+        return evicted
+
+    def messages(self, context: Sequence[Dict[str, str]] = ()) -> List[Dict[str, str]]:
+        """
+        The messages to send: the pinned ones, then `context`, then the history.
+
+        :param context: Messages for this call only (e.g. the sections retrieved for the question);
+            they are not kept, and the history is trimmed so that the prompt still fits with them.
+        """
+        if context and self.token_limit is not None:
+            self.trim(self.token_limit - sum(self.count(message) for message in context))
+        return [message for message, _ in self._pinned] + list(context) + [message for message, _ in self._history]
+
+    def history(self) -> List[Tuple[Dict[str, str], int]]:
+        """The messages that are not pinned, with their token counts."""
+        return list(self._history)
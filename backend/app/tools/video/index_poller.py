@@ -0,0 +1,230 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis
+from requests.exceptions import RequestException
+
+from app.tools.video.job_checkpoints import JOB_KEY
+from app.tools.video.progress_store import report_progress
+
+DUE_KEY = "vi:poll:due"
+ENTRY_KEY = "vi:poll:entry:"
+SCHEDULED_KEY = "vi:poll:scheduled"
+
+# Kinds of entries: "index" waits for the video index (checked in batches through Videos/Search),
+# "prompt" waits for the prompt content (checked per video, saved to `result_path` when ready)
+KINDS = ("index", "prompt")
+
+MIN_INTERVAL_SEC = float(os.getenv("VI_POLL_MIN_INTERVAL", "5"))
+MAX_INTERVAL_SEC = float(os.getenv("VI_POLL_MAX_INTERVAL", "60"))
+BACKOFF = 1.5
+BATCH_SIZE = int(os.getenv("VI_POLL_BATCH_SIZE", "25"))
+TIMEOUT_SEC = float(os.getenv("VI_POLL_TIMEOUT", str(6 * 3600)))
+# A claimed entry is polled again after this long if its poller died before rescheduling it
+LEASE_SEC = 120
+
+# Takes up to ARGV[2] members due at ARGV[1] and pushes them ARGV[3] seconds ahead, atomically, so two
+# poller ticks never check (and finish) the same entry
+CLAIM_SCRIPT = """
+local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(members) do
+    redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[3]), member)
+end
+return members
+"""
+
+
+class IndexPoller:
+    '''
+    Registry of the videos waiting on Video Indexer, shared through Redis by every Celery worker
+
+    Instead of one task sleeping in a loop per video, each wait is an entry scheduled in the sorted
+    set DUE_KEY (score = next check). `poll_once` claims the entries that are due, checks the index
+    state of up to BATCH_SIZE videos with a single request, and returns the ones that reached a final
+    state together with the Celery signature (`continuation`) that should run next. The others are
+    checked again later: every MIN_INTERVAL_SEC while their progress moves, backing off up to
+    MAX_INTERVAL_SEC while it does not.
+    '''
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis = redis_client
+        self._claim = self.redis.register_script(CLAIM_SCRIPT)
+
+    @staticmethod
+    def _member(kind: str, video_id: str) -> str:
+        return f'{kind}:{video_id}'
+
+    def track(self, video_id: str, continuation: Dict[str, Any], kind: str = "index", video_name: Optional[str] = None,
+              language: str = 'auto', result_path: Optional[str] = None, first_check_in: float = MIN_INTERVAL_SEC,
+              job_id: Optional[str] = None) -> None:
+        '''
+        Starts waiting for a video
+
+        :param video_id: The video ID
+        :param continuation: Celery signature (as a dict) applied with the outcome as extra kwargs:
+            state ("Processed", "Failed" or "Timeout" for "index"; "Ready", "Failed" or "Timeout" for
+            "prompt") and, for "prompt", prompt_path
+        :param kind: "index" or "prompt"
+        :param video_name: The name used in the progress reports
+        :param language: The language of the video
+        :param result_path: Where the prompt content is saved (kind "prompt")
+        :param first_check_in: Seconds before the first check
+        :param job_id: The video job waiting; the entry is dropped once the job is cancelled
+        '''
+        if kind not in KINDS:
+            raise ValueError(f"Unknown poll kind {kind!r}, expected one of {KINDS}")
+        if kind == "prompt" and not result_path:
+            raise ValueError("A result_path is required to wait for the prompt content")
+        member = self._member(kind, video_id)
+        entry = {
+            'kind': kind,
+            'video_id': video_id,
+            'video_name': video_name or video_id,
+            'language': language,
+            'result_path': result_path,
+            'continuation': continuation,
+            'interval': MIN_INTERVAL_SEC,
+            'progress': None,
+            'started_at': time.time(),
+            'job_id': job_id,
+        }
+        pipe = self.redis.pipeline()
+        pipe.set(ENTRY_KEY + member, json.dumps(entry))
+        pipe.zadd(DUE_KEY, {member: time.time() + first_check_in})
+        pipe.execute()
+
+    def pending(self) -> int:
+        return self.redis.zcard(DUE_KEY)
+
+    def seconds_until_next(self) -> Optional[float]:
+        '''Seconds until the next entry is due, or None if nothing is being waited on'''
+        first = self.redis.zrange(DUE_KEY, 0, 0, withscores=True)
+        if not first:
+            return None
+        return max(first[0][1] - time.time(), 0.0)
+
+    def claim_schedule(self, ttl: float) -> bool:
+        '''True for the caller that should schedule the next poller tick, so only one is pending'''
+        return bool(self.redis.set(SCHEDULED_KEY, '1', nx=True, ex=max(int(ttl) + 1, 1)))
+
+    def release_schedule(self) -> None:
+        self.redis.delete(SCHEDULED_KEY)
+
+    def _reschedule(self, member: str, entry: Dict[str, Any], progress: Any) -> None:
+        if progress is not None and progress != entry.get('progress'):
+            entry['interval'] = MIN_INTERVAL_SEC
+        else:
+            entry['interval'] = min(entry['interval'] * BACKOFF, MAX_INTERVAL_SEC)
+        entry['progress'] = progress
+        pipe = self.redis.pipeline()
+        pipe.set(ENTRY_KEY + member, json.dumps(entry))
+        pipe.zadd(DUE_KEY, {member: time.time() + entry['interval']})
+        pipe.execute()
+
+    def _finish(self, member: str) -> None:
+        pipe = self.redis.pipeline()
+        pipe.zrem(DUE_KEY, member)
+        pipe.delete(ENTRY_KEY + member)
+        pipe.execute()
+
+    def _report(self, entry: Dict[str, Any], progress: Any) -> None:
+        report_progress(entry['video_name'], progress, entry['video_id'])
+
+    def poll_once(self, client, limit: int = BATCH_SIZE * 4) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        '''
+        Checks the entries that are due
+
+        :param client: An authenticated VideoIndexerClient
+        :param limit: Maximum number of entries claimed in this call
+        :return: (entry, outcome) for every entry that finished; its continuation has not been applied
+        '''
+        now = time.time()
+        members = [m.decode() if isinstance(m, bytes) else m for m in self._claim(keys=[DUE_KEY], args=[now, limit, LEASE_SEC])]
+        if not members:
+            return []
+
+        raw_entries = self.redis.mget([ENTRY_KEY + member for member in members])
+        entries = {}
+        for member, raw in zip(members, raw_entries):
+            if raw is None:
+                self.redis.zrem(DUE_KEY, member)
+            else:
+                entries[member] = json.loads(raw)
+
+        # Cancelled jobs are not waited on anymore, and their continuation never runs
+        job_members = [member for member, entry in entries.items() if entry.get('job_id')]
+        if job_members:
+            pipe = self.redis.pipeline()
+            for member in job_members:
+                pipe.hget(JOB_KEY + entries[member]['job_id'], 'cancelled')
+            for member, cancelled in zip(job_members, pipe.execute()):
+                if cancelled in (b'1', '1'):
+                    self._finish(member)
+                    del entries[member]
+
+        finished = []
+        index_members = [member for member, entry in entries.items() if entry['kind'] == "index"]
+        for start in range(0, len(index_members), BATCH_SIZE):
+            batch = index_members[start:start + BATCH_SIZE]
+            try:
+                states = client.upload_manager.get_videos_state([entries[member]['video_id'] for member in batch])
+            except RequestException as e:
+                print(f"Could not check the index state of {len(batch)} videos: {e}")
+                for member in batch:
+                    self._reschedule(member, entries[member], entries[member].get('progress'))
+                continue
+            for member in batch:
+                entry = entries[member]
+                video = states.get(entry['video_id'], {})
+                state, progress = video.get('state'), video.get('processingProgress')
+                if state == 'Processed':
+                    self._report(entry, "100%")
+                elif state == 'Failed':
+                    self._report(entry, "Failed")
+                elif now - entry['started_at'] > TIMEOUT_SEC:
+                    state = 'Timeout'
+                    self._report(entry, "Failed")
+                else:
+                    if progress is not None and progress != entry.get('progress'):
+                        self._report(entry, progress)
+                    self._reschedule(member, entry, progress)
+                    continue
+                self._finish(member)
+                finished.append((entry, {'state': state}))
+
+        for member, entry in entries.items():
+            if entry['kind'] != "prompt":
+                continue
+            try:
+                prompt_content = client.content_manager.find_prompt_content(entry['video_id'], language=entry.get('language'))
+            except RequestException as e:
+                print(f"Could not check the prompt content of {entry['video_id']}: {e}")
+                prompt_content = None
+            if prompt_content is not None:
+                os.makedirs(os.path.dirname(entry['result_path']) or '.', exist_ok=True)
+                tmp_path = entry['result_path'] + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(prompt_content, f, ensure_ascii=False)
+                os.replace(tmp_path, entry['result_path'])
+                outcome = {'state': 'Ready', 'prompt_path': entry['result_path']}
+            elif now - entry['started_at'] > TIMEOUT_SEC:
+                outcome = {'state': 'Timeout'}
+            else:
+                self._reschedule(member, entry, None)
+                continue
+            self._finish(member)
+            finished.append((entry, outcome))
+
+        return finished
+
+
+_index_poller: Optional[IndexPoller] = None
+
+
+def get_index_poller() -> IndexPoller:
+    global _index_poller
+    if _index_poller is None:
+        _index_poller = IndexPoller(redis.StrictRedis.from_url(os.getenv("VI_POLL_REDIS_URL", "redis://127.0.0.1:6380/0")))
+    return _index_poller
@@ -0,0 +1,117 @@
+import os
+import time
+from typing import Dict, Optional
+
+import redis
+
+JOB_KEY = "vi:job:"
+JOB_TTL_SEC = int(os.getenv("VI_JOB_TTL", str(7 * 24 * 3600)))
+
+# Stages of a video job, in order. A job records the last stage it completed; resuming it runs the next one.
+STAGES = ("created", "uploaded", "indexed", "prompt_ready", "inserted")
+
+
+class JobCheckpoints:
+    '''
+    Outputs of each stage of a video job (video_id, prompt_path, ...), kept in a Redis hash per job
+
+    Every stage reads what it needs from here and writes what it produced before handing over to the
+    next one, so a retried or resumed job starts again at the stage that failed: a video that was
+    uploaded once is never uploaded again.
+    '''
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis = redis_client
+
+    def create(self, job_id: str, **params) -> None:
+        '''Records the parameters of a new job; does nothing if the job already exists'''
+        key = JOB_KEY + job_id
+        fields = {name: '' if value is None else str(value) for name, value in params.items()}
+        fields.update({'stage': 'created', 'updated_at': str(time.time())})
+        if self.redis.hsetnx(key, 'job_id', job_id):
+            self.redis.hset(key, mapping=fields)
+        self.redis.expire(key, JOB_TTL_SEC)
+
+    def get(self, job_id: str) -> Optional[Dict[str, str]]:
+        job = self.redis.hgetall(JOB_KEY + job_id)
+        if not job:
+            return None
+        return {k.decode() if isinstance(k, bytes) else k: v.decode() if isinstance(v, bytes) else v for k, v in job.items()}
+
+    def complete(self, job_id: str, stage: str, **outputs) -> None:
+        '''
+        Marks `stage` as done and saves its outputs
+
+        :param job_id: The job
+        :param stage: One of STAGES
+        :param outputs: Values produced by the stage, e.g. video_id
+        '''
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r}, expected one of {STAGES}")
+        fields = {name: str(value) for name, value in outputs.items()}
+        fields.update({'stage': stage, 'updated_at': str(time.time())})
+        key = JOB_KEY + job_id
+        self.redis.hset(key, mapping=fields)
+        self.redis.expire(key, JOB_TTL_SEC)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self.redis.hset(JOB_KEY + job_id, mapping={'error': error, 'updated_at': str(time.time())})
+
+    def cancel(self, job_id: str) -> bool:
+        '''
+        Marks the job cancelled: the stage tasks and the index poller stop at their next step
+
+        :return: False if the job does not exist
+        '''
+        key = JOB_KEY + job_id
+        if not self.redis.exists(key):
+            return False
+        self.redis.hset(key, mapping={'cancelled': '1', 'updated_at': str(time.time())})
+        return True
+
+    def reopen(self, job_id: str) -> None:
+        '''Clears the error and the cancel mark of a job that is resumed'''
+        key = JOB_KEY + job_id
+        self.redis.hdel(key, 'error', 'cancelled')
+        self.redis.hset(key, 'updated_at', str(time.time()))
+
+    @staticmethod
+    def cancelled(job: Optional[Dict[str, str]]) -> bool:
+        return job is not None and job.get('cancelled') == '1'
+
+    @staticmethod
+    def status(job: Dict[str, str]) -> Dict[str, object]:
+        '''
+        :return: {"state", "stage", "progress", "error"}: state is "cancelled", "failed", "done" or
+            "running" and progress the share of STAGES completed (0-100)
+        '''
+        stage = job.get('stage', 'created')
+        if job.get('cancelled') == '1':
+            state = 'cancelled'
+        elif job.get('error'):
+            state = 'failed'
+        elif stage == STAGES[-1]:
+            state = 'done'
+        else:
+            state = 'running'
+        return {
+            'state': state,
+            'stage': stage,
+            'progress': round(STAGES.index(stage) * 100 / (len(STAGES) - 1)),
+            'error': job.get('error') or None,
+        }
+
+    @staticmethod
+    def done(job: Dict[str, str], stage: str) -> bool:
+        '''True if `job` has completed `stage`'''
+        return STAGES.index(job.get('stage', 'created')) >= STAGES.index(stage)
+
+
+_job_checkpoints: Optional[JobCheckpoints] = None
+
+
+def get_job_checkpoints() -> JobCheckpoints:
+    global _job_checkpoints
+    if _job_checkpoints is None:
+        _job_checkpoints = JobCheckpoints(redis.StrictRedis.from_url(os.getenv("VI_POLL_REDIS_URL", "redis://127.0.0.1:6380/0")))
+    return _job_checkpoints
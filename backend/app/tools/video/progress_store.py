@@ -0,0 +1,128 @@
+import json
+import os
+import time
+from typing import Dict, Optional
+
+import redis
+
+PROGRESS_KEY = "vi:progress"
+EXPIRY_KEY = "vi:progress:expiry"
+# Every change of progress is published here as JSON {"name", "progress", "videoId"}
+EVENTS_CHANNEL = "vi:progress:events"
+
+# A video that stops reporting (finished, failed or abandoned) disappears after this long
+PROGRESS_TTL_SEC = int(os.getenv("VI_PROGRESS_TTL", str(24 * 3600)))
+# "Exclude" (the frontend acknowledged the end of the upload) keeps the value around this long
+EXCLUDE_TTL_SEC = 2
+
+
+class ProgressStore:
+    '''
+    Upload/index progress of every video, in one Redis hash (name -> progress) with the expiry time
+    of each video in a sorted set
+
+    Reading all the progress is a single pipelined round trip (ZRANGEBYSCORE + HGETALL) whatever else
+    lives in Redis, instead of a KEYS scan with a TYPE and a GET per key; expired videos are dropped
+    from the hash by the reader that finds them, so no thread has to wait to delete a key.
+
+    Workers write here directly with `report`, which also publishes the change on EVENTS_CHANNEL;
+    the Flask app forwards those events to the browsers (/uploadVideo_events).
+    '''
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis = redis_client
+
+    def set(self, video_name: str, progress: str, ttl: int = PROGRESS_TTL_SEC, video_id: Optional[str] = None) -> None:
+        '''
+        :param video_name: The name of the video
+        :param progress: "N%", "100%", "Finished", "Failed", ...
+        :param ttl: Seconds before the video is dropped if it is not updated again
+        :param video_id: Sent along in the published event
+        '''
+        event = {"name": video_name, "progress": progress}
+        if video_id is not None:
+            event["videoId"] = video_id
+        pipe = self.redis.pipeline()
+        pipe.hset(PROGRESS_KEY, video_name, progress)
+        pipe.zadd(EXPIRY_KEY, {video_name: time.time() + ttl})
+        # The keys themselves go away once nothing reports anymore
+        pipe.expire(PROGRESS_KEY, max(ttl, PROGRESS_TTL_SEC))
+        pipe.expire(EXPIRY_KEY, max(ttl, PROGRESS_TTL_SEC))
+        pipe.publish(EVENTS_CHANNEL, json.dumps(event))
+        pipe.execute()
+
+    def report(self, video_name: str, progress, video_id: Optional[str] = None) -> bool:
+        '''
+        Sets the progress of a video unless it already has this value: the index is checked every few
+        seconds and usually reports the same progress many times in a row
+
+        :return: True if the progress changed (and an event was published)
+        '''
+        progress = str(progress)
+        current = self.redis.hget(PROGRESS_KEY, video_name)
+        if current is not None and _decode(current) == progress:
+            return False
+        self.set(video_name, progress, video_id=video_id)
+        return True
+
+    def subscribe(self) -> redis.client.PubSub:
+        '''
+        :return: A PubSub subscribed to EVENTS_CHANNEL; the caller closes it
+        '''
+        pubsub = self.redis.pubsub()
+        pubsub.subscribe(EVENTS_CHANNEL)
+        return pubsub
+
+    def get(self, video_name: str) -> Optional[str]:
+        return self.all().get(video_name)
+
+    def remove(self, video_name: str) -> None:
+        pipe = self.redis.pipeline()
+        pipe.hdel(PROGRESS_KEY, video_name)
+        pipe.zrem(EXPIRY_KEY, video_name)
+        pipe.execute()
+
+    def all(self) -> Dict[str, str]:
+        '''
+        :return: The progress of every video that has not expired, by video name
+        '''
+        now = time.time()
+        pipe = self.redis.pipeline()
+        pipe.zrangebyscore(EXPIRY_KEY, '-inf', now)
+        pipe.hgetall(PROGRESS_KEY)
+        expired, progress = pipe.execute()
+
+        if expired:
+            pipe = self.redis.pipeline()
+            pipe.hdel(PROGRESS_KEY, *expired)
+            pipe.zremrangebyscore(EXPIRY_KEY, '-inf', now)
+            pipe.execute()
+
+        expired = {_decode(name) for name in expired}
+        return {_decode(name): _decode(value) for name, value in progress.items() if _decode(name) not in expired}
+
+
+def _decode(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+_progress_store: Optional[ProgressStore] = None
+
+
+def report_progress(video_name: str, progress, video_id: Optional[str] = None) -> None:
+    '''
+    Reports the progress of a video from any process (Celery workers, the Video Indexer client).
+    Failures are only printed, progress is never worth failing a video for
+    '''
+    try:
+        get_progress_store().report(video_name, progress, video_id)
+    except redis.RedisError as e:
+        print(f"Não foi possível atualizar o progresso de {video_name}: {e}")
+
+
+def get_progress_store() -> ProgressStore:
+    global _progress_store
+    if _progress_store is None:
+        # DB 1: apart from the Celery broker and results (DB 0)
+        _progress_store = ProgressStore(redis.StrictRedis.from_url(os.getenv("VI_PROGRESS_REDIS_URL", "redis://127.0.0.1:6380/1")))
+    return _progress_store
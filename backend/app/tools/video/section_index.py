@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import sys
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from tools.index.bm25 import bm25_weights, tokenize
+except ImportError:
+    # Run as a script from tools/video (chat_with_content.py): the package root is two levels up
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from tools.index.bm25 import bm25_weights, tokenize
+
+SECTION_INDEX_DIR = os.getenv("VIDEO_SECTION_INDEX_DIR", "section_index")
+# Section indexes kept in memory per process (one per video)
+MAX_LOADED_INDEXES = 32
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+def section_text(insight: Dict[str, str]) -> str:
+    """The text of a section, as sent to the model."""
+    return f"Video section from {insight['start']} to {insight['end']}:\n{insight['content']}"
+
+
+class SectionIndex:
+    """
+    Search over the sections of one video (the output of `extract_insights_from_prompt_content`),
+    so a chat sends the few sections relevant to each question instead of the whole video.
+
+    With `embed_fn` the sections are embedded once and the vectors saved to `persist_dir` under the
+    hash of the sections and the model name: later chats, in any process, load them instead of
+    embedding the video again. Questions are ranked by cosine similarity. Without `embed_fn` the
+    sections are ranked with BM25 (the tokenizer and scoring of `tools.index.bm25`, so accents are folded
+    the same way as in the keyword index) and nothing leaves the process.
+
+    :param insights: The sections, dictionaries with `start`, `end` and `content`.
+    :param embed_fn: Embeds a list of texts, e.g. `embed_model.get_text_embedding_batch`.
+    :param model_name: Name of the embedding model, part of the persisted key.
+    :param persist_dir: Where the section vectors are saved.
+    """
+
+    def __init__(self, insights: Sequence[Dict[str, str]], embed_fn: Optional[EmbedFn] = None, model_name: str = "",
+                 persist_dir: str = SECTION_INDEX_DIR, k1: float = 1.2, b: float = 0.75):
+        self.insights = list(insights)
+        self.texts = [section_text(insight) for insight in self.insights]
+        self.embed_fn = embed_fn
+        self.key = section_index_key(self.insights, model_name if embed_fn is not None else "bm25")
+        self.k1, self.b = k1, b
+        self._vectors = None
+        if embed_fn is not None:
+            self._vectors = self._load_or_embed(persist_dir)
+        else:
+            self._build_bm25()
+
+    def __len__(self) -> int:
+        return len(self.insights)
+
+    def _load_or_embed(self, persist_dir: str) -> np.ndarray:
+        path = os.path.join(persist_dir, f"{self.key}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+        vectors = np.asarray(self.embed_fn(self.texts), dtype=np.float32).reshape(len(self.texts), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+        os.makedirs(persist_dir, exist_ok=True)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, vectors)
+        os.replace(tmp_path, path)
+        return vectors
+
+    def _build_bm25(self) -> None:
+        # Postings per term: the sections containing it and how many times
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        lengths = []
+        for position, text in enumerate(self.texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                positions, tfs = postings.setdefault(term, ([], []))
+                positions.append(position)
+                tfs.append(tf)
+        self._postings = {term: (np.array(positions, dtype=np.int64), np.array(tfs, dtype=np.float32))
+                          for term, (positions, tfs) in postings.items()}
+        self._lengths = np.array(lengths, dtype=np.float32)
+        self._avg_length = float(self._lengths.mean()) if lengths else 0.0
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[int, float]]:
+        """
+        :param query: The question.
+        :param top_k: Number of sections to return.
+        :return: (section position, score) pairs, best first.
+        """
+        if not self.insights or top_k <= 0:
+            return []
+        if self._vectors is not None:
+            query_vector = np.asarray(self.embed_fn([query])[0], dtype=np.float32)
+            norm = np.linalg.norm(query_vector)
+            scores = self._vectors @ (query_vector / norm if norm else query_vector)
+        else:
+            scores = np.zeros(len(self.texts), dtype=np.float32)
+            for term in set(tokenize(query)):
+                if term not in self._postings:
+                    continue
+                positions, tfs = self._postings[term]
+                scores[positions] += bm25_weights(tfs, self._lengths[positions], positions.size, len(self.texts),
+                                                  self._avg_length, self.k1, self.b)
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(position), float(scores[position])) for position in best]
+
+    def context_message(self, query: str, top_k: int = 4, max_tokens: int = 1500,
+                        count: Optional[Callable[[Dict[str, str]], int]] = None) -> Optional[Dict[str, str]]:
+        """
+        One system message with the sections most relevant to `query`, in the order they appear in
+        the video. Sections are added best first while they fit in `max_tokens`, so the size of the
+        prompt does not depend on the length of the video.
+
+        :param query: The question.
+        :param top_k: Maximum number of sections.
+        :param max_tokens: Token budget of the message.
+        :param count: Counts the tokens of a message, e.g. `ConversationBuffer.count`; without it
+            a section counts as many tokens as it has words.
+        :return: The message, or None if no section is relevant.
+        """
+        chosen, used = [], 0
+        for position, score in self.search(query, top_k):
+            if score <= 0:
+                continue
+            text = self.texts[position]
+            tokens = count({"role": "system", "content": text}) if count is not None else len(tokenize(text))
+            if used + tokens > max_tokens:
+                continue
+            chosen.append(position)
+            used += tokens
+        if not chosen:
+            return None
+        sections = "\n\n".join(self.texts[position] for position in sorted(chosen))
+        return {"role": "system", "content": f"Relevant sections of the video:\n\n{sections}"}
+
+
+def section_index_key(insights: Sequence[Dict[str, str]], model_name: str = "") -> str:
+    """Hash of the sections and the model, the same for the same video content."""
+    payload = json.dumps([model_name, [[i["start"], i["end"], i["content"]] for i in insights]], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+_section_indexes: "OrderedDict[str, SectionIndex]" = OrderedDict()
+
+
+def get_section_index(insights: Sequence[Dict[str, str]], embed_fn: Optional[EmbedFn] = None,
+                      model_name: str = "") -> SectionIndex:
+    """
+    Returns the section index of a video, built once per process (and, with embeddings, once per
+    video content on disk).
+    """
+    key = section_index_key(insights, model_name if embed_fn is not None else "bm25")
+    index = _section_indexes.get(key)
+    if index is None:
+        index = SectionIndex(insights, embed_fn=embed_fn, model_name=model_name)
+        _section_indexes[key] = index
+        while len(_section_indexes) > MAX_LOADED_INDEXES:
+            _section_indexes.popitem(last=False)
+    else:
+        _section_indexes.move_to_end(key)
+    return index
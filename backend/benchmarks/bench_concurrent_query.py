@@ -0,0 +1,148 @@
+"""
+Query latency while a bulk insert runs on the index server.
+
+Runs against an in-memory VectorStoreIndex with mock models (a fixed sleep stands in for the
+Azure OpenAI round trips), so no credentials are needed:
+
+    cd backend
+    python benchmarks/bench_concurrent_query.py --docs 200 --readers 8
+
+It reports query p50/p99 with the index idle and while `insert_into_index` loads `--docs` files,
+first with the readers-writer lock and then with one global lock held around the whole query and
+insert. With the readers-writer lock p99 should stay close to the idle value.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+from llama_index.core.node_parser import SentenceSplitter
+
+import index_server
+from tools.index.bm25 import BM25Index
+from tools.index.document_registry import DocumentRegistry
+
+NETWORK_LATENCY = 0.02
+
+
+class SlowMockEmbedding(MockEmbedding):
+    """MockEmbedding that sleeps like a remote embedding call would."""
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        time.sleep(NETWORK_LATENCY)
+        return super()._get_query_embedding(query)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(NETWORK_LATENCY)
+        return super()._get_text_embeddings(texts)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return float("nan")
+    k = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def run_readers(query_fn, readers: int, stop: threading.Event):
+    latencies: List[float] = []
+    latencies_lock = threading.Lock()
+
+    def reader():
+        while not stop.is_set():
+            start = time.perf_counter()
+            query_fn("What happened to the sandwich?")
+            elapsed = time.perf_counter() - start
+            with latencies_lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    return latencies, threads
+
+
+def measure(query_fn, insert_fn, files, readers: int, idle_seconds: float):
+    stop = threading.Event()
+    latencies, threads = run_readers(query_fn, readers, stop)
+    time.sleep(idle_seconds)
+    idle = list(latencies)
+    del latencies[:]
+
+    start = time.perf_counter()
+    for path in files:
+        insert_fn(path)
+    insert_seconds = time.perf_counter() - start
+    busy = list(latencies)
+
+    stop.set()
+    for t in threads:
+        t.join()
+    return idle, busy, insert_seconds
+
+
+def report(label: str, idle, busy, insert_seconds):
+    print(f"{label}")
+    print(f"  idle:   n={len(idle):5d}  p50={percentile(idle, 50)*1000:7.1f} ms  p99={percentile(idle, 99)*1000:7.1f} ms")
+    print(f"  insert: n={len(busy):5d}  p50={percentile(busy, 50)*1000:7.1f} ms  p99={percentile(busy, 99)*1000:7.1f} ms"
+          f"  (bulk insert took {insert_seconds:.1f} s)")
+
+
+def reset_index(workdir: str):
+    index_server.index = VectorStoreIndex(nodes=[])
+    index_server.index_name = os.path.join(workdir, "saved_index")
+    index_server.document_registry = DocumentRegistry(os.path.join(workdir, f"documents_{time.time_ns()}.sqlite3"))
+    index_server.keyword_index = BM25Index(os.path.join(workdir, f"keyword_index_{time.time_ns()}"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200, help="number of files inserted during the run")
+    parser.add_argument("--readers", type=int, default=8, help="concurrent query threads")
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    Settings.embed_model = SlowMockEmbedding(embed_dim=256)
+    Settings.llm = MockLLM(max_tokens=32)
+    Settings.text_splitter = SentenceSplitter(chunk_size=1024)
+    index_server.model_settings = lambda: None
+
+    with tempfile.TemporaryDirectory() as workdir:
+        files = []
+        for i in range(args.docs):
+            path = os.path.join(workdir, f"doc_{i}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"Document {i}. " + "Someone at work ate my sandwich. " * 200)
+            files.append(path)
+
+        reset_index(workdir)
+        index_server.insert_into_index(files[0])
+        report("readers-writer lock",
+               *measure(index_server.query_index, index_server.insert_into_index, files, args.readers, args.idle_seconds))
+
+        reset_index(workdir)
+        index_server.insert_into_index(files[0])
+        global_lock = threading.Lock()
+
+        def locked(fn):
+            def wrapper(*a: Any, **kw: Any):
+                with global_lock:
+                    return fn(*a, **kw)
+            return wrapper
+
+        report("single global lock",
+               *measure(locked(index_server.query_index), locked(index_server.insert_into_index), files,
+                        args.readers, args.idle_seconds))
+
+
+if __name__ == "__main__":
+    main()
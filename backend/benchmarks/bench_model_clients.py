@@ -0,0 +1,148 @@
+"""
+Query latency with the Azure OpenAI clients rebuilt on every query against one pooled pair.
+
+    cd backend
+    python benchmarks/bench_model_clients.py --queries 200 --handshake-ms 40 --latency-ms 20
+
+Starts a local stub of the Azure OpenAI embeddings and chat completions endpoints. The stub waits
+`--handshake-ms` on every new connection, standing in for the TCP + TLS setup of the real endpoint,
+and `--latency-ms` on every request. Each query is one embedding call followed by one completion,
+like `query_index`. "rebuild" creates AzureOpenAI and AzureOpenAIEmbedding per query (the old
+`model_settings`); "pooled" creates them once with a shared keep-alive httpx.Client. p50/p99 and the
+number of connections opened are reported for both.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from llama_index.embeddings.azure_openai import AzureOpenAIEmbedding
+from llama_index.llms.azure_openai import AzureOpenAI
+
+EMBED_DIM = 1536
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    handshake_s = 0.0
+    latency_s = 0.0
+    connections = 0
+    counter_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.counter_lock:
+            StubOpenAIHandler.connections += 1
+        time.sleep(self.handshake_s)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency_s)
+        if self.path.split("?")[0].endswith("/embeddings"):
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            payload = {
+                "object": "list",
+                "model": body.get("model", "text-embedding-3-small"),
+                "data": [{"object": "embedding", "index": i, "embedding": [0.01] * EMBED_DIM} for i in range(len(inputs))],
+                "usage": {"prompt_tokens": 1, "total_tokens": 1},
+            }
+        else:
+            payload = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "stub answer"}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 2, "total_tokens": 3},
+            }
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def build_models(endpoint, http_client=None):
+    llm = AzureOpenAI(
+        model="gpt-4o-mini",
+        deployment_name="gpt-4o-mini",
+        api_key="stub",
+        azure_endpoint=endpoint,
+        api_version="2024-02-01",
+        http_client=http_client,
+    )
+    embed_model = AzureOpenAIEmbedding(
+        model="text-embedding-3-small",
+        deployment_name="text-embedding-3-small",
+        azure_endpoint=endpoint,
+        api_key="stub",
+        api_version="2024-02-01",
+        http_client=http_client,
+    )
+    return llm, embed_model
+
+
+def run_query(llm, embed_model, i):
+    embed_model.get_query_embedding(f"question {i}")
+    llm.complete(f"answer question {i}")
+
+
+def report(label, timings, connections):
+    timings = np.array(timings) * 1000
+    print(f"{label:8s} p50 {np.percentile(timings, 50):7.1f} ms   p99 {np.percentile(timings, 99):7.1f} ms"
+          f"   mean {timings.mean():7.1f} ms   connections {connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--handshake-ms", type=float, default=40)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    StubOpenAIHandler.handshake_s = args.handshake_ms / 1000
+    StubOpenAIHandler.latency_s = args.latency_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    timings = []
+    StubOpenAIHandler.connections = 0
+    for i in range(args.queries):
+        started = time.perf_counter()
+        llm, embed_model = build_models(endpoint)
+        run_query(llm, embed_model, i)
+        timings.append(time.perf_counter() - started)
+    report("rebuild", timings, StubOpenAIHandler.connections)
+
+    timings = []
+    StubOpenAIHandler.connections = 0
+    http_client = httpx.Client(limits=httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=120))
+    llm, embed_model = build_models(endpoint, http_client)
+    run_query(llm, embed_model, -1)  # warm-up, as done by warm_up_models at startup
+    for i in range(args.queries):
+        started = time.perf_counter()
+        run_query(llm, embed_model, i)
+        timings.append(time.perf_counter() - started)
+    report("pooled", timings, StubOpenAIHandler.connections)
+
+    http_client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
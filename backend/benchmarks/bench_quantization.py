@@ -0,0 +1,115 @@
+"""
+Recall@k vs memory vs latency of the NumpyVectorStore quantization modes.
+
+    cd backend
+    python benchmarks/bench_quantization.py --size 100000 --dim 1536 --top-k 10
+
+Builds one store of clustered random vectors (closer to real embeddings than uniform noise), then
+reopens it as float32, float16 and int8, re-ranking `top_k * rerank_factor` candidates exactly for
+the compressed modes. Recall@k is measured against the exact float32 search. "scan MB" is the size
+of the array each query scans, i.e. what has to stay in memory for queries to be fast.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+
+from tools.index.numpy_vector_store import NumpyVectorStore
+
+BATCH = 10_000
+
+
+def clustered_vectors(rng, count, dim, clusters=256, spread=0.35):
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    assignment = rng.integers(0, clusters, size=count)
+    return centers[assignment] + spread * rng.standard_normal((count, dim), dtype=np.float32)
+
+
+def build(persist_dir, vectors):
+    store = NumpyVectorStore(persist_dir)
+    for start in range(0, vectors.shape[0], BATCH):
+        batch = vectors[start:start + BATCH]
+        store.add([
+            TextNode(id_=f"node-{start + i}", text=f"chunk {start + i}", embedding=batch[i].tolist())
+            for i in range(batch.shape[0])
+        ])
+    store.persist()
+
+
+def run_queries(store, queries, top_k):
+    results, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=top_k))
+        latencies.append(time.perf_counter() - start)
+        results.append(result.ids)
+    return results, latencies
+
+
+def scan_megabytes(store, quantization):
+    count = store._count
+    names = ["vectors"] if quantization == "none" else ["codes", "scales"]
+    total = 0
+    for name in names:
+        if name in store._arrays:
+            array = store._arrays[name]
+            total += array[:count].nbytes
+    return total / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[1, 4, 10])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    vectors = clustered_vectors(rng, args.size, args.dim)
+    picks = rng.integers(0, args.size, size=args.queries)
+    queries = vectors[picks] + 0.2 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    workdir = tempfile.mkdtemp(prefix="quantization_")
+    try:
+        build(workdir, vectors)
+        del vectors
+
+        exact_store = NumpyVectorStore(workdir)
+        run_queries(exact_store, queries[:5], args.top_k)
+        truth, latencies = run_queries(exact_store, queries, args.top_k)
+
+        print(f"{args.size} vectors, {args.dim} dimensions, top_k={args.top_k}")
+        print(f"{'mode':>8} {'rerank':>6} {'scan MB':>8} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8}")
+
+        def report(mode, factor, store, results, latencies):
+            recall = np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)])
+            print(f"{mode:>8} {factor:>6} {scan_megabytes(store, store.quantization):>8.0f} {recall:>9.3f} "
+                  f"{np.percentile(latencies, 50) * 1000:>8.2f} {np.percentile(latencies, 99) * 1000:>8.2f}")
+
+        report("float32", "-", exact_store, truth, latencies)
+        del exact_store
+
+        for mode in ("float16", "int8"):
+            for factor in args.rerank_factors:
+                store = NumpyVectorStore(workdir, quantization=mode, rerank_factor=factor)
+                run_queries(store, queries[:5], args.top_k)
+                results, latencies = run_queries(store, queries, args.top_k)
+                report(mode, factor, store, results, latencies)
+                del store
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Peak memory (RSS) of uploading a large video with `files=` against the streamed multipart body.
+
+    cd backend
+    python benchmarks/bench_upload_rss.py --size-gb 4
+
+Creates a sparse file of --size-gb GB, starts a local stub of the Video Indexer upload endpoint that
+reads and discards the body, and uploads the file in a child process per mode:
+"files" is the old `requests.post(..., files={'file': open(path, 'rb')})`, "stream" is
+VideoUploadManager.upload_by_file (MultipartFileStream). Reports the peak RSS of each child, the
+bytes received by the stub and the throughput.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+class StubUploadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    received = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            StubUploadHandler.received += len(chunk)
+        data = b'{"id": "stub-video"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def upload(mode, endpoint, media_path):
+    """Runs in the child process; prints the peak RSS in MB"""
+    started = time.perf_counter()
+    if mode == "files":
+        import requests
+        with open(media_path, "rb") as media_file:
+            requests.post(f"{endpoint}/loc/Accounts/1/Videos", params={"name": "bench"},
+                          files={"file": media_file}).raise_for_status()
+    else:
+        from app.tools.video.client.managers.video_upload import VideoUploadManager
+        client = SimpleNamespace(
+            consts=SimpleNamespace(ApiEndpoint=endpoint),
+            account={"location": "loc", "properties": {"accountId": "1"}},
+            vi_access_token="stub",
+        )
+        VideoUploadManager(client).upload_by_file(media_path, video_name="bench")
+    elapsed = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{peak_mb:.0f} {elapsed:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-gb", type=float, default=2)
+    parser.add_argument("--modes", nargs="+", default=["stream", "files"], choices=["stream", "files"])
+    parser.add_argument("--child", nargs=3, metavar=("MODE", "ENDPOINT", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # Importing the app package would start the Flask app; the child only needs the client modules
+        import types
+        app_package = types.ModuleType("app")
+        app_package.__path__ = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")]
+        sys.modules["app"] = app_package
+        upload(*args.child)
+        return
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubUploadHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+
+    size = int(args.size_gb * 1024 ** 3)
+    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as media_file:
+        media_file.truncate(size)
+        media_path = media_file.name
+    try:
+        for mode in args.modes:
+            StubUploadHandler.received = 0
+            result = subprocess.run([sys.executable, __file__, "--child", mode, endpoint, media_path],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{mode:7s} failed (exit code {result.returncode}): {result.stderr.strip().splitlines()[-1:]}")
+                continue
+            peak_mb, elapsed = result.stdout.strip().splitlines()[-1].split()
+            print(f"{mode:7s} peak RSS {float(peak_mb):8.0f} MB   received {StubUploadHandler.received / 1024 ** 3:5.2f} GB"
+                  f"   {size / 1024 ** 2 / float(elapsed):7.0f} MB/s")
+    finally:
+        os.remove(media_path)
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
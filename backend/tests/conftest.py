@@ -0,0 +1,36 @@
+"""
+Shared setup of the backend tests. Run them from backend/:
+
+    python -m pytest tests
+
+Redis is replaced by fakeredis (`pip install "fakeredis[lua]"`, Lua for the registered scripts).
+"""
+import os
+import sys
+import threading
+from multiprocessing.managers import BaseManager
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# `app.*` for the Flask side, `tools.*` as imported by index_server (which runs from backend/app)
+sys.path[:0] = [BACKEND_DIR, os.path.join(BACKEND_DIR, "app")]
+
+
+def _serve_index_manager():
+    # Importing app.routes connects to the index server; the tests never call it, so an empty manager
+    # on its address is enough when no index server is running
+    server = BaseManager(address=('127.0.0.1', 5002), authkey=b'password').get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+try:
+    _serve_index_manager()
+except OSError:
+    pass  # an index server is already listening
+
+
+@pytest.fixture
+def redis_client():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeStrictRedis()
@@ -0,0 +1,25 @@
+import inspect
+
+import pytest
+
+from app.tools.video.client.interfaces.video_content import AsyncVideoContentManagerInterface, VideoContentManagerInterface
+from app.tools.video.client.interfaces.video_summary import AsyncVideoSummaryManagerInterface, VideoSummaryManagerInterface
+from app.tools.video.client.interfaces.video_upload import AsyncVideoUploadManagerInterface, VideoUploadManagerInterface
+from app.tools.video.client.managers.async_video_content import AsyncVideoContentManager
+from app.tools.video.client.managers.async_video_summary import AsyncVideoSummaryManager
+from app.tools.video.client.managers.async_video_upload import AsyncVideoUploadManager
+
+
+@pytest.mark.parametrize("manager, interface, sync_interface", [
+    (AsyncVideoUploadManager, AsyncVideoUploadManagerInterface, VideoUploadManagerInterface),
+    (AsyncVideoContentManager, AsyncVideoContentManagerInterface, VideoContentManagerInterface),
+    (AsyncVideoSummaryManager, AsyncVideoSummaryManagerInterface, VideoSummaryManagerInterface),
+])
+def test_async_managers_implement_the_async_interfaces(manager, interface, sync_interface):
+    assert issubclass(manager, interface)
+    assert not issubclass(manager, sync_interface)
+    # Every abstract method is implemented, as a coroutine
+    manager(client=None)
+    for name in interface.__abstractmethods__:
+        assert inspect.iscoroutinefunction(getattr(interface, name))
+        assert inspect.iscoroutinefunction(getattr(manager, name))
@@ -0,0 +1,139 @@
+import gc
+import os
+
+import pytest
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from tools.index import bm25
+from tools.index.bm25 import BM25Index, quoted_phrases, reciprocal_rank_fusion, tokenize
+
+TEXTS = {
+    "n1": "Reunião de planejamento do orçamento anual",
+    "n2": "O vídeo da reunião mostra o orçamento por área",
+    "n3": "Treinamento de segurança para novos funcionários",
+    "n4": "Orçamento de marketing e vendas do trimestre",
+    "n5": "Ata da reuniao semanal da equipe de vendas",
+}
+
+
+def make_nodes(texts, partition=None):
+    return [
+        TextNode(id_=node_id, text=text, metadata={"partition": partition} if partition else {})
+        for node_id, text in texts.items()
+    ]
+
+
+def ranking(index, query, top_k=5, **kwargs):
+    return [(result.node.node_id, round(result.score, 6)) for result in index.search(query, top_k=top_k, **kwargs)]
+
+
+def test_tokenize_folds_accents():
+    assert tokenize("Reunião de ORÇAMENTO, vídeo 2") == ["reuniao", "de", "orcamento", "video", "2"]
+    assert quoted_phrases('ata "da reunião" e ""') == ["da reunião"]
+
+
+def test_search_ranks_and_filters(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(make_nodes(TEXTS))
+
+    # "reunião" and "reuniao" are the same term; shorter nodes first
+    assert [node_id for node_id, _ in ranking(index, "reuniao")] == ["n1", "n5", "n2"]
+    assert ranking(index, "orçamento anual")[0][0] == "n1"
+    # Phrases must appear verbatim (after tokenization)
+    assert [node_id for node_id, _ in ranking(index, '"orcamento anual"')] == ["n1"]
+    assert ranking(index, '"anual orçamento"') == []
+    assert ranking(index, "inexistente") == []
+
+
+def test_partition_filter(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(make_nodes({"a": "relatório de vendas"}, partition="rh"))
+    index.add(make_nodes({"b": "relatório de vendas e metas"}, partition="ti"))
+    assert [node_id for node_id, _ in ranking(index, "vendas", partition="ti")] == ["b"]
+    assert {node_id for node_id, _ in ranking(index, "vendas")} == {"a", "b"}
+
+
+def test_reopen_replays_the_log(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(make_nodes(TEXTS))
+    index.save()
+    index.delete_nodes(["n1"])
+    index.add(make_nodes({"n4": "Orçamento revisado do trimestre"}))
+    index.save()
+    expected = ranking(index, "orçamento reunião vendas")
+
+    assert not os.path.exists(tmp_path / bm25.POSTINGS_FILE)
+    reopened = BM25Index(str(tmp_path))
+    assert len(reopened) == len(index) == 4
+    assert ranking(reopened, "orçamento reunião vendas") == expected
+    assert "n1" not in {node_id for node_id, _ in expected}
+
+
+def test_unsaved_changes_are_lost(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(make_nodes(TEXTS))
+    index.save()
+    index.delete_ref_doc("n2")  # TextNode without a source: nothing to delete
+    index.delete_nodes(["n2"])
+    index.add(make_nodes({"n6": "orçamento extra"}))
+    # Crash: the process goes away without saving
+    del index
+    gc.collect()
+
+    reopened = BM25Index(str(tmp_path))
+    assert len(reopened) == 5
+    assert "n2" in {node_id for node_id, _ in ranking(reopened, "orçamento")}
+    assert "n6" not in {node_id for node_id, _ in ranking(reopened, "orçamento")}
+
+
+def test_compact_rewrites_the_snapshot(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(make_nodes(TEXTS))
+    index.save()
+    index.delete_nodes(["n3"])
+    index.compact()
+    expected = ranking(index, "orçamento reunião vendas treinamento")
+
+    assert os.path.getsize(tmp_path / bm25.POSTINGS_LOG_FILE) == 0
+    reopened = BM25Index(str(tmp_path))
+    assert ranking(reopened, "orçamento reunião vendas treinamento") == expected
+
+    # Saves after a compaction go to the log again, on top of the new snapshot
+    reopened.add(make_nodes({"n7": "segurança da informação"}))
+    reopened.save()
+    again = BM25Index(str(tmp_path))
+    assert [node_id for node_id, _ in ranking(again, "segurança")] == ["n7"]
+
+
+def test_large_log_is_compacted_on_save(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "COMPACT_MIN_LOG_BYTES", 1)
+    index = BM25Index(str(tmp_path))
+    index.add(make_nodes(TEXTS))
+    index.save()
+    assert os.path.exists(tmp_path / bm25.POSTINGS_FILE)
+    assert os.path.getsize(tmp_path / bm25.POSTINGS_LOG_FILE) == 0
+
+
+def test_torn_log_line_is_dropped(tmp_path):
+    index = BM25Index(str(tmp_path))
+    index.add(make_nodes(TEXTS))
+    index.save()
+    expected = ranking(index, "orçamento")
+    with open(tmp_path / bm25.POSTINGS_LOG_FILE, "ab") as log:
+        log.write(b'{"adds": [[5, 2, {"orcamento"')
+
+    reopened = BM25Index(str(tmp_path))
+    assert ranking(reopened, "orçamento") == expected
+    reopened.add(make_nodes({"n8": "orçamento final"}))
+    reopened.save()
+    assert len(BM25Index(str(tmp_path))) == 6
+
+
+def test_reciprocal_rank_fusion():
+    a, b, c = (TextNode(id_=node_id, text=node_id) for node_id in "abc")
+    fused = reciprocal_rank_fusion([
+        [NodeWithScore(node=a, score=0.9), NodeWithScore(node=b, score=0.8)],
+        [NodeWithScore(node=b, score=12.0), NodeWithScore(node=c, score=3.0)],
+    ], top_k=2, k=60)
+    assert [result.node.node_id for result in fused] == ["b", "a"]
+    assert fused[0].score == pytest.approx(1 / 62 + 1 / 61)
@@ -0,0 +1,66 @@
+from app.tools.chat_sessions import SESSION_KEY, ChatSessionStore
+
+
+def turn(role, content, tokens):
+    return {"role": role, "content": content}, tokens
+
+
+def test_append_and_load(redis_client):
+    sessions = ChatSessionStore(redis_client, token_budget=100)
+    assert sessions.append("s1", [turn("user", "oi", 3), turn("assistant", "olá", 4)], partition="rh") == 7
+    assert sessions.append("s1", [turn("user", "tudo bem?", 5)]) == 12
+
+    session = sessions.load("s1")
+    assert [message["content"] for message, _ in session.turns] == ["oi", "olá", "tudo bem?"]
+    assert session.history_tokens == 12 and session.summary == "" and session.partition is None
+    assert sessions.load("s2").turns == []
+    assert redis_client.ttl(SESSION_KEY + "s1") > 0
+
+
+def test_compaction_keeps_the_newest_turns(redis_client):
+    sessions = ChatSessionStore(redis_client, token_budget=20)
+    tokens = sessions.append("s1", [turn("user", f"pergunta {i}", 6) for i in range(5)])
+    assert sessions.over_budget(tokens)
+
+    session = sessions.load("s1")
+    count = sessions.turns_to_compact(session)
+    # Down to half the budget, but the last two turns always stay
+    assert count == 3
+    assert sessions.turns_to_compact(session, keep_last=4) == 1
+    assert sessions.compact("s1", count, 18, "resumo das perguntas 0 a 2", 5)
+
+    session = sessions.load("s1")
+    assert session.summary == "resumo das perguntas 0 a 2" and session.summary_tokens == 5
+    assert [message["content"] for message, _ in session.turns] == ["pergunta 3", "pergunta 4"]
+    assert int(redis_client.hget(SESSION_KEY + "s1", "history_tokens")) == 12
+    assert int(redis_client.hget(SESSION_KEY + "s1", "compactions")) == 1
+
+
+def test_compaction_keeps_a_turn_appended_meanwhile(redis_client):
+    sessions = ChatSessionStore(redis_client, token_budget=20)
+    sessions.append("s1", [turn("user", f"pergunta {i}", 6) for i in range(4)])
+    session = sessions.load("s1")
+    count = sessions.turns_to_compact(session)
+    removed = sum(tokens for _, tokens in session.turns[:count])
+
+    # The summary is being written while the user sends another message
+    sessions.append("s1", [turn("user", "nova pergunta", 7)])
+    assert sessions.compact("s1", count, removed, "resumo", 2)
+
+    session = sessions.load("s1")
+    assert [message["content"] for message, _ in session.turns] == ["pergunta 2", "pergunta 3", "nova pergunta"]
+    assert session.history_tokens == int(redis_client.hget(SESSION_KEY + "s1", "history_tokens")) == 19
+
+
+def test_compaction_of_a_deleted_session(redis_client):
+    sessions = ChatSessionStore(redis_client, token_budget=20)
+    sessions.append("s1", [turn("user", f"pergunta {i}", 6) for i in range(4)])
+    assert sessions.claim_compaction("s1")
+    assert not sessions.claim_compaction("s1")
+
+    # Ended while the summary was written: the session is not recreated with only a summary
+    assert sessions.delete("s1")
+    assert not sessions.compact("s1", 2, 12, "resumo", 2)
+    assert redis_client.keys("*") == []
+    assert not sessions.delete("s1")
+    assert sessions.claim_compaction("s1")
@@ -0,0 +1,118 @@
+import json
+from unittest import mock
+
+import pytest
+
+from app.tools.video import index_poller
+from app.tools.video.index_poller import DUE_KEY, LEASE_SEC, MIN_INTERVAL_SEC, IndexPoller
+from app.tools.video.job_checkpoints import JobCheckpoints
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(index_poller.time, "time", lambda: now[0])
+    monkeypatch.setattr(index_poller, "report_progress", mock.Mock())
+    return now
+
+
+def states(**by_video):
+    return {video_id: {"state": state, "processingProgress": progress} for video_id, (state, progress) in by_video.items()}
+
+
+def test_finished_videos_are_returned_once(redis_client, clock):
+    poller = IndexPoller(redis_client)
+    poller.track("v1", {"task": "next"}, video_name="aula 1", first_check_in=0)
+    poller.track("v2", {"task": "next"}, video_name="aula 2", first_check_in=0)
+    client = mock.Mock()
+    client.upload_manager.get_videos_state.return_value = states(v1=("Processed", "100%"), v2=("Processing", "40%"))
+
+    finished = poller.poll_once(client)
+
+    assert [(entry["video_id"], outcome) for entry, outcome in finished] == [("v1", {"state": "Processed"})]
+    assert finished[0][0]["continuation"] == {"task": "next"}
+    client.upload_manager.get_videos_state.assert_called_once_with(["v1", "v2"])
+    assert poller.pending() == 1
+    assert poller.seconds_until_next() == MIN_INTERVAL_SEC
+    # Nothing is due before the next check
+    assert poller.poll_once(client) == []
+
+
+def test_claimed_entries_are_not_checked_twice(redis_client, clock):
+    poller, other = IndexPoller(redis_client), IndexPoller(redis_client)
+    poller.track("v1", {"task": "next"}, first_check_in=0)
+    other_client = mock.Mock()
+
+    def concurrent_tick(video_ids):
+        # Another worker ticks while this one is checking the videos it claimed
+        assert other.poll_once(other_client) == []
+        return states(v1=("Processed", "100%"))
+
+    client = mock.Mock()
+    client.upload_manager.get_videos_state.side_effect = concurrent_tick
+    assert len(poller.poll_once(client)) == 1
+    other_client.upload_manager.get_videos_state.assert_not_called()
+
+
+def test_lease_of_a_dead_poller_expires(redis_client, clock):
+    poller = IndexPoller(redis_client)
+    poller.track("v1", {"task": "next"}, first_check_in=0)
+    # Claimed by a poller that dies before rescheduling or finishing the entry
+    assert poller._claim(keys=[DUE_KEY], args=[clock[0], 10, LEASE_SEC]) == [b"index:v1"]
+
+    client = mock.Mock()
+    client.upload_manager.get_videos_state.return_value = states(v1=("Processed", "100%"))
+    assert poller.poll_once(client) == []
+    clock[0] += LEASE_SEC
+    assert len(poller.poll_once(client)) == 1
+
+
+def test_unchanged_progress_backs_off(redis_client, clock):
+    poller = IndexPoller(redis_client)
+    poller.track("v1", {"task": "next"}, first_check_in=0)
+    client = mock.Mock()
+    client.upload_manager.get_videos_state.return_value = states(v1=("Processing", "10%"))
+
+    waits = []
+    for _ in range(3):
+        poller.poll_once(client)
+        waits.append(poller.seconds_until_next())
+        clock[0] += waits[-1]
+    assert waits[0] == MIN_INTERVAL_SEC
+    assert waits[0] < waits[1] < waits[2]
+
+    # Moving progress checks often again
+    client.upload_manager.get_videos_state.return_value = states(v1=("Processing", "20%"))
+    poller.poll_once(client)
+    assert poller.seconds_until_next() == MIN_INTERVAL_SEC
+
+
+def test_cancelled_jobs_are_dropped(redis_client, clock):
+    checkpoints = JobCheckpoints(redis_client)
+    checkpoints.create("job-1", video_name="aula")
+    poller = IndexPoller(redis_client)
+    poller.track("v1", {"task": "next"}, first_check_in=0, job_id="job-1")
+    checkpoints.cancel("job-1")
+
+    client = mock.Mock()
+    assert poller.poll_once(client) == []
+    client.upload_manager.get_videos_state.assert_not_called()
+    assert poller.pending() == 0
+
+
+def test_ready_prompt_content_is_saved(redis_client, clock, tmp_path):
+    poller = IndexPoller(redis_client)
+    result_path = str(tmp_path / "prompt" / "aula_Video.json")
+    poller.track("v1", {"task": "insert"}, kind="prompt", language="Portuguese", result_path=result_path,
+                 first_check_in=0)
+    client = mock.Mock()
+    client.content_manager.find_prompt_content.side_effect = [None, {"sections": [{"id": 0}]}]
+
+    assert poller.poll_once(client) == []
+    clock[0] += MIN_INTERVAL_SEC * 2
+    [(entry, outcome)] = poller.poll_once(client)
+
+    assert outcome == {"state": "Ready", "prompt_path": result_path}
+    client.content_manager.find_prompt_content.assert_called_with("v1", language="Portuguese")
+    with open(result_path, encoding="utf-8") as f:
+        assert json.load(f) == {"sections": [{"id": 0}]}
@@ -0,0 +1,110 @@
+from unittest import mock
+
+import pytest
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.schema import TextNode
+
+import index_server
+from tools.index.bm25 import BM25Index, tokenize
+from tools.index.rwlock import ReadWriteLock
+
+VOCABULARY = ["orcamento", "reuniao", "vendas", "seguranca", "treinamento", "marketing", "video", "ata"]
+TEXTS = {
+    "n1": "Reunião de planejamento do orçamento anual",
+    "n2": "O vídeo da reunião mostra o orçamento por área",
+    "n3": "Treinamento de segurança para novos funcionários",
+    "n4": "Campanha de marketing do trimestre",
+    "n5": "Ata da reunião semanal da equipe de vendas",
+}
+
+
+class WordCountEmbedding(BaseEmbedding):
+    """Counts of VOCABULARY words: deterministic and good enough to rank the test nodes."""
+
+    def _embed(self, text):
+        words = tokenize(text)
+        return [float(words.count(word)) + 0.01 for word in VOCABULARY]
+
+    def _get_query_embedding(self, query):
+        return self._embed(query)
+
+    def _get_text_embedding(self, text):
+        return self._embed(text)
+
+    async def _aget_query_embedding(self, query):
+        return self._embed(query)
+
+
+@pytest.fixture
+def indexes(tmp_path, monkeypatch):
+    """The global vector and keyword indexes of index_server, over TEXTS."""
+    embed_model = WordCountEmbedding()
+    nodes = [TextNode(id_=node_id, text=text, embedding=embed_model.get_text_embedding(text))
+             for node_id, text in TEXTS.items()]
+    keyword_index = BM25Index(str(tmp_path / "keyword_index"))
+    keyword_index.add(nodes)
+    monkeypatch.setattr(Settings, "_embed_model", embed_model)
+    monkeypatch.setattr(index_server, "index", VectorStoreIndex(nodes, embed_model=embed_model))
+    monkeypatch.setattr(index_server, "keyword_index", keyword_index)
+    monkeypatch.setattr(index_server, "index_lock", ReadWriteLock())
+    monkeypatch.setattr(index_server, "retriever_cache", {})
+    monkeypatch.setattr(index_server, "query_top_k", 2)
+    return embed_model, keyword_index
+
+
+def node_ids(nodes):
+    return [result.node.node_id for result in nodes]
+
+
+def test_vector_mode_skips_the_keyword_index(indexes):
+    _, keyword_index = indexes
+    with mock.patch.object(keyword_index, "search", wraps=keyword_index.search) as search:
+        query_bundle, nodes = index_server.retrieve_nodes("treinamento de segurança", mode="vector")
+    search.assert_not_called()
+    assert query_bundle.embedding is not None
+    assert node_ids(nodes)[0] == "n3"
+
+
+def test_keyword_mode_does_not_embed(indexes):
+    with mock.patch.object(WordCountEmbedding, "_get_query_embedding", autospec=True,
+                           side_effect=WordCountEmbedding._get_query_embedding) as embed:
+        query_bundle, nodes = index_server.retrieve_nodes("reuniao", mode="keyword")
+    embed.assert_not_called()
+    assert query_bundle.embedding is None
+    assert node_ids(nodes) == ["n1", "n5"]
+
+
+def test_keyword_mode_falls_back_to_vector(indexes):
+    query_bundle, nodes = index_server.retrieve_nodes("campanhas", mode="keyword")
+    assert query_bundle.embedding is not None
+    assert len(nodes) == 2
+
+
+def test_hybrid_fuses_both_rankings(indexes):
+    _, nodes = index_server.retrieve_nodes("marketing da ata", mode="hybrid")
+    # RRF scores, best first; both nodes are found by both searches, so they score more than the
+    # first place of a single ranking
+    assert set(node_ids(nodes)) == {"n4", "n5"}
+    assert nodes[0].score >= nodes[1].score > 1 / 61
+
+
+def test_default_mode(indexes):
+    assert index_server.default_query_mode('ata "reunião semanal"') == "keyword"
+    assert index_server.default_query_mode("ata da reunião") == "hybrid"
+
+    # A quoted phrase is a keyword search: only the node with the exact phrase
+    query_bundle, nodes = index_server.retrieve_nodes('"reunião semanal"')
+    assert query_bundle.embedding is None
+    assert node_ids(nodes) == ["n5"]
+
+
+def test_without_keyword_index(indexes, monkeypatch):
+    monkeypatch.setattr(index_server, "keyword_index", None)
+    _, nodes = index_server.retrieve_nodes("reuniao", mode="hybrid")
+    assert len(nodes) == 2
+
+
+def test_unknown_mode(indexes):
+    with pytest.raises(ValueError):
+        index_server.retrieve_nodes("reuniao", mode="semantic")
@@ -0,0 +1,36 @@
+from app.tools.video.job_checkpoints import JobCheckpoints
+
+
+def test_stages_and_status(redis_client):
+    checkpoints = JobCheckpoints(redis_client)
+    checkpoints.create("job-1", video_name="aula", language=None)
+    # Creating it again does not reset it
+    checkpoints.complete("job-1", "uploaded", video_id="vid-1")
+    checkpoints.create("job-1", video_name="other")
+
+    job = checkpoints.get("job-1")
+    assert job["video_name"] == "aula" and job["language"] == "" and job["video_id"] == "vid-1"
+    assert checkpoints.done(job, "uploaded") and not checkpoints.done(job, "indexed")
+    assert JobCheckpoints.status(job) == {"state": "running", "stage": "uploaded", "progress": 25, "error": None}
+
+    checkpoints.complete("job-1", "inserted")
+    assert JobCheckpoints.status(checkpoints.get("job-1"))["state"] == "done"
+    assert checkpoints.get("job-2") is None
+
+
+def test_cancel_and_reopen(redis_client):
+    checkpoints = JobCheckpoints(redis_client)
+    assert not checkpoints.cancel("job-1")
+
+    checkpoints.create("job-1", video_name="aula")
+    checkpoints.fail("job-1", "upload failed")
+    assert JobCheckpoints.status(checkpoints.get("job-1"))["state"] == "failed"
+    assert checkpoints.cancel("job-1")
+    job = checkpoints.get("job-1")
+    assert JobCheckpoints.cancelled(job)
+    assert JobCheckpoints.status(job)["state"] == "cancelled"
+
+    checkpoints.reopen("job-1")
+    job = checkpoints.get("job-1")
+    assert not JobCheckpoints.cancelled(job)
+    assert JobCheckpoints.status(job) == {"state": "running", "stage": "created", "progress": 0, "error": None}
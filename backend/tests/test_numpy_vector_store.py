@@ -0,0 +1,261 @@
+import os
+
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import (
+    ExactMatchFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+from tools.index import numpy_vector_store
+from tools.index.numpy_vector_store import NumpyVectorStore
+
+DIM = 32
+
+
+def random_vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+
+def make_nodes(vectors, start=0):
+    return [
+        TextNode(id_=f"node-{start + i}", text=f"chunk {start + i}", embedding=vector.tolist(),
+                 metadata={"partition": "even" if (start + i) % 2 == 0 else "odd"})
+        for i, vector in enumerate(vectors)
+    ]
+
+
+def brute_force(vectors, ids, query, k):
+    """Ids of the `k` rows of `vectors` closest to `query` by cosine."""
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return [ids[i] for i in np.argsort(-scores)[:k]]
+
+
+def search(store, query, k=5, nprobe=None, **kwargs):
+    query = VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=k, **kwargs)
+    # nprobe reaches the store as a query kwarg, like vector_store_kwargs of a retriever
+    return store.query(query, **({"nprobe": nprobe} if nprobe else {})).ids
+
+
+def test_exact_search_matches_brute_force(tmp_path):
+    vectors = random_vectors(500)
+    store = NumpyVectorStore(str(tmp_path))
+    nodes = make_nodes(vectors)
+    store.add(nodes)
+    ids = [node.node_id for node in nodes]
+
+    for query in random_vectors(20, seed=1):
+        assert search(store, query) == brute_force(vectors, ids, query, 5)
+
+    result = store.query(VectorStoreQuery(query_embedding=vectors[7].tolist(), similarity_top_k=1))
+    assert result.ids == ["node-7"] and result.similarities[0] == pytest.approx(1.0, abs=1e-5)
+    assert result.nodes[0].get_content() == "chunk 7"
+
+
+def test_filters(tmp_path):
+    vectors = random_vectors(100)
+    store = NumpyVectorStore(str(tmp_path))
+    store.add(make_nodes(vectors))
+    filters = MetadataFilters(filters=[ExactMatchFilter(key="partition", value="odd")])
+    ids = search(store, vectors[4], k=10, filters=filters)
+    assert len(ids) == 10 and all(int(node_id.split("-")[1]) % 2 == 1 for node_id in ids)
+    assert sorted(search(store, vectors[4], k=3, node_ids=["node-1", "node-2"])) == ["node-1", "node-2"]
+
+
+def test_deletes_survive_a_reload(tmp_path):
+    vectors = random_vectors(300)
+    store = NumpyVectorStore(str(tmp_path))
+    store.add(make_nodes(vectors))
+    store.delete_nodes(["node-3", "node-4"])
+    # Re-adding a node id replaces its row
+    replacement = random_vectors(1, seed=2)
+    store.add(make_nodes(replacement, start=5))
+    store.persist()
+
+    ids = [f"node-{i}" for i in range(300)]
+    vectors[5] = replacement[0]
+    live = [i for i in range(300) if i not in (3, 4)]
+    reopened = NumpyVectorStore(str(tmp_path))
+    assert len(reopened) == len(store) == 298
+    for query in random_vectors(10, seed=3):
+        expected = brute_force(vectors[live], [ids[i] for i in live], query, 5)
+        assert search(store, query) == search(reopened, query) == expected
+    assert search(reopened, vectors[3], k=300).count("node-5") == 1
+    assert {node.node_id for node in reopened.get_nodes(node_ids=["node-3", "node-5"])} == {"node-5"}
+
+
+def test_persist_compacts_the_tombstones(tmp_path):
+    vectors = random_vectors(400)
+    store = NumpyVectorStore(str(tmp_path))
+    store.add(make_nodes(vectors))
+    store.persist()
+    assert store._count == 400
+
+    # A few deletes are not worth a rewrite
+    store.delete_nodes([f"node-{i}" for i in range(50)])
+    store.persist()
+    assert store._count == 400
+
+    store.delete_nodes([f"node-{i}" for i in range(50, 150)])
+    queries = random_vectors(10, seed=4)
+    before = [search(store, query) for query in queries]
+    store.persist()
+
+    assert store._count == len(store) == 250
+    assert [search(store, query) for query in queries] == before
+    # Only the files of the compacted arrays are left
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith(".npy")) == ["vectors-1024.1.npy"]
+
+    reopened = NumpyVectorStore(str(tmp_path))
+    assert reopened._count == len(reopened) == 250
+    assert [search(reopened, query) for query in queries] == before
+    # Inserts go after the compacted rows
+    reopened.add(make_nodes(random_vectors(10, seed=5), start=400))
+    assert len(reopened) == 260
+    assert search(reopened, random_vectors(10, seed=5)[3], k=1) == ["node-403"]
+
+
+def test_query_during_compaction_searches_again(tmp_path, monkeypatch):
+    vectors = random_vectors(200)
+    store = NumpyVectorStore(str(tmp_path))
+    store.add(make_nodes(vectors))
+    store.delete_nodes([f"node-{i}" for i in range(100)])
+    expected = search(store, vectors[150])
+
+    search_rows = store._search
+    calls = []
+
+    def compact_during_the_scan(*args):
+        calls.append(args)
+        result = search_rows(*args)
+        if len(calls) == 1:
+            assert store.compact()
+        return result
+
+    monkeypatch.setattr(store, "_search", compact_during_the_scan)
+    assert search(store, vectors[150]) == expected
+    assert len(calls) == 2
+
+
+def test_compact_everything(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    store.add(make_nodes(random_vectors(20)))
+    store.clear()
+    assert store.compact()
+    assert len(store) == 0 and search(store, random_vectors(1)[0]) == []
+    assert not store.compact()
+
+
+@pytest.mark.parametrize("quantization", ["float16", "int8"])
+def test_quantized_search_reranks_with_float32(tmp_path, quantization):
+    vectors = random_vectors(1000)
+    ids = [f"node-{i}" for i in range(1000)]
+    store = NumpyVectorStore(str(tmp_path), quantization=quantization)
+    store.add(make_nodes(vectors))
+    assert store._arrays["codes"].dtype == np.dtype(quantization)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    for query in random_vectors(20, seed=6):
+        result = store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=5))
+        assert result.ids == brute_force(vectors, ids, query, 5)
+        # The scores come from the float32 re-rank, not from the compressed codes
+        rows = [int(node_id.split("-")[1]) for node_id in result.ids]
+        exact = normalized[rows] @ (query / np.linalg.norm(query))
+        np.testing.assert_allclose(result.similarities, exact, rtol=1e-5)
+
+
+def test_quantized_store_survives_a_reload(tmp_path):
+    vectors = random_vectors(600)
+    store = NumpyVectorStore(str(tmp_path), quantization="int8")
+    store.add(make_nodes(vectors))
+    store.delete_nodes(["node-0"])
+    store.persist()
+    queries = random_vectors(10, seed=7)
+    expected = [search(store, query) for query in queries]
+
+    reopened = NumpyVectorStore(str(tmp_path), quantization="int8")
+    assert [search(reopened, query) for query in queries] == expected
+    # Changing the quantization re-encodes the codes from the float32 vectors
+    del store, reopened
+    float16 = NumpyVectorStore(str(tmp_path), quantization="float16")
+    assert float16._arrays["codes"].dtype == np.float16
+    assert "scales" not in float16._arrays
+    assert [search(float16, query) for query in queries] == expected
+
+
+def clustered_vectors(count, clusters=8, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, DIM)).astype(np.float32)
+    return centers[rng.integers(0, clusters, size=count)] + rng.standard_normal((count, DIM)).astype(np.float32)
+
+
+def recall(store, vectors, queries, k=10, **kwargs):
+    ids = [f"node-{i}" for i in range(vectors.shape[0])]
+    hits = [len(set(search(store, query, k=k, **kwargs)) & set(brute_force(vectors, ids, query, k)))
+            for query in queries]
+    return sum(hits) / (k * len(queries))
+
+
+def test_ivf_recall_grows_with_nprobe(tmp_path):
+    vectors = clustered_vectors(4000)
+    store = NumpyVectorStore(str(tmp_path), ann="ivf", ivf_nlist=32, ann_min_rows=1000)
+    store.add(make_nodes(vectors))
+    assert store._ivf.trained and store._ivf.centroids.shape[0] == 32
+
+    queries = clustered_vectors(30, seed=8)
+    recalls = [recall(store, vectors, queries, nprobe=nprobe) for nprobe in (1, 4, 32)]
+    assert recalls[0] < 0.9
+    assert recalls[0] <= recalls[1] <= recalls[2]
+    # Probing every list is an exact search
+    assert recalls[2] == 1.0
+
+
+def test_ivf_index_is_reused_and_retrained(tmp_path, monkeypatch):
+    vectors = clustered_vectors(2000)
+    store = NumpyVectorStore(str(tmp_path), ann="ivf", ivf_nlist=16, ann_min_rows=1000)
+    store.add(make_nodes(vectors[:500]))
+    assert not store._ivf.trained
+    store.add(make_nodes(vectors[500:1000], start=500))
+    assert store._ivf.trained_rows == 1000
+    store.persist()
+    queries = clustered_vectors(10, seed=9)
+    expected = [search(store, query, nprobe=4) for query in queries]
+
+    def no_training(self, vectors):
+        raise AssertionError("the saved index should be loaded, not trained again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(numpy_vector_store.IVFIndex, "train", no_training)
+        reopened = NumpyVectorStore(str(tmp_path), ann="ivf", ivf_nlist=16, ann_min_rows=1000)
+        assert [search(reopened, query, nprobe=4) for query in queries] == expected
+        # New rows join the lists of their nearest centroids
+        reopened.add(make_nodes(vectors[1000:1500], start=1000))
+        assert recall(reopened, vectors[:1500], queries, nprobe=16) == 1.0
+
+    # Inserted but not persisted: the saved index no longer covers the rows and is rebuilt
+    del store, reopened
+    rebuilt = NumpyVectorStore(str(tmp_path), ann="ivf", ivf_nlist=16, ann_min_rows=1000)
+    assert rebuilt._ivf.trained_rows == 1500
+    # Growing 4x since the last training trains again
+    more = clustered_vectors(4500, seed=10)
+    rebuilt.add(make_nodes(more, start=1500))
+    assert rebuilt._ivf.trained_rows == 6000
+
+
+def test_ivf_lists_follow_a_compaction(tmp_path):
+    vectors = clustered_vectors(2000)
+    store = NumpyVectorStore(str(tmp_path), ann="ivf", ivf_nlist=16, ann_min_rows=1000)
+    store.add(make_nodes(vectors))
+    store.delete_nodes([f"node-{i}" for i in range(0, 2000, 2)])
+    queries = clustered_vectors(10, seed=11)
+    expected = [search(store, query, nprobe=4) for query in queries]
+    store.persist()
+
+    assert store._count == 1000
+    assert sum(len(rows) for rows in store._ivf._lists) == 1000
+    assert [search(store, query, nprobe=4) for query in queries] == expected
+    reopened = NumpyVectorStore(str(tmp_path), ann="ivf", ivf_nlist=16, ann_min_rows=1000)
+    assert [search(reopened, query, nprobe=4) for query in queries] == expected
@@ -0,0 +1,35 @@
+from tools.video.section_index import SectionIndex, section_text
+from tools.index.bm25 import tokenize
+
+
+INSIGHTS = [
+    {"start": "0:00:00", "end": "0:01:00", "content": "Abertura da reunião de planejamento"},
+    {"start": "0:01:00", "end": "0:02:00", "content": "Orçamento do próximo trimestre"},
+    {"start": "0:02:00", "end": "0:03:00", "content": "Resumo da reuniao e próximos passos"},
+]
+
+
+def test_accents_are_folded_like_the_keyword_index():
+    index = SectionIndex(INSIGHTS)
+
+    plain = index.search("reuniao", top_k=3)
+    accented = index.search("reunião", top_k=3)
+
+    assert plain == accented
+    assert sorted(position for position, score in plain if score > 0) == [0, 2]
+    assert index.search("orcamento", top_k=1)[0][0] == 1
+
+
+def test_context_message_keeps_video_order_and_budget():
+    index = SectionIndex(INSIGHTS)
+
+    message = index.context_message("reunião próximos passos", top_k=3)
+    assert message["content"].index(section_text(INSIGHTS[0])) < message["content"].index(section_text(INSIGHTS[2]))
+    assert section_text(INSIGHTS[1]) not in message["content"]
+
+    budget = len(tokenize(section_text(INSIGHTS[2])))
+    message = index.context_message("reunião próximos passos", top_k=3, max_tokens=budget)
+    assert message["content"].endswith(section_text(INSIGHTS[2]))
+    assert section_text(INSIGHTS[0]) not in message["content"]
+
+    assert index.context_message("inexistente") is None
@@ -0,0 +1,69 @@
+from unittest import mock
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from app import tasks
+from app.tools.upload_store import UploadRegistry
+from app.tools.video.job_checkpoints import JobCheckpoints
+
+
+@pytest.fixture
+def video_job(redis_client, tmp_path, monkeypatch):
+    """A created video job, with the checkpoints, upload registry and Video Indexer client of the tasks replaced."""
+    checkpoints = JobCheckpoints(redis_client)
+    registry = UploadRegistry(str(tmp_path / "uploads.sqlite3"))
+    client = mock.Mock()
+    monkeypatch.setattr(tasks, "get_job_checkpoints", lambda: checkpoints)
+    monkeypatch.setattr(tasks, "get_upload_registry", lambda: registry)
+    monkeypatch.setattr(tasks, "config_video_indexer_client", lambda: client)
+    monkeypatch.setattr(tasks, "report_progress", mock.Mock())
+
+    job_id = "job-1"
+    checkpoints.create(job_id, video_name="aula", description="", language="Portuguese",
+                       media_path=str(tmp_path / "aula.mp4"), content_path=str(tmp_path / "aula_Video.json"),
+                       doc_id="aula_Video.json", partition="", content_hash="abc")
+    registry.record("abc", "video", job_id=job_id, doc_ids=["aula_Video.json"], status="processing")
+    return job_id, checkpoints, registry, client
+
+
+def test_stage_out_of_retries_fails_the_job(video_job):
+    job_id, checkpoints, registry, client = video_job
+    client.upload_manager.find_video_by_external_id.side_effect = ConnectionError("connection reset")
+
+    result = tasks.upload_video_stage.apply(args=(job_id,))
+
+    assert result.failed()
+    assert client.upload_manager.find_video_by_external_id.call_count == tasks.STAGE_RETRY["max_retries"] + 1
+    status = JobCheckpoints.status(checkpoints.get(job_id))
+    assert status["state"] == "failed"
+    assert "connection reset" in status["error"]
+    assert registry.get("abc", "video")["status"] == "failed"
+
+
+def test_retry_finds_the_uploaded_video(video_job):
+    job_id, checkpoints, registry, client = video_job
+    client.upload_manager.find_video_by_external_id.side_effect = [None, "vid-1"]
+    client.upload_manager.upload_by_file.side_effect = ConnectionError("connection reset")
+
+    with mock.patch.object(tasks, "await_video_index") as await_video_index:
+        result = tasks.upload_video_stage.apply(args=(job_id,))
+
+    assert result.successful()
+    # The first attempt died while sending; the video it created is not sent again
+    assert client.upload_manager.upload_by_file.call_count == 1
+    assert checkpoints.get(job_id)["video_id"] == "vid-1"
+    assert await_video_index.called
+
+
+def test_cancelled_job_is_not_uploaded(video_job):
+    job_id, checkpoints, registry, client = video_job
+    client.upload_manager.find_video_by_external_id.side_effect = lambda external_id: checkpoints.cancel(job_id) and None
+
+    result = tasks.upload_video_stage.apply(args=(job_id,))
+
+    assert result.successful()
+    client.upload_manager.upload_by_file.assert_not_called()
+    job = checkpoints.get(job_id)
+    assert job["stage"] == "created"
+    assert JobCheckpoints.status(job)["state"] == "cancelled"
@@ -0,0 +1,71 @@
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryResult
+
+from tools.index import tiered_vector_store
+from tools.index.tiered_vector_store import TieredVectorStore, merge_results
+
+
+class FixedStore:
+    """A tier that answers every query with the same nodes."""
+
+    def __init__(self, scored_ids):
+        self.scored_ids = dict(scored_ids)
+        self.queries = 0
+
+    def __len__(self):
+        return len(self.scored_ids)
+
+    def count(self):
+        return len(self.scored_ids)
+
+    def add(self, nodes, **kwargs):
+        self.scored_ids.update({node.node_id: 0.0 for node in nodes})
+        return [node.node_id for node in nodes]
+
+    def query(self, query, **kwargs):
+        self.queries += 1
+        best = sorted(self.scored_ids.items(), key=lambda item: item[1], reverse=True)[:query.similarity_top_k]
+        return VectorStoreQueryResult(
+            nodes=[TextNode(id_=node_id, text=node_id) for node_id, _ in best],
+            similarities=[score for _, score in best],
+            ids=[node_id for node_id, _ in best],
+        )
+
+
+QUERY = VectorStoreQuery(query_embedding=[1.0, 0.0], similarity_top_k=3)
+
+
+def test_merge_results_by_similarity():
+    merged = merge_results([
+        FixedStore({"a": 0.9, "b": 0.5}).query(QUERY),
+        FixedStore({"b": 0.5, "c": 0.7, "d": 0.1}).query(QUERY),
+    ], top_k=3)
+    assert merged.ids == ["a", "c", "b"]
+    assert merged.similarities == [0.9, 0.7, 0.5]
+
+
+def test_incomplete_hot_tier_merges_the_cold_tier():
+    hot, cold = FixedStore({"a": 0.9}), FixedStore({"a": 0.9, "b": 0.8, "c": 0.1})
+    store = TieredVectorStore(hot, cold)
+    assert store.query(QUERY).ids == ["a", "b", "c"]
+    assert not store.hot_is_complete()
+
+
+def test_complete_hot_tier_is_checked_again(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(tiered_vector_store.time, "time", lambda: now[0])
+    hot, cold = FixedStore({"a": 0.9, "b": 0.8}), FixedStore({"a": 0.9, "b": 0.8})
+    store = TieredVectorStore(hot, cold)
+    assert store.query(QUERY).ids == ["a", "b"]
+    assert cold.queries == 0
+
+    # Another process inserts into the cold tier only
+    cold.scored_ids["c"] = 0.95
+    assert store.query(QUERY).ids == ["a", "b"]
+    now[0] += tiered_vector_store.COMPLETENESS_RECHECK_SEC
+    assert store.query(QUERY).ids == ["c", "a", "b"]
+
+    # Writes made here reach both tiers
+    store.add([TextNode(id_="c", text="c")])
+    now[0] += tiered_vector_store.COMPLETENESS_RECHECK_SEC
+    assert store.hot_is_complete()
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from app.tools.video.client import token_cache, video_indexer_client
+from app.tools.video.client.Consts import Consts
+from app.tools.video.client.token_cache import TokenCache
+
+
+@pytest.fixture
+def shared_cache(redis_client, monkeypatch):
+    def new_cache():
+        cache = TokenCache()
+        cache._redis = redis_client
+        return cache
+
+    monkeypatch.setattr(token_cache, "KEY_PREFIX", "test:auth:")
+    return new_cache
+
+
+@pytest.fixture
+def client_for(shared_cache, monkeypatch):
+    fetched = []
+
+    def fake_arm_token(consts):
+        fetched.append(("arm", video_indexer_client.arm_credential_id(consts)))
+        return f"arm-{len(fetched)}"
+
+    monkeypatch.setattr(video_indexer_client, "get_arm_access_token", fake_arm_token)
+    monkeypatch.setattr(video_indexer_client, "get_account_access_token_async", lambda consts, arm: f"vi-for-{arm}")
+    monkeypatch.setattr(video_indexer_client, "get_token_cache", shared_cache)
+
+    def make(client_id):
+        monkeypatch.setenv("AZURE_TENANT_ID", "tenant")
+        monkeypatch.setenv("AZURE_CLIENT_ID", client_id)
+        client = video_indexer_client.VideoIndexerClient()
+        client.consts = Consts("2024-01-01", "https://api", "https://arm", "account", "group", "subscription")
+        return client
+
+    make.fetched = fetched
+    return make
+
+
+def test_values_are_shared_under_the_prefix(shared_cache, redis_client):
+    fetches = []
+    fetch = lambda: fetches.append(1) or "token"
+    expires_at = lambda _token: time.time() + 3600
+
+    assert shared_cache().get("arm:x", fetch, expires_at) == "token"
+    # A new process reuses the token fetched by the first one
+    assert shared_cache().get("arm:x", fetch, expires_at) == "token"
+
+    assert len(fetches) == 1
+    assert redis_client.exists("test:auth:arm:x")
+    assert not redis_client.exists("vi:auth:arm:x")
+
+
+def test_tokens_are_scoped_to_the_credential(client_for, redis_client):
+    first = client_for("client-a")
+    assert first.vi_access_token == "vi-for-arm-1"
+    # Another process with the same credential reuses it
+    assert client_for("client-a").vi_access_token == "vi-for-arm-1"
+
+    other = client_for("client-b")
+    assert other.vi_access_token == "vi-for-arm-2"
+
+    assert len(client_for.fetched) == 2
+    assert client_for.fetched[0][1] != client_for.fetched[1][1]
+    keys = b" ".join(redis_client.keys("test:auth:*"))
+    # The identities are hashed, never written to Redis
+    assert b"client-a" not in keys and b"tenant" not in keys
@@ -0,0 +1,66 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from app.tools.video.client.content_cache import ContentCache
+from app.tools.video.client.managers import video_content
+from app.tools.video.client.managers.video_content import VideoContentManager
+
+INDEX = {"state": "Processed", "videos": [{"processingProgress": "100%"}]}
+
+
+def make_response(status_code, body=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response._content_consumed = True
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.url = "https://api/Videos/v1/Index"
+    return response
+
+
+class FakeSession:
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, stream=False):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    # max_age 0: every cached copy is revalidated
+    cache = ContentCache(str(tmp_path), max_age_sec=0)
+    session = FakeSession()
+    monkeypatch.setattr(video_content, "get_content_cache", lambda: cache)
+    monkeypatch.setattr(video_content, "get_session", lambda: session)
+    client = SimpleNamespace(consts=SimpleNamespace(ApiEndpoint="https://api"), vi_access_token="token",
+                             account={"location": "trial", "properties": {"accountId": "account"}})
+    return SimpleNamespace(content=VideoContentManager(client), cache=cache, session=session)
+
+
+def test_not_modified_reuses_the_cached_index(manager):
+    manager.session.responses = [
+        make_response(200, json.dumps(INDEX).encode(), {"ETag": '"v1"'}),
+        make_response(304),
+    ]
+
+    assert manager.content.get_insight_fields("v1", fields=("progress",)) == {"progress": "100%"}
+    assert manager.content.get_insight_fields("v1", fields=("progress",)) == {"progress": "100%"}
+    assert manager.session.requests[1] == {"If-None-Match": '"v1"'}
+
+
+def test_not_modified_without_a_cached_copy_raises(manager):
+    manager.session.responses = [make_response(304), make_response(304)]
+
+    with pytest.raises(requests.HTTPError):
+        manager.content.get_insight_fields("v1", fields=("state",))
+    with pytest.raises(requests.HTTPError):
+        manager.content.get_raw_insight("v1")
+    # Nothing empty was cached
+    assert manager.cache.load("index", "v1") is None
@@ -25,50 +25,62 @@ const VideoProgress: React.FC<VideoProgressProps> = ({ videoName, onFinished })
   }, []);
 
   useEffect(() => {
-    const fetchProgress = async () => {
-      try {
-        const response = await axios.get('/api/uploadVideo_status');
-        const progressValue = response.data[`video:${videoName}`];
-        console.log(progressValue);
-        
-        if (progressValue && typeof progressValue === 'string' && progressValue.endsWith('%')) {
-          SetIsProgressing(true);
-        }
+    const handleProgress = async (progressValue: string | undefined) => {
+      console.log(progressValue);
+      if (progressValue === "Exclude") {
+        return; // confirmação do próprio frontend
+      }
 
-        if (progressValue === "100%") {
-          setIsGenerating(true);
-        } else if (progressValue === "Finished") {
-          setIsFinished(true);
-          onFinished(true);
-          try {
-            const response = await axios.post('/api/uploadVideo_status', { name: videoName, progress: "Exclude" });
-            console.log('Response:', response.data);
-          } catch (error) {
-            console.error('Error updating video status:', error);
-          }
-        } 
-        else if (progressValue === "Failed") {
-          SetProgressFailed(true);
-          SetIsProgressing(false);
+      if (progressValue && typeof progressValue === 'string' && progressValue.endsWith('%')) {
+        SetIsProgressing(true);
+      }
+
+      if (progressValue === "100%") {
+        setIsGenerating(true);
+      } else if (progressValue === "Finished") {
+        setIsFinished(true);
+        onFinished(true);
+        try {
+          const response = await axios.post('/api/uploadVideo_status', { name: videoName, progress: "Exclude" });
+          console.log('Response:', response.data);
+        } catch (error) {
+          console.error('Error updating video status:', error);
+        }
+      } 
+      else if (progressValue === "Failed") {
+        SetProgressFailed(true);
+        SetIsProgressing(false);
+      } else {
+        if (!progressValue) {
+          setProgress(0);
         } else {
-          if (!progressValue) {
-            setProgress(0);
-          } else {
-            const percentage = parseInt(progressValue, 10);
-            setProgress(percentage);
-            if (percentage > 0) {
-              onFinished(false); // Indica que o progresso começou
-            }
+          const percentage = parseInt(progressValue, 10);
+          setProgress(percentage);
+          if (percentage > 0) {
+            onFinished(false); // Indica que o progresso começou
           }
         }
-      } catch (error) {
-        console.error('Error fetching progress:', error);
       }
     };
 
-    const interval = setInterval(fetchProgress, 2000);
+    // O servidor envia o progresso atual ao conectar e depois cada mudança publicada pelos workers;
+    // o EventSource reconecta sozinho se a conexão cair
+    const events = new EventSource('/api/uploadVideo_events');
+    events.onmessage = (event) => {
+      try {
+        const data = JSON.parse(event.data);
+        if (data.name === videoName) {
+          handleProgress(data.progress);
+        }
+      } catch (error) {
+        console.error('Error reading progress event:', error);
+      }
+    };
+    events.onerror = (error) => {
+      console.error('Error receiving progress:', error);
+    };
 
-    return () => clearInterval(interval);
+    return () => events.close();
   }, [videoName, onFinished]);
 
   useEffect(() => {
@@ -1,8 +1,9 @@
 export type ResponseSources = {
     text: string;
-    doc_id: string;
-    start: number;
-    end: number;
+    doc_id: string | null;
+    // Timestamps of the video section ("0:01:58.2"), null for other documents
+    start: string | null;
+    end: string | null;
     similarity: number;
   };
   
@@ -25,4 +26,31 @@ export type ResponseSources = {
     return queryResponse;
   };
   
+  export type StreamHandlers = {
+    onToken: (token: string) => void;
+    onSources: (sources: ResponseSources[]) => void;
+    onDone: () => void;
+  };
+
+  // Opens /api/query/stream; returns a function that stops the stream
+  export const streamQueryIndex = (query: string, handlers: StreamHandlers): (() => void) => {
+    const queryURL = `/api/query/stream?text=${encodeURIComponent(query)}`;
+    const source = new EventSource(queryURL);
+
+    source.addEventListener('token', (e) => handlers.onToken(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener('sources', (e) => handlers.onSources(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener('done', (e) => {
+      console.log("[", queryURL, "]", JSON.parse((e as MessageEvent).data));
+      source.close();
+      handlers.onDone();
+    });
+    // EventSource reconnects by default; an answer is only streamed once
+    source.onerror = () => {
+      source.close();
+      handlers.onDone();
+    };
+
+    return () => source.close();
+  };
+
   export default queryIndex;
\ No newline at end of file
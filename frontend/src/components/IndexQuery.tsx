@@ -1,7 +1,7 @@
 import { useState } from 'react';
 import { BeatLoader } from 'react-spinners';
 import classNames from 'classnames';
-import queryIndex, { ResponseSources } from '../apis/queryIndex';
+import { streamQueryIndex, ResponseSources } from '../apis/queryIndex';
 import React from 'react';
 
 /** @jsxImportSource @emotion/react */
@@ -21,33 +21,39 @@ const IndexQuery = () => {
     if (e.key == 'Enter') {
       console.log("Mari Aqui");
       setLoading(true);
-      queryIndex(e.currentTarget.value).then((response) => {
-        setLoading(false);
-        setResponseText(response.text);
-        setResponseSources(response.sources);
+      setResponseText('');
+      setResponseSources([]);
+      streamQueryIndex(e.currentTarget.value, {
+        onToken: (token) => {
+          setLoading(false);
+          setResponseText((text) => text + token);
+        },
+        onSources: (sources) => setResponseSources(sources),
+        onDone: () => setLoading(false),
       });
     }
   };
 
-  // const sourceElems = responseSources.map((source) => {
-  //   const nodeTitle =
-  //     source.doc_id.length > 28
-  //       ? source.doc_id.substring(0, 28) + '...'
-  //       : source.doc_id;
-  //   const nodeText =
-  //     source.text.length > 150 ? source.text.substring(0, 130) + '...' : source.text;
+  const sourceElems = responseSources.map((source, index) => {
+    const docId = source.doc_id ?? '';
+    const nodeTitle =
+      docId.length > 28
+        ? docId.substring(0, 28) + '...'
+        : docId;
+    const nodeText =
+      source.text.length > 150 ? source.text.substring(0, 130) + '...' : source.text;
 
-  //   return (
-  //     <div key={source.doc_id} className='query__sources__item'>
-  //       <p className='query__sources__item__id'>{nodeTitle}</p>
-  //       <p className='query__sources__item__text'>{nodeText}</p>
-  //       <p className='query__sources__item__footer'>
-  //         Similarity={source.similarity}, start={source.start}, end=
-  //         {source.end}
-  //       </p>
-  //     </div>
-  //   );
-  // });
+    return (
+      <div key={`${docId}-${index}`} className='query__sources__item'>
+        <p className='query__sources__item__id'>{nodeTitle}</p>
+        <p className='query__sources__item__text'>{nodeText}</p>
+        <p className='query__sources__item__footer'>
+          Similarity={source.similarity}
+          {source.start != null && `, start=${source.start}, end=${source.end}`}
+        </p>
+      </div>
+    );
+  });
 
   return (
     <div className='query'>
@@ -84,7 +90,7 @@ const IndexQuery = () => {
         <div className='query__sources__item'>
           <p className='query__sources__item__id'>Response Sources</p>
         </div>
-        {/* {sourceElems} */}
+        {sourceElems}
       </div>
     </div>
   );